@@ -0,0 +1,86 @@
+"""Agrégats du dashboard maintenus incrémentalement.
+
+LeadStatsAggregate est un indexeur du LeadRepository : à chaque écriture il
+retire la contribution précédente du lead et ajoute la nouvelle. Le dashboard
+est ainsi servi en O(1). recompute() reconstruit les agrégats depuis zéro pour
+détecter une éventuelle dérive.
+"""
+from collections import Counter
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+# contribution(lead) -> (statut, commissions payées, commissions en attente)
+Contribution = Callable[[object], Tuple[str, int, int]]
+
+
+class LeadStatsAggregate:
+    """Nombre de leads par statut et totaux de commissions payées / en attente.
+
+    source_fields : attributs du lead lus par contribution (None : inconnus, toujours recalculé).
+    """
+
+    def __init__(self, contribution: Contribution, source_fields: Optional[Iterable[str]] = None):
+        self._contribution = contribution
+        self.source_fields = frozenset(source_fields) if source_fields is not None else None
+        self._contributions: Dict[str, Tuple[str, int, int]] = {}
+        self.status_counts: Counter = Counter()
+        self.paid = 0
+        self.pending = 0
+
+    def add(self, lead_id: str, lead) -> None:
+        status, paid, pending = self._contribution(lead)
+        self._contributions[lead_id] = (status, paid, pending)
+        self.status_counts[status] += 1
+        self.paid += paid
+        self.pending += pending
+
+    def remove(self, lead_id: str) -> None:
+        previous = self._contributions.pop(lead_id, None)
+        if previous is None:
+            return
+        status, paid, pending = previous
+        self.status_counts[status] -= 1
+        if self.status_counts[status] <= 0:
+            del self.status_counts[status]
+        self.paid -= paid
+        self.pending -= pending
+
+    def clear(self) -> None:
+        self._contributions.clear()
+        self.status_counts.clear()
+        self.paid = 0
+        self.pending = 0
+
+    @property
+    def total(self) -> int:
+        return len(self._contributions)
+
+    def snapshot(self) -> dict:
+        return {
+            "total_leads": self.total,
+            "status_stats": dict(self.status_counts),
+            "paid": self.paid,
+            "pending": self.pending,
+        }
+
+    @classmethod
+    def recompute(cls, contribution: Contribution, leads: Iterable[Tuple[str, object]]) -> "LeadStatsAggregate":
+        """Agrégats recalculés depuis zéro (vérification)"""
+        fresh = cls(contribution)
+        for lead_id, lead in leads:
+            fresh.add(lead_id, lead)
+        return fresh
+
+
+def drift(live: dict, fresh: dict) -> dict:
+    """Différences entre les agrégats maintenus et ceux recalculés ({} si cohérents)"""
+    differences = {}
+    for key in ("total_leads", "paid", "pending"):
+        if live[key] != fresh[key]:
+            differences[key] = {"live": live[key], "recomputed": fresh[key]}
+    statuses = set(live["status_stats"]) | set(fresh["status_stats"])
+    for status in sorted(statuses):
+        live_count = live["status_stats"].get(status, 0)
+        fresh_count = fresh["status_stats"].get(status, 0)
+        if live_count != fresh_count:
+            differences[f"status_stats.{status}"] = {"live": live_count, "recomputed": fresh_count}
+    return differences
@@ -0,0 +1,47 @@
+"""Montants saisis librement ("450€", "1 200,50 €", "-150 €") -> centimes + devise.
+
+Les champs tarif_mensuel et commission_agence restent du texte libre ;
+parse_amount en tire un montant normalisé en centimes, utilisé pour les
+totaux du dashboard.
+"""
+import re
+from typing import Optional, Tuple
+
+# Signe éventuel ("-" ou signe moins typographique), puis chiffres et séparateurs
+AMOUNT_RE = re.compile(r"(?:[-\u2212]\s*)?\d[\d\s\u00a0\u202f.,']*")
+CURRENCY_SYMBOLS = {"€": "EUR", "EUR": "EUR", "$": "USD", "USD": "USD", "£": "GBP", "GBP": "GBP", "CHF": "CHF"}
+
+
+def parse_amount(text: Optional[str]) -> Tuple[Optional[int], Optional[str]]:
+    """'1 200,50 €' -> (120050, 'EUR') ; (None, None) si aucun montant"""
+    if not text:
+        return None, None
+    match = AMOUNT_RE.search(text)
+    if not match:
+        return None, None
+
+    number = re.sub(r"[\s\u00a0\u202f']", "", match.group()).rstrip('.,')
+    negative = number[0] in "-\u2212"
+    number = number.lstrip("-\u2212")
+    last_dot, last_comma = number.rfind('.'), number.rfind(',')
+    if last_dot >= 0 and last_comma >= 0:
+        # Les deux séparateurs : le dernier est le séparateur décimal
+        decimal_sep = '.' if last_dot > last_comma else ','
+    elif last_dot >= 0 or last_comma >= 0:
+        # Un seul type : décimal s'il apparaît une fois suivi de 1 ou 2 chiffres ("12,5", "450.90")
+        sep = '.' if last_dot >= 0 else ','
+        decimals = len(number) - number.rfind(sep) - 1
+        decimal_sep = sep if number.count(sep) == 1 and decimals in (1, 2) else None
+    else:
+        decimal_sep = None
+
+    if decimal_sep:
+        integer_part, _, decimal_part = number.rpartition(decimal_sep)
+    else:
+        integer_part, decimal_part = number, ""
+    integer_part = re.sub(r"[.,]", "", integer_part)
+    cents = int(integer_part or 0) * 100 + int((decimal_part + "00")[:2])
+
+    upper = text.upper()
+    currency = next((code for symbol, code in CURRENCY_SYMBOLS.items() if symbol in upper), "EUR")
+    return -cents if negative else cents, currency
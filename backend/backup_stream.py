@@ -0,0 +1,297 @@
+"""Sauvegarde en flux : export NDJSON et lecture incrémentale à l'import.
+
+Une ligne JSON par enregistrement, précédées d'un en-tête et suivies d'une
+ligne de fin (qui permet de détecter un fichier tronqué) :
+
+    {"type": "header", "version": "2.0", "export_date": "...", "leads": 2, "reminders": 1}
+    {"type": "lead", "data": {...}}
+    {"type": "reminder", "data": {...}}
+    {"type": "end", "leads": 2, "reminders": 1}
+
+Un export delta (depuis un curseur) a "delta": true dans son en-tête et ajoute
+les suppressions avant la ligne de fin :
+
+    {"type": "delete", "kind": "lead", "id": "...", "seq": 42}
+
+Les enregistrements sont sérialisés un par un et regroupés en blocs d'environ
+CHUNK_SIZE octets : la mémoire utilisée ne dépend pas du nombre de leads.
+La compression gzip est appliquée au fil de l'eau si le client l'accepte.
+
+À l'import, iter_backup_records lit ce format ou l'ancien export JSON
+({"leads": {id: {...}}, "reminders": {...}}) par blocs, sans charger le
+document entier : seuls les enregistrements en cours de validation sont en
+mémoire sous forme de dictionnaires.
+"""
+import codecs
+import json
+import re
+import zlib
+from typing import AsyncIterator, BinaryIO, Callable, Iterable, Iterator, Optional, Tuple
+
+NDJSON_FORMAT_VERSION = "2.0"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+CHUNK_SIZE = 64 * 1024
+
+
+def ndjson_line(record: dict) -> bytes:
+    return (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """Accept-Encoding autorise-t-il gzip (en tenant compte des q=0) ?"""
+    if not accept_encoding:
+        return False
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if coding not in ("gzip", "*"):
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            return True
+    return False
+
+
+async def iter_backup_ndjson(header: dict, sections: Iterable[tuple],
+                             deletions: Iterable[tuple] = ()) -> AsyncIterator[bytes]:
+    """Lignes NDJSON regroupées en blocs.
+
+    sections : tuples (type, ids, lookup, dump). Les ids sont figés avant l'export ;
+    un enregistrement supprimé entre-temps (lookup -> None) est simplement omis.
+    deletions : tuples (type, id, seq) des suppressions d'un export delta.
+    Le générateur est asynchrone : la sérialisation se fait sur la boucle, entre
+    deux envois, sans concurrence avec les mutations.
+    """
+    counts = {}
+    buffer = [ndjson_line({"type": "header", "version": NDJSON_FORMAT_VERSION, **header})]
+    size = len(buffer[0])
+    for record_type, ids, lookup, dump in sections:
+        counts[record_type] = 0
+        for record_id in ids:
+            obj = lookup(record_id)
+            if obj is None:
+                continue
+            line = ndjson_line({"type": record_type, "data": dump(obj)})
+            counts[record_type] += 1
+            buffer.append(line)
+            size += len(line)
+            if size >= CHUNK_SIZE:
+                yield b"".join(buffer)
+                buffer, size = [], 0
+    deleted = 0
+    for record_type, record_id, seq in deletions:
+        buffer.append(ndjson_line({"type": "delete", "kind": record_type, "id": record_id, "seq": seq}))
+        deleted += 1
+    end = {"type": "end", **{f"{t}s": n for t, n in counts.items()}}
+    if deleted:
+        end["deleted"] = deleted
+    buffer.append(ndjson_line(end))
+    yield b"".join(buffer)
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes], level: int = 6) -> AsyncIterator[bytes]:
+    """Compresse un flux au fil de l'eau (format gzip, wbits=31)"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def backup_section(record_type: str, db, dump: Callable, ids: Optional[list] = None) -> tuple:
+    """Section d'export pour un dépôt : ids figés maintenant (tous par défaut), objets lus au fil de l'envoi"""
+    return record_type, list(db.keys()) if ids is None else ids, db.get, dump
+
+
+# 📥 Import : lecture incrémentale
+RECORD_TYPES = ("lead", "reminder")
+_WHITESPACE_RE = re.compile(r"[ \t\n\r]*")
+_NDJSON_START_RE = re.compile(r'\s*\{\s*"type"\s*:')
+
+
+class BackupFormatError(ValueError):
+    """Fichier de sauvegarde illisible (structure JSON invalide)"""
+
+
+class JsonReader:
+    """Lecteur JSON incrémental : parcourt objets et tableaux membre par membre,
+    chaque valeur étant décodée avec json.raw_decode sur un tampon rechargé par blocs"""
+
+    def __init__(self, source: BinaryIO, chunk_size: int = CHUNK_SIZE):
+        self._source = source
+        self._chunk_size = chunk_size
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self._json = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        chunk = self._source.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            text = self._decoder.decode(b"", final=True)
+        else:
+            text = self._decoder.decode(chunk)
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+        return bool(chunk) or bool(text)
+
+    def peek(self) -> str:
+        """Prochain caractère significatif ('' en fin de fichier)"""
+        while True:
+            self._pos = _WHITESPACE_RE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise BackupFormatError(f"JSON invalide : '{char}' attendu, '{found or 'fin de fichier'}' trouvé")
+        self._pos += 1
+
+    def value(self):
+        """Décode la valeur suivante (complète)"""
+        self.peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buffer, self._pos)
+                # Une valeur qui touche la fin du tampon peut être tronquée (nombre...)
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError as e:
+                if self._eof:
+                    raise BackupFormatError(f"JSON invalide : {e.msg}") from None
+            self._fill()
+
+    def members(self) -> Iterator[str]:
+        """Clés d'un objet ; l'appelant consomme chaque valeur (value, members...) avant la clé suivante"""
+        self.expect("{")
+        if self.peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise BackupFormatError("JSON invalide : clé attendue")
+            self.expect(":")
+            yield key
+            separator = self.peek()
+            self._pos += 1
+            if separator == "}":
+                return
+            if separator != ",":
+                raise BackupFormatError("JSON invalide : ',' ou '}' attendu")
+
+    def elements(self) -> Iterator[None]:
+        """Éléments d'un tableau ; l'appelant consomme chaque valeur"""
+        self.expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield None
+            separator = self.peek()
+            self._pos += 1
+            if separator == "]":
+                return
+            if separator != ",":
+                raise BackupFormatError("JSON invalide : ',' ou ']' attendu")
+
+
+def _iter_json_sections(reader: JsonReader) -> Iterator[Tuple[str, str, object]]:
+    for key in reader.members():
+        nested = reader.peek()
+        if key in ("leads", "reminders") and nested in "{[":
+            record_type = key[:-1]
+            if nested == "{":
+                for record_id in reader.members():
+                    record = reader.value()
+                    if isinstance(record, dict):
+                        record.setdefault("id", record_id)
+                    yield record_type, record_id, record
+            else:
+                for position, _ in enumerate(reader.elements()):
+                    yield record_type, f"{key}[{position}]", reader.value()
+        elif key == "deleted" and nested == "{":
+            # Export delta : {"deleted": {"leads": [ids], "reminders": [ids]}}
+            for kind in reader.members():
+                for position, _ in enumerate(reader.elements()):
+                    yield "delete", f"deleted.{kind}[{position}]", {"kind": kind.rstrip("s"), "id": reader.value()}
+        elif key == "data" and nested == "{":
+            # Réponse complète de l'ancien export ({"message": ..., "data": {...}})
+            yield from _iter_json_sections(reader)
+        else:
+            value = reader.value()
+            if not isinstance(value, (dict, list)):
+                yield "meta", key, {key: value}
+
+
+# Ligne de fin : compteurs annoncés -> type des enregistrements comptés
+END_COUNTS = {"leads": "lead", "reminders": "reminder", "deleted": "delete"}
+
+
+def _iter_ndjson(source: BinaryIO) -> Iterator[Tuple[str, str, object]]:
+    """Enregistrements NDJSON ; la ligne de fin est obligatoire, unique et en dernier, et ses
+    compteurs doivent correspondre aux lignes lues (sinon BackupFormatError : fichier tronqué)"""
+    counts = {record_type: 0 for record_type in END_COUNTS.values()}
+    end = None
+    for line_number, raw in enumerate(source, start=1):
+        line = raw.decode("utf-8-sig" if line_number == 1 else "utf-8", errors="replace").strip()
+        if not line:
+            continue
+        if end is not None:
+            raise BackupFormatError(f"ligne {line_number} après la ligne de fin")
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield "invalid", f"ligne {line_number}", f"JSON invalide : {e}"
+            continue
+        record_type = record.get("type") if isinstance(record, dict) else None
+        if record_type in counts:
+            counts[record_type] += 1
+        if record_type in RECORD_TYPES:
+            yield record_type, f"ligne {line_number}", record.get("data")
+        elif record_type == "delete":
+            yield "delete", f"ligne {line_number}", {"kind": record.get("kind"), "id": record.get("id")}
+        elif record_type == "header":
+            yield "meta", f"ligne {line_number}", record
+        elif record_type == "end":
+            end = record
+        else:
+            yield "invalid", f"ligne {line_number}", f"type d'enregistrement inconnu : {record_type!r}"
+    if end is None:
+        raise BackupFormatError("ligne de fin absente : fichier tronqué")
+    for key, record_type in END_COUNTS.items():
+        if end.get(key, 0) != counts[record_type]:
+            raise BackupFormatError(
+                f"fichier incomplet : {counts[record_type]} {key} lus, {end.get(key, 0)} annoncés par la ligne de fin")
+
+
+def iter_backup_records(source: BinaryIO) -> Iterator[Tuple[str, str, object]]:
+    """(type, position, données) de chaque enregistrement d'une sauvegarde NDJSON ou JSON.
+
+    La position (id, "ligne 12", "leads[3]") sert aux rapports d'erreur ; type vaut
+    "lead", "reminder", "delete" (données = {"kind", "id"}), "meta" (en-tête :
+    version, delta, curseur...) ou "invalid" (données = message d'erreur).
+    Lève BackupFormatError si la structure d'un fichier JSON est illisible.
+    """
+    head = source.read(64)
+    source.seek(0)
+    if _NDJSON_START_RE.match(head.decode("utf-8-sig", errors="ignore")):
+        yield from _iter_ndjson(source)
+    else:
+        yield from _iter_json_sections(JsonReader(source))
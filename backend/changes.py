@@ -0,0 +1,138 @@
+"""Suivi des changements pour les sauvegardes incrémentales (delta).
+
+Chaque création / modification d'un lead ou d'un rappel reçoit un numéro de
+changement (seq) strictement croissant, tiré d'une horloge commune ; chaque
+suppression laisse une pierre tombale (id, seq). Un export delta « depuis le
+curseur c » contient les objets dont seq > c et les suppressions de seq > c :
+son coût dépend de l'activité, pas du volume de données.
+
+ChangeSeqIndex est un indexeur de dépôt (add/remove/clear) : il garde les
+couples (seq, id) dans une liste triée, ce qui rend la recherche « changé
+depuis c » logarithmique. En fonctionnement normal chaque changement reçoit le
+plus grand seq et s'ajoute en fin de liste ; les entrées remplacées sont
+ignorées à la lecture puis purgées quand elles deviennent trop nombreuses.
+
+Les mêmes curseurs alimentent le flux d'événements /api/events : ChangeNotifier
+réveille les flux ouverts à chaque changement du processus.
+"""
+import asyncio
+from bisect import bisect_right
+from typing import Dict, List, Tuple
+
+
+class ChangeClock:
+    """Compteur monotone des changements (partagé par les leads et les rappels)"""
+
+    def __init__(self):
+        self.value = 0
+
+    def next(self) -> int:
+        self.value += 1
+        return self.value
+
+    def observe(self, seq: int) -> None:
+        """Au chargement : l'horloge repart au-dessus des numéros déjà attribués"""
+        if seq and seq > self.value:
+            self.value = seq
+
+
+class ChangeSeqIndex:
+    """Ids triés par numéro de changement (obj.seq) et pierres tombales des suppressions.
+
+    horizon : en deçà, les suppressions ne sont plus connues (pierres tombales
+    purgées, ou import complet) ; un delta depuis un curseur plus ancien est impossible.
+    """
+
+    source_fields = frozenset({"seq"})
+
+    def __init__(self, max_tombstones: int = 100_000):
+        self.max_tombstones = max_tombstones
+        self._entries: List[Tuple[int, str]] = []  # peut contenir des entrées périmées
+        self._unsorted = False
+        self._seqs: Dict[str, int] = {}  # id -> seq courant (fait foi)
+        self.tombstones: Dict[str, int] = {}  # id -> seq de la suppression, par seq croissant
+        self.horizon = 0
+
+    # Interface indexeur
+    def add(self, item_id: str, item) -> None:
+        seq = item.seq or 0
+        self._seqs[item_id] = seq
+        if self._entries and (seq, item_id) < self._entries[-1]:
+            self._unsorted = True  # chargement : trié une seule fois à la première requête
+        self._entries.append((seq, item_id))
+        if len(self._entries) > 2 * len(self._seqs) + 1024:
+            self._entries = sorted((s, i) for i, s in self._seqs.items())
+            self._unsorted = False
+
+    def remove(self, item_id: str) -> None:
+        self._seqs.pop(item_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._seqs.clear()
+        self._unsorted = False
+
+    # Pierres tombales
+    def tombstone(self, item_id: str, seq: int) -> None:
+        self.tombstones.pop(item_id, None)
+        self.tombstones[item_id] = seq
+        if len(self.tombstones) > self.max_tombstones:
+            # Les plus anciennes sont oubliées : l'horizon avance d'autant
+            oldest_id = next(iter(self.tombstones))
+            self.horizon = max(self.horizon, self.tombstones.pop(oldest_id))
+
+    def revive(self, item_id: str) -> None:
+        """L'id existe de nouveau (recréé) : sa pierre tombale n'a plus lieu d'être"""
+        self.tombstones.pop(item_id, None)
+
+    def restore(self, tombstones: Dict[str, int], horizon: int) -> None:
+        self.tombstones = dict(tombstones)
+        self.horizon = horizon
+
+    # Requêtes
+    def changed_since(self, seq: int) -> List[str]:
+        """Ids des objets modifiés après seq, du plus ancien au plus récent changement"""
+        if self._unsorted:
+            self._entries.sort()
+            self._unsorted = False
+        start = bisect_right(self._entries, (seq, "\uffff"))
+        changed, seen = [], set()
+        for entry_seq, item_id in self._entries[start:]:
+            if self._seqs.get(item_id) == entry_seq and item_id not in seen:
+                seen.add(item_id)
+                changed.append(item_id)
+        return changed
+
+    def deleted_since(self, seq: int) -> List[Tuple[str, int]]:
+        """(id, seq) des suppressions après seq, par seq croissant (parcours depuis la fin)"""
+        deleted = []
+        for item_id in reversed(self.tombstones):
+            deleted_seq = self.tombstones[item_id]
+            if deleted_seq <= seq:
+                break
+            deleted.append((item_id, deleted_seq))
+        deleted.reverse()
+        return deleted
+
+    def max_seq(self) -> int:
+        return max([0, self.horizon, *self._seqs.values(), *self.tombstones.values()])
+
+
+class ChangeNotifier:
+    """Réveille les tâches qui attendent un nouveau changement (flux d'événements)"""
+
+    def __init__(self):
+        self._event = asyncio.Event()
+
+    def notify(self) -> None:
+        # Un nouvel événement par changement : chaque attente en cours voit le sien déclenché
+        self._event.set()
+        self._event = asyncio.Event()
+
+    async def wait(self, timeout: float) -> bool:
+        """True si un changement a eu lieu avant timeout (secondes)"""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
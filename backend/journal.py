@@ -0,0 +1,262 @@
+"""Journal append-only pour la persistance du CRM.
+
+Chaque mutation (création, modification, suppression d'un lead ou d'un rappel)
+ajoute une ligne JSON compacte au journal au lieu de réécrire tout le fichier de
+sauvegarde. Les fichiers leads_backup.json / reminders_backup.json servent
+d'instantané (snapshot) : au démarrage on charge l'instantané puis on rejoue le
+journal. Quand le journal dépasse un seuil, il est compacté en arrière-plan dans
+un nouvel instantané.
+
+Les mutations ne sont pas écrites immédiatement : elles marquent l'objet comme
+modifié ("dirty") et une tâche de fond écrit le journal au plus une fois par
+intervalle. Plusieurs modifications rapides du même objet (glisser-déposer
+Kanban) sont ainsi regroupées en un seul enregistrement, et l'écriture disque se
+fait hors de la boucle asyncio.
+"""
+import asyncio
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Tuple
+
+
+def atomic_write_json(path: str, data, **dump_kwargs) -> None:
+    """Écrit un fichier JSON de façon atomique (fichier temporaire + rename)"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, **dump_kwargs)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class PersistenceJournal:
+    """Journal d'écriture en ajout seul avec flush groupé et compaction en arrière-plan.
+
+    Un enregistrement est un objet JSON sur une ligne :
+    {"k": "lead"|"reminder", "op": "upsert"|"delete", "id": ..., "d": {...}}
+
+    Les enregistrements "upsert" contiennent l'état complet de l'objet : rejouer
+    le journal est donc idempotent, ce qui permet de compacter pendant que de
+    nouvelles mutations arrivent.
+    """
+
+    def __init__(self, path: str, compact_threshold: int,
+                 snapshot_factory: Callable[[], Callable[[], None]],
+                 resolver: Callable[[str, str], Optional[dict]],
+                 flush_interval: float = 1.0):
+        # snapshot_factory capture rapidement l'état courant (sur la boucle) ;
+        # la fonction retournée écrit l'instantané dans un thread.
+        # resolver(kind, id) retourne l'état courant d'un objet, ou None s'il a été supprimé.
+        self.path = path
+        self.compacting_path = f"{path}.compacting"
+        self.compact_threshold = compact_threshold
+        self.flush_interval = flush_interval
+        self._snapshot_factory = snapshot_factory
+        self._resolver = resolver
+        self._pending = {}  # (kind, id) -> None, dict pour garder l'ordre des mutations
+        self._lock = threading.Lock()
+        self._file = None
+        self._torn = False  # écriture interrompue : la dernière ligne peut être incomplète
+        self._compaction_thread: Optional[threading.Thread] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        return self._file
+
+    def mark(self, kind: str, record_id: str) -> None:
+        """Marque un objet comme modifié ; il sera journalisé au prochain flush"""
+        self._pending.pop((kind, record_id), None)
+        self._pending[(kind, record_id)] = None
+
+    @contextmanager
+    def batch(self):
+        """Mutations groupées : rien à faire ici, un bloc synchrone est toujours
+        collecté par un seul flush (la collecte se fait sur la boucle asyncio)"""
+        yield
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._pending)
+
+    def _collect(self) -> List[str]:
+        """Sérialise les objets modifiés depuis le dernier flush (état le plus récent)"""
+        pending, self._pending = self._pending, {}
+        lines = []
+        for kind, record_id in pending:
+            data = self._resolver(kind, record_id)
+            record = {"k": kind, "op": "delete" if data is None else "upsert", "id": record_id}
+            if data is not None:
+                record["d"] = data
+            lines.append(json.dumps(record, ensure_ascii=False, separators=(',', ':'), default=str))
+        return lines
+
+    def _requeue(self, keys: List[Tuple[str, str]]) -> None:
+        """Écriture échouée : les objets repassent en attente (avant ceux modifiés depuis) et
+        seront réécrits au prochain flush avec leur état le plus récent"""
+        pending = {key: None for key in keys if key not in self._pending}
+        pending.update(self._pending)
+        self._pending = pending
+
+    def _write(self, lines: List[str]) -> int:
+        """Écrit un lot d'enregistrements et retourne la taille du journal"""
+        with self._lock:
+            f = self._open()
+            # Après une écriture interrompue, on repart sur une ligne neuve : la ligne
+            # incomplète est ignorée au rejeu sans emporter le premier enregistrement du lot
+            data = ("\n" if self._torn else "") + "\n".join(lines) + "\n"
+            self._torn = True
+            try:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            except BaseException:
+                self._file = None
+                try:
+                    f.close()
+                except OSError:
+                    pass  # tampon impossible à vider : même erreur que l'écriture
+                raise
+            self._torn = False
+            return f.tell()
+
+    def flush(self) -> int:
+        """Écriture synchrone des mutations en attente (utilisé à l'arrêt). En cas d'erreur
+        d'écriture, les mutations restent en attente et l'erreur est propagée"""
+        if not self._pending:
+            return 0
+        keys = list(self._pending)
+        try:
+            size = self._write(self._collect())
+        except BaseException:
+            self._requeue(keys)
+            raise
+        if size >= self.compact_threshold:
+            self.compact()
+        return len(keys)
+
+    async def _flush_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            if not self._pending:
+                continue
+            keys = list(self._pending)
+            try:
+                size = await loop.run_in_executor(None, self._write, self._collect())
+            except Exception as e:
+                # Disque plein, erreur d'E/S : rien n'est perdu, nouvel essai au prochain intervalle
+                self._requeue(keys)
+                print(f"❌ Erreur écriture journal ({len(keys)} mutations gardées en attente) : {str(e)}")
+                continue
+            if size >= self.compact_threshold:
+                self.compact()
+
+    def start(self) -> None:
+        """Démarre la tâche de flush en arrière-plan (à appeler dans la boucle asyncio)"""
+        if self._flusher is None or self._flusher.done():
+            self._stopping = asyncio.Event()
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def shutdown(self) -> None:
+        """Arrête la tâche de fond après un dernier flush et ferme le journal"""
+        if self._flusher is not None:
+            self._stopping.set()
+            await self._flusher
+            self._flusher = None
+        self.flush()
+        self.close()
+
+    def replay(self, kind: Optional[str] = None) -> Iterator[dict]:
+        """Rejoue les enregistrements du journal (segment en compaction puis courant)"""
+        for path in (self.compacting_path, self.path):
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Dernière ligne tronquée après un arrêt brutal
+                        print(f"⚠️ Ligne de journal ignorée (corrompue) dans {path}")
+                        continue
+                    if kind is None or record.get("k") == kind:
+                        yield record
+
+    def size(self) -> int:
+        """Taille totale du journal sur disque (octets)"""
+        total = 0
+        for path in (self.compacting_path, self.path):
+            if os.path.exists(path):
+                total += os.path.getsize(path)
+        return total
+
+    def compact(self, wait: bool = False) -> None:
+        """Compacte le journal dans un nouvel instantané (en arrière-plan par défaut)"""
+        previous = self._compaction_thread
+        if wait and previous is not None:
+            previous.join()
+
+        with self._lock:
+            if self._compaction_thread is not None and self._compaction_thread.is_alive():
+                return
+
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+            # Rotation : le journal courant devient le segment en compaction
+            if os.path.exists(self.path):
+                if os.path.exists(self.compacting_path):
+                    # Compaction précédente interrompue : on fusionne les segments
+                    with open(self.compacting_path, 'a', encoding='utf-8') as dst, \
+                            open(self.path, 'r', encoding='utf-8') as src:
+                        dst.write(src.read())
+                    os.remove(self.path)
+                else:
+                    os.replace(self.path, self.compacting_path)
+
+            write_snapshot = self._snapshot_factory()
+            self._compaction_thread = threading.Thread(
+                target=self._run_compaction, args=(write_snapshot,),
+                name="journal-compaction", daemon=True
+            )
+            self._compaction_thread.start()
+
+        if wait:
+            self._compaction_thread.join()
+
+    def wait_compaction(self) -> None:
+        """Attend la fin de la compaction en cours (bloquant : à appeler hors de la boucle)"""
+        thread = self._compaction_thread
+        if thread is not None:
+            thread.join()
+
+    def _run_compaction(self, write_snapshot: Callable[[], None]) -> None:
+        try:
+            write_snapshot()
+            if os.path.exists(self.compacting_path):
+                os.remove(self.compacting_path)
+            print("🗜️ Journal compacté dans un nouvel instantané")
+        except Exception as e:
+            # Le segment est conservé : il sera rejoué au prochain démarrage
+            print(f"❌ Erreur compaction journal : {str(e)}")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        thread = self._compaction_thread
+        if thread is not None:
+            thread.join()
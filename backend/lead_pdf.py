@@ -0,0 +1,130 @@
+"""Rendu ReportLab des fiches lead.
+
+Ce module ne dépend que de ReportLab et travaille sur des dictionnaires
+(lead.model_dump()) : il peut être exécuté dans des processus de travail
+(ProcessPoolExecutor) sans importer le serveur ni ses données. Les styles et
+l'habillage des pages viennent du gabarit partagé (lead_sheet_template).
+"""
+import io
+from typing import List, Optional
+
+from pypdf import PdfReader, PdfWriter
+from reportlab.platypus import PageBreak, Paragraph, Spacer, Table
+
+from lead_sheet_template import LEAD_SHEET, LeadSheetTemplate
+
+
+def build_lead_story(lead: dict, template: LeadSheetTemplate = LEAD_SHEET) -> list:
+    """Éléments (flowables) d'une fiche lead"""
+    story = []
+    company = lead['company']
+    contact = lead['contact']
+
+    story.append(Paragraph(template.TITLE, template.title))
+    story.append(Spacer(1, 20))
+
+    # Informations lead
+    lead_info = f"""
+    <para align="center">
+    <b>Lead ID:</b> {lead['id']}<br/>
+    <b>Créé le:</b> {lead['created_at']}<br/>
+    <b>Statut:</b> <b>{lead['status'].replace('_', ' ').title()}</b>
+    </para>
+    """
+    story.append(Paragraph(lead_info, template.normal))
+    story.append(Spacer(1, 20))
+
+    # Société
+    company_data = [
+        ['Société', company['name']],
+        ['SIRET', company.get('siret') or 'Non renseigné'],
+        ['Email', company.get('email') or 'Non renseigné'],
+        ['Téléphone', company.get('phone') or 'Non renseigné']
+    ]
+    story.append(Table(company_data, colWidths=template.col_widths, style=template.company_table))
+    story.append(Spacer(1, 15))
+
+    # Contact
+    contact_data = [
+        ['Contact', f"{contact['first_name']} {contact['last_name']}"],
+        ['Email', contact['email']],
+        ['Téléphone', contact.get('phone') or 'Non renseigné']
+    ]
+    story.append(Table(contact_data, colWidths=template.col_widths, style=template.contact_table))
+    story.append(Spacer(1, 15))
+
+    # Véhicules
+    for vehicle in lead.get('vehicles') or []:
+        vehicle_data = [
+            ['Véhicule', f"{vehicle['brand']} {vehicle['model']}"],
+            ['Carburant', vehicle['carburant']],
+            ['Tarif mensuel', vehicle.get('tarif_mensuel') or 'Non renseigné'],
+            ['Commission', vehicle.get('commission_agence') or 'Non renseigné'],
+            ['Statut paiement', 'Payé' if vehicle.get('payment_status') == 'paye' else 'En attente']
+        ]
+        story.append(Table(vehicle_data, colWidths=template.col_widths, style=template.vehicle_table))
+        story.append(Spacer(1, 10))
+
+    # Note
+    if lead.get('note'):
+        story.append(Paragraph(f"<b>Notes:</b> {lead['note']}", template.normal))
+
+    return story
+
+
+def render_lead_pdf(lead: dict, output, template: LeadSheetTemplate = LEAD_SHEET) -> None:
+    """Rend une fiche lead dans output (chemin ou fichier binaire)"""
+    template.build(output, build_lead_story(lead, template))
+
+
+def render_lead_pdf_bytes(lead: dict) -> bytes:
+    """Rend une fiche lead en mémoire (utilisé par les processus de travail)"""
+    buffer = io.BytesIO()
+    render_lead_pdf(lead, buffer)
+    return buffer.getvalue()
+
+
+def render_lead_pdf_spooled(lead: dict, max_memory: int, spill_path: str) -> Optional[bytes]:
+    """Rend une fiche lead dans un processus de travail : retourne les octets s'ils tiennent dans
+    max_memory, sinon les écrit dans spill_path et retourne None (seul le chemin revient au serveur)"""
+    content = render_lead_pdf_bytes(lead)
+    if len(content) <= max_memory:
+        return content
+    with open(spill_path, 'wb') as f:
+        f.write(content)
+    return None
+
+
+def render_leads_pdf(leads: list, output, template: LeadSheetTemplate = LEAD_SHEET,
+                     number_pages: bool = True) -> None:
+    """Rend plusieurs fiches dans un seul document (une fiche par page)"""
+    story = []
+    for i, lead in enumerate(leads):
+        if i:
+            story.append(PageBreak())
+        story.extend(build_lead_story(lead, template))
+    template.build(output, story, number_pages=number_pages)
+
+
+def render_leads_pdf_part(leads: list, path: str) -> None:
+    """Morceau d'un export PDF unique, rendu dans un processus de travail (pages non numérotées)"""
+    render_leads_pdf(leads, path, number_pages=False)
+
+
+def merge_pdf_parts(paths: List[str], output: str, template: LeadSheetTemplate = LEAD_SHEET) -> None:
+    """Assemble les morceaux dans l'ordre et numérote les pages du document complet"""
+    writer = PdfWriter()
+    for path in paths:
+        writer.append(PdfReader(path))
+    numbers = PdfReader(io.BytesIO(template.page_number_overlay(len(writer.pages))))
+    for page, number in zip(writer.pages, numbers.pages):
+        page.merge_page(number)
+    writer.add_metadata({"/Title": template.TITLE, "/Author": template.AUTHOR})
+    with open(output, 'wb') as f:
+        writer.write(f)
+
+
+def lead_pdf_filename(company_name: str, lead_id: str) -> str:
+    """Nom de fichier de téléchargement d'une fiche"""
+    safe_company_name = company_name.replace(' ', '_').replace('/', '_').replace('\\', '_')
+    return f"Lead_{safe_company_name}_{lead_id}.pdf"
@@ -0,0 +1,122 @@
+"""Gabarit partagé des fiches lead PDF.
+
+Les feuilles de styles, le style du titre, les TableStyle des tableaux société /
+contact / véhicule, le logo (assets/logo.png) et l'habillage des pages
+(bandeau, logo et pied de page) sont construits une seule fois au chargement
+du module, puis réutilisés par tous les rendus (y compris dans chaque
+processus de travail).
+
+Un document rendu par morceaux (export PDF unique) est construit sans numéros
+de page ; page_number_overlay fournit ensuite la numérotation continue, apposée
+lors de l'assemblage.
+"""
+import io
+import os
+from typing import Optional
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.platypus import SimpleDocTemplate, TableStyle
+
+BRAND_BLUE = colors.HexColor('#2563eb')
+GRID_GREY = colors.HexColor('#d1d5db')
+LOGO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "logo.png")
+LOGO_HEIGHT = 0.4*inch
+
+
+class LeadSheetTemplate:
+    """Styles et habillage de page d'une fiche lead"""
+
+    TITLE = "CRM LEASINPROFESSIONNEL.FR - Fiche Lead"
+    FOOTER = "CRM LEASINPROFESSIONNEL.FR - Document confidentiel"
+    AUTHOR = "LEASINPROFESSIONNEL.FR"
+
+    def __init__(self, logo_path: Optional[str] = LOGO_PATH):
+        # Logo décodé une seule fois ; fiche sans logo si le fichier est absent
+        self.logo = ImageReader(logo_path) if logo_path and os.path.exists(logo_path) else None
+        if self.logo is not None:
+            logo_width, logo_height = self.logo.getSize()
+            self.logo_size = (LOGO_HEIGHT * logo_width / logo_height, LOGO_HEIGHT)
+        styles = getSampleStyleSheet()
+        self.normal = styles['Normal']
+        self.title = ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=24,
+            spaceAfter=30,
+            alignment=TA_CENTER,
+            textColor=BRAND_BLUE
+        )
+        self.col_widths = [2.5*inch, 4*inch]
+        self.company_table = TableStyle([
+            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#eff6ff')),
+            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('GRID', (0, 0), (-1, -1), 1, GRID_GREY)
+        ])
+        self.contact_table = TableStyle([
+            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f0fdf4')),
+            ('GRID', (0, 0), (-1, -1), 1, GRID_GREY)
+        ])
+        self.vehicle_table = TableStyle([
+            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#fef2f2')),
+            ('GRID', (0, 0), (-1, -1), 1, GRID_GREY)
+        ])
+
+    def draw_page_furniture(self, canvas, doc) -> None:
+        """Bandeau de couleur et logo en haut de page, pied de page"""
+        width, height = doc.pagesize
+        canvas.saveState()
+        canvas.setFillColor(BRAND_BLUE)
+        canvas.rect(0, height - 0.25*inch, width, 0.25*inch, stroke=0, fill=1)
+        if self.logo is not None:
+            logo_width, logo_height = self.logo_size
+            canvas.drawImage(self.logo, doc.leftMargin, height - 0.4*inch - logo_height,
+                             width=logo_width, height=logo_height, mask='auto')
+        canvas.setStrokeColor(GRID_GREY)
+        canvas.line(doc.leftMargin, 0.75*inch, width - doc.rightMargin, 0.75*inch)
+        canvas.setFillColor(colors.HexColor('#6b7280'))
+        canvas.setFont('Helvetica', 8)
+        canvas.drawString(doc.leftMargin, 0.55*inch, self.FOOTER)
+        canvas.restoreState()
+
+    def draw_page_number(self, canvas, page: int) -> None:
+        """Numéro de page en bas à droite (marges de SimpleDocTemplate)"""
+        width, _ = A4
+        canvas.saveState()
+        canvas.setFillColor(colors.HexColor('#6b7280'))
+        canvas.setFont('Helvetica', 8)
+        canvas.drawRightString(width - inch, 0.55*inch, f"Page {page}")
+        canvas.restoreState()
+
+    def build(self, output, story: list, number_pages: bool = True) -> None:
+        """Construit le document dans output (chemin ou fichier binaire) ; sans number_pages,
+        les pages ne sont pas numérotées (morceau d'un document assemblé ensuite)"""
+        def draw_page(canvas, doc):
+            self.draw_page_furniture(canvas, doc)
+            if number_pages:
+                self.draw_page_number(canvas, doc.page)
+
+        doc = SimpleDocTemplate(output, pagesize=A4, title=self.TITLE, author=self.AUTHOR)
+        doc.build(story, onFirstPage=draw_page, onLaterPages=draw_page)
+
+    def page_number_overlay(self, page_count: int) -> bytes:
+        """PDF transparent de page_count pages portant uniquement les numéros 1..page_count"""
+        buffer = io.BytesIO()
+        canvas = Canvas(buffer, pagesize=A4)
+        for page in range(1, page_count + 1):
+            self.draw_page_number(canvas, page)
+            canvas.showPage()
+        canvas.save()
+        return buffer.getvalue()
+
+
+# Instance partagée, construite une fois au démarrage
+LEAD_SHEET = LeadSheetTemplate()
@@ -0,0 +1,155 @@
+"""Cache disque des fiches PDF des leads.
+
+Chaque PDF est rangé sous une clé calculée à partir des champs affichés dans la
+fiche : tant que ces champs ne changent pas, le même fichier est resservi
+(et la clé sert d'ETag). Le cache est un LRU borné en nombre de fichiers et en
+taille totale ; les entrées les moins récemment servies sont supprimées.
+
+Le répertoire peut être partagé par plusieurs workers : un fichier temporaire
+porte le pid du processus qui le rend, et seuls ceux d'un processus arrêté (ou
+trop anciens) sont supprimés au démarrage.
+"""
+import glob
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import BinaryIO, Optional
+
+# Âge (secondes) au-delà duquel un fichier temporaire est orphelin, même si son pid existe (réutilisé)
+STALE_TEMP_AGE = 3600
+
+
+def process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def is_stale_temp(path: str, now: float) -> bool:
+    """Fichier temporaire <clé>.<pid>.<hasard>.tmp abandonné par son processus"""
+    parts = os.path.basename(path).split(".")
+    try:
+        if now - os.path.getmtime(path) > STALE_TEMP_AGE:
+            return True
+    except FileNotFoundError:
+        return False
+    return len(parts) < 4 or not parts[-3].isdigit() or not process_alive(int(parts[-3]))
+
+
+class PdfCache:
+    """LRU de fichiers PDF sur disque, borné en nombre et en octets"""
+
+    def __init__(self, directory: str, max_entries: int, max_bytes: int):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # clé -> taille, du plus ancien au plus récent
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load_existing()
+
+    def _load_existing(self) -> None:
+        """Reprend les PDF déjà présents (redémarrage) et supprime les fichiers temporaires orphelins
+        (ceux des autres workers encore en cours de rendu sont laissés)"""
+        now = time.time()
+        for tmp_path in glob.glob(os.path.join(self.directory, "*.tmp")):
+            if is_stale_temp(tmp_path, now):
+                try:
+                    os.remove(tmp_path)
+                except FileNotFoundError:
+                    pass
+        existing = glob.glob(os.path.join(self.directory, "*.pdf"))
+        existing.sort(key=os.path.getmtime)
+        for path in existing:
+            key = os.path.splitext(os.path.basename(path))[0]
+            size = os.path.getsize(path)
+            self._entries[key] = size
+            self._total_bytes += size
+        self._evict()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def open(self, key: str) -> Optional[BinaryIO]:
+        """PDF en cache ouvert en lecture (marqué comme récemment utilisé), ou None.
+
+        Le fichier est ouvert sous le verrou : une éviction ultérieure (ici ou dans un autre
+        worker) supprime son nom, mais le descripteur reste lisible jusqu'à sa fermeture."""
+        with self._lock:
+            if key not in self._entries:
+                return None
+            try:
+                file = open(self.path_for(key), 'rb')
+            except FileNotFoundError:
+                self._total_bytes -= self._entries.pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return file
+
+    def temp_path(self, key: str) -> str:
+        """Fichier temporaire où rendre un PDF avant de l'ajouter au cache (add)"""
+        return os.path.join(self.directory, f"{key}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp")
+
+    def touch(self, key: str) -> None:
+        """Marque une entrée comme récemment utilisée sans l'ouvrir (réponse 304)"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+
+    def add(self, key: str, rendered_path: str) -> BinaryIO:
+        """Ajoute au cache un PDF déjà rendu (renommé atomiquement) et le retourne ouvert en lecture.
+
+        Le fichier est ouvert avant d'être publié : une éviction concurrente ne peut pas le
+        retirer avant son envoi."""
+        file = open(rendered_path, 'rb')
+        try:
+            os.replace(rendered_path, self.path_for(key))
+            size = os.fstat(file.fileno()).st_size
+        except BaseException:
+            file.close()
+            raise
+        with self._lock:
+            self._total_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._total_bytes += size
+            self._evict()
+        return file
+
+    def _evict(self) -> None:
+        # On garde toujours l'entrée la plus récente (celle qu'on s'apprête à servir)
+        while len(self._entries) > 1 and (
+                len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes):
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self.path_for(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
+
+
+def remove_orphaned_pdfs(directory: str, pattern: str = "lead_*_*.pdf") -> int:
+    """Supprime les PDF temporaires laissés par l'ancienne génération (jamais nettoyés)"""
+    removed = 0
+    for path in glob.glob(os.path.join(directory, pattern)):
+        try:
+            os.remove(path)
+            removed += 1
+        except OSError:
+            pass
+    return removed
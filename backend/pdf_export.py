@@ -0,0 +1,195 @@
+"""Export PDF groupé (fin de mois : toutes les fiches des clients livrés...).
+
+Les fiches sont rendues en parallèle dans un ProcessPoolExecutor : la boucle
+asyncio ne fait qu'assembler les résultats dans une archive ZIP. Un PDF unique
+est rendu par morceaux de chunk_size fiches, en parallèle, puis les morceaux
+sont assemblés (et les pages numérotées) dans un processus de travail. Chaque
+export est un job identifié dont on peut suivre la progression.
+
+L'état de chaque job est aussi écrit à côté de son archive (export_<id>.json) :
+avec plusieurs workers, n'importe lequel peut répondre au suivi et au
+téléchargement d'un export lancé par un autre.
+"""
+import asyncio
+import json
+import os
+import re
+import time
+import uuid
+import zipfile
+from concurrent.futures import Executor
+from typing import Dict, List, Optional
+
+from lead_pdf import lead_pdf_filename, merge_pdf_parts, render_lead_pdf_bytes, render_leads_pdf_part
+from pdf_cache import process_alive
+
+EXPORT_FORMATS = ("zip", "pdf")
+JOB_ID_RE = re.compile(r"[0-9a-f]{8}")
+# Progression écrite au plus une fois par intervalle (secondes)
+STATE_WRITE_INTERVAL = 0.5
+# PDF unique : fiches par morceau rendu dans un processus de travail
+DEFAULT_CHUNK_SIZE = 25
+
+
+class PdfExportJob:
+    """État d'un export : pending -> running -> done | error"""
+
+    def __init__(self, job_id: str, total: int, export_format: str, directory: str):
+        self.id = job_id
+        self.total = total
+        self.format = export_format
+        self.path = os.path.join(directory, f"export_{job_id}.{export_format}")
+        self.state_path = state_path(directory, job_id)
+        self.status = "pending"
+        self.done = 0
+        self.errors: List[dict] = []
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.owner = os.getpid()
+        self.task: Optional[asyncio.Task] = None
+        self._saved_at = 0.0
+
+    def save(self, force: bool = True) -> None:
+        """Écrit l'état partagé (atomique) ; sans force, au plus une fois par STATE_WRITE_INTERVAL"""
+        now = time.monotonic()
+        if not force and now - self._saved_at < STATE_WRITE_INTERVAL:
+            return
+        self._saved_at = now
+        state = {**self.to_dict(), "created_at": self.created_at, "finished_at": self.finished_at, "owner": self.owner}
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    @classmethod
+    def load(cls, directory: str, job_id: str) -> Optional["PdfExportJob"]:
+        """Job lancé par un autre processus, d'après son état partagé (None s'il n'existe pas)"""
+        try:
+            with open(state_path(directory, job_id), 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        job = cls(job_id, state["total"], state["format"], directory)
+        job.status, job.done, job.errors = state["status"], state["done"], state["errors"]
+        job.created_at, job.finished_at, job.owner = state["created_at"], state["finished_at"], state["owner"]
+        if job.finished_at is None and not process_alive(job.owner):
+            # Worker arrêté pendant l'export : le job ne se terminera jamais
+            job.status, job.finished_at = "error", time.time()
+            job.errors.append({"error": "export interrompu (arrêt du worker)"})
+            job.save()
+        return job
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "format": self.format,
+            "total": self.total,
+            "done": self.done,
+            "progress": round(self.done / self.total, 3) if self.total else 1.0,
+            "errors": self.errors,
+        }
+
+
+async def run_pdf_export(job: PdfExportJob, leads: List[dict], executor: Executor,
+                         chunk_size: int = DEFAULT_CHUNK_SIZE) -> None:
+    """Rend les fiches dans le pool de processus et assemble le résultat"""
+    loop = asyncio.get_running_loop()
+    job.status = "running"
+    job.save()
+    tmp_path = f"{job.path}.tmp"
+    part_paths = []
+    try:
+        if job.format == "pdf":
+            # Un seul document : morceaux rendus en parallèle, assemblés dans l'ordre
+            async def render_part(chunk: List[dict], path: str):
+                await loop.run_in_executor(executor, render_leads_pdf_part, chunk, path)
+                job.done += len(chunk)
+                job.save(force=False)
+
+            chunks = [leads[i:i + chunk_size] for i in range(0, len(leads), chunk_size)] or [[]]
+            part_paths = [f"{tmp_path}.{i}" for i in range(len(chunks))]
+            # Tous les morceaux terminés avant de lever une erreur : aucun n'est écrit après le nettoyage
+            results = await asyncio.gather(*(render_part(chunk, path) for chunk, path in zip(chunks, part_paths)),
+                                           return_exceptions=True)
+            errors = [result for result in results if isinstance(result, BaseException)]
+            if errors:
+                raise errors[0]
+            await loop.run_in_executor(executor, merge_pdf_parts, part_paths, tmp_path)
+        else:
+            async def render(lead: dict):
+                try:
+                    return lead, await loop.run_in_executor(executor, render_lead_pdf_bytes, lead), None
+                except Exception as e:
+                    return lead, None, e
+
+            # ZIP_STORED : les PDF sont déjà compressés
+            with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_STORED) as archive:
+                for next_result in asyncio.as_completed([render(lead) for lead in leads]):
+                    lead, content, error = await next_result
+                    if error is not None:
+                        job.errors.append({"lead_id": lead['id'], "error": str(error)})
+                    else:
+                        archive.writestr(lead_pdf_filename(lead['company']['name'], lead['id']), content)
+                    job.done += 1
+                    job.save(force=False)
+        os.replace(tmp_path, job.path)
+        job.status = "done"
+    except Exception as e:
+        job.status = "error"
+        job.errors.append({"error": str(e)})
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    finally:
+        for path in part_paths:
+            if os.path.exists(path):
+                os.remove(path)
+        job.finished_at = time.time()
+        job.save()
+
+
+def state_path(directory: str, job_id: str) -> str:
+    return os.path.join(directory, f"export_{job_id}.json")
+
+
+class PdfExportRegistry:
+    """Jobs d'export de ce processus et, par leur état partagé, ceux des autres workers ;
+    les jobs terminés expirent après ttl secondes"""
+
+    def __init__(self, directory: str, ttl: float, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.directory = directory
+        self.ttl = ttl
+        self.chunk_size = chunk_size
+        self._jobs: Dict[str, PdfExportJob] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self, leads: List[dict], export_format: str, executor: Executor) -> PdfExportJob:
+        self.cleanup()
+        job = PdfExportJob(str(uuid.uuid4())[:8], len(leads), export_format, self.directory)
+        self._jobs[job.id] = job
+        job.save()
+        job.task = asyncio.get_running_loop().create_task(run_pdf_export(job, leads, executor, self.chunk_size))
+        return job
+
+    def get(self, job_id: str) -> Optional[PdfExportJob]:
+        job = self._jobs.get(job_id)
+        if job is None and JOB_ID_RE.fullmatch(job_id):
+            job = PdfExportJob.load(self.directory, job_id)
+        return job
+
+    def cleanup(self) -> None:
+        """Supprime les exports expirés, y compris ceux des autres workers"""
+        now = time.time()
+        for name in os.listdir(self.directory):
+            job_id = name[len("export_"):-len(".json")]
+            if not (name.startswith("export_") and name.endswith(".json") and JOB_ID_RE.fullmatch(job_id)):
+                continue
+            job = self._jobs.get(job_id) or PdfExportJob.load(self.directory, job_id)
+            if job is None or job.finished_at is None or now - job.finished_at <= self.ttl:
+                continue
+            for path in (job.path, f"{job.path}.tmp", job.state_path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            self._jobs.pop(job_id, None)
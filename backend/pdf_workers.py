@@ -0,0 +1,154 @@
+"""Rendu PDF hors de la boucle asyncio, à concurrence bornée.
+
+BoundedRenderPool exécute les rendus dans un pool de processus limité à
+`concurrency` rendus simultanés ; au-delà, les requêtes attendent dans une file
+de taille `max_queue`. Quand la file est pleine, RenderPoolSaturated est levée
+(le serveur répond 503 avec Retry-After). Les temps d'attente et de rendu sont
+mesurés pour dimensionner le pool.
+"""
+import asyncio
+import math
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Callable
+
+
+# Seul module dont les processus de travail ont besoin (ReportLab et le gabarit, pas le serveur)
+WORKER_MODULES = ["lead_pdf"]
+
+
+def make_process_pool(max_workers: int) -> ProcessPoolExecutor:
+    """Pool de processus démarrés par un forkserver (spawn à défaut).
+
+    Jamais de fork du serveur lui-même : il a des threads (écriture du journal, exécuteurs)
+    dont les verrous seraient copiés dans l'état où ils sont, et des fichiers / une connexion
+    SQLite ouverts. Le forkserver est un processus neuf qui précharge WORKER_MODULES une fois ;
+    chaque processus de travail en est une copie, sans importer server.py.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(WORKER_MODULES)
+    else:
+        context = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+
+
+def pool_broken(executor: Executor) -> bool:
+    """Un processus de travail est mort (mémoire épuisée, signal) : le pool refuse désormais
+    tout rendu (BrokenProcessPool) et doit être recréé"""
+    return bool(getattr(executor, "_broken", False))
+
+
+class RenderPoolSaturated(Exception):
+    """File d'attente pleine : réessayer après retry_after secondes"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"File de rendu pleine, réessayer dans {retry_after}s")
+        self.retry_after = retry_after
+
+
+class LatencyStats:
+    """Compteurs et percentiles sur les dernières mesures (millisecondes)"""
+
+    def __init__(self, window: int = 500):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._recent = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        ms = seconds * 1000
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+        self._recent.append(ms)
+
+    @property
+    def average(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p: float) -> float:
+        if not self._recent:
+            return 0.0
+        ordered = sorted(self._recent)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.average, 2),
+            "p50_ms": round(self.percentile(0.50), 2),
+            "p95_ms": round(self.percentile(0.95), 2),
+            "max_ms": round(self.max, 2),
+        }
+
+
+class BoundedRenderPool:
+    """Exécute des rendus dans un exécuteur avec concurrence et file d'attente bornées"""
+
+    def __init__(self, executor_factory: Callable[[int], Executor], concurrency: int, max_queue: int):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self._executor_factory = executor_factory
+        self._executor = None
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.queued = 0
+        self.running = 0
+        self.rejected = 0
+        self.queue_wait = LatencyStats()
+        self.render_time = LatencyStats()
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is not None and pool_broken(self._executor):
+            print("⚠️ Pool de rendu PDF cassé (processus de travail arrêté) : recréé")
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._executor is None:
+            self._executor = self._executor_factory(self.concurrency)
+        return self._executor
+
+    def retry_after(self) -> int:
+        """Estimation du délai avant qu'une place se libère (secondes)"""
+        per_render = (self.render_time.average or 1000) / 1000
+        return max(1, math.ceil(per_render * (self.queued + 1) / self.concurrency))
+
+    async def run(self, fn, *args):
+        if self.running >= self.concurrency and self.queued >= self.max_queue:
+            self.rejected += 1
+            raise RenderPoolSaturated(self.retry_after())
+
+        enqueued_at = time.perf_counter()
+        self.queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+
+        try:
+            self.running += 1
+            started_at = time.perf_counter()
+            self.queue_wait.record(started_at - enqueued_at)
+            result = await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+            self.render_time.record(time.perf_counter() - started_at)
+            return result
+        finally:
+            self.running -= 1
+            self._semaphore.release()
+
+    def metrics(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "queue_wait": self.queue_wait.to_dict(),
+            "render_time": self.render_time.to_dict(),
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
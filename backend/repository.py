@@ -0,0 +1,515 @@
+"""Dépôts en mémoire (leads et rappels) avec index maintenus incrémentalement.
+
+LeadRepository et ReminderRepository se comportent comme les dictionnaires
+leads_db / reminders_db d'origine (id -> objet) mais mettent à jour leurs index
+à chaque écriture, ce qui permet de filtrer en O(résultat) au lieu de parcourir
+tous les objets.
+
+Les modifications faites directement sur un objet (setattr dans update_lead,
+update_reminder...) doivent être suivies d'un appel à reindex(id). Un indexeur
+peut déclarer les attributs qu'il lit (source_fields) : reindex(id, fields)
+ne met alors à jour que les indexeurs concernés par les attributs modifiés.
+
+Chargement paresseux : un dépôt peut contenir des LazyRecord (résumé +
+emplacement dans l'instantané) au lieu des objets complets. Les indexeurs
+travaillent sur le résumé ; l'objet est chargé au premier accès (d[id],
+get, values...) et gardé dans un cache LRU. Un objet modifié (reindex, pin)
+est épinglé : il remplace son résumé et ne quitte plus la mémoire.
+
+sqlite_store.py offre la même interface avec un stockage SQLite
+(STORAGE_BACKEND=sqlite).
+"""
+import heapq
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict, defaultdict, deque
+from collections.abc import MutableMapping
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from changes import ChangeSeqIndex
+
+
+class SecondaryIndex:
+    """Index valeur -> ids pour les champs de filtrage des leads"""
+
+    FIELDS = ("status", "assigned_to_commercial", "assigned_to_prestataire", "brand")
+    source_fields = frozenset({"status", "assigned_to_commercial", "assigned_to_prestataire", "vehicles"})
+
+    def __init__(self):
+        self._buckets: Dict[str, Dict[str, Set[str]]] = {f: defaultdict(set) for f in self.FIELDS}
+        self._keys: Dict[str, Dict[str, Set[str]]] = {}  # lead_id -> valeurs indexées
+
+    @staticmethod
+    def extract(lead) -> Dict[str, Set[str]]:
+        # Statut toujours indexé, même vide : index_values("status") liste tous les leads (/api/leads/active)
+        return {
+            "status": {lead.status or ""},
+            "assigned_to_commercial": {lead.assigned_to_commercial} if lead.assigned_to_commercial else set(),
+            "assigned_to_prestataire": {lead.assigned_to_prestataire} if lead.assigned_to_prestataire else set(),
+            "brand": {v.brand.lower() for v in lead.vehicles if v.brand},
+        }
+
+    def add(self, lead_id: str, lead) -> None:
+        keys = self.extract(lead)
+        self._keys[lead_id] = keys
+        for field, values in keys.items():
+            for value in values:
+                self._buckets[field][value].add(lead_id)
+
+    def remove(self, lead_id: str) -> None:
+        keys = self._keys.pop(lead_id, None)
+        if not keys:
+            return
+        for field, values in keys.items():
+            bucket = self._buckets[field]
+            for value in values:
+                ids = bucket.get(value)
+                if ids is not None:
+                    ids.discard(lead_id)
+                    if not ids:
+                        del bucket[value]
+
+    def clear(self) -> None:
+        for bucket in self._buckets.values():
+            bucket.clear()
+        self._keys.clear()
+
+    def ids_for(self, field: str, values: Iterable[str]) -> Set[str]:
+        """Ids indexés pour ces valeurs (l'ensemble retourné ne doit pas être modifié)"""
+        bucket = self._buckets[field]
+        values = list(values)
+        if len(values) == 1:
+            return bucket.get(values[0], set())
+        result: Set[str] = set()
+        for value in values:
+            result |= bucket.get(value, set())
+        return result
+
+    def values(self, field: str) -> Set[str]:
+        return set(self._buckets[field])
+
+
+class CreationOrderIndex:
+    """Leads triés par (created_at, id), l'ordre de pagination des listes, tenu à jour à chaque écriture"""
+
+    source_fields = frozenset({"created_at"})
+
+    def __init__(self):
+        self._sorted: List[Tuple[str, str]] = []
+        self._keys: Dict[str, Tuple[str, str]] = {}
+
+    def add(self, lead_id: str, lead) -> None:
+        key = self._keys[lead_id] = (lead.created_at or "", lead_id)
+        insort(self._sorted, key)
+
+    def remove(self, lead_id: str) -> None:
+        key = self._keys.pop(lead_id, None)
+        if key is None:
+            return
+        position = bisect_left(self._sorted, key)
+        if position < len(self._sorted) and self._sorted[position] == key:
+            del self._sorted[position]
+
+    def clear(self) -> None:
+        self._sorted.clear()
+        self._keys.clear()
+
+    def key(self, lead_id: str) -> Tuple[str, str]:
+        return self._keys[lead_id]
+
+    def ids(self) -> List[str]:
+        """Tous les ids, dans l'ordre de pagination"""
+        return [lead_id for _, lead_id in self._sorted]
+
+    def first_after(self, after: Optional[Tuple[str, str]], limit: int) -> List[Tuple[str, str]]:
+        """Les limit premières clés après after (toutes si after est None)"""
+        start = bisect_right(self._sorted, after) if after is not None else 0
+        return self._sorted[start:start + limit]
+
+    def smallest_after(self, ids: Iterable[str], after: Optional[Tuple[str, str]], limit: int) -> List[Tuple[str, str]]:
+        """Les limit plus petites clés après after parmi ids, sans trier tout l'ensemble"""
+        keys = map(self._keys.__getitem__, ids)
+        if after is not None:
+            keys = (key for key in keys if key > after)
+        return heapq.nsmallest(limit, keys)
+
+
+def affected_indexers(indexers: Iterable, fields: Optional[Iterable[str]]) -> List:
+    """Indexeurs à mettre à jour quand fields ont changé (tous si fields est None ;
+    un indexeur sans source_fields est toujours concerné)"""
+    if fields is None:
+        return list(indexers)
+    fields = set(fields)
+    return [indexer for indexer in indexers
+            if getattr(indexer, "source_fields", None) is None or indexer.source_fields & fields]
+
+
+class LazyRecord:
+    """Objet non chargé : emplacement dans l'instantané et résumé.
+
+    Les attributs du résumé (ceux que lisent les indexeurs) sont accessibles
+    directement ; location = (lecteur, offset, longueur) est remplacé d'un bloc
+    quand une compaction réécrit l'instantané.
+    """
+
+    __slots__ = ("location", "summary")
+
+    def __init__(self, location: tuple, summary):
+        self.location = location
+        self.summary = summary
+
+    def __getattr__(self, name: str):
+        return getattr(self.summary, name)
+
+    def read(self) -> dict:
+        reader, offset, length = self.location
+        return reader.read(offset, length)
+
+    def read_raw(self) -> bytes:
+        reader, offset, length = self.location
+        return reader.read_raw(offset, length)
+
+
+class IndexedRepository(MutableMapping):
+    """Dictionnaire id -> objet qui notifie ses indexeurs (add/remove/clear) à chaque écriture"""
+
+    def __init__(self, *indexers):
+        self._items: Dict[str, object] = {}
+        self._order: Dict[str, int] = {}  # ordre d'insertion, pour des résultats stables
+        self._next_order = 0
+        self._indexers = list(indexers)
+        # Chargement paresseux (load_lazy)
+        self._hydrate: Optional[Callable[[LazyRecord], object]] = None
+        self._cache: "OrderedDict[str, object]" = OrderedDict()  # objets chargés non modifiés (LRU)
+        self._cache_size = 0
+        self._deferred: List = []  # indexeurs qui ont besoin de l'objet complet
+        self._unindexed: deque = deque()  # ids pas encore vus par les indexeurs différés
+
+    def add_indexer(self, indexer) -> None:
+        """Enregistre un indexeur supplémentaire et l'alimente avec les objets existants"""
+        self._indexers.append(indexer)
+        for item_id, item in self._items.items():
+            indexer.add(item_id, item)
+
+    # Interface dictionnaire
+    def __getitem__(self, item_id: str):
+        item = self._items[item_id]
+        if type(item) is LazyRecord:
+            return self._load(item_id, item)
+        return item
+
+    def __setitem__(self, item_id: str, item) -> None:
+        if item_id in self._items:
+            for indexer in self._indexers:
+                indexer.remove(item_id)
+            self._cache.pop(item_id, None)
+        else:
+            self._order[item_id] = self._next_order
+            self._next_order += 1
+        self._items[item_id] = item
+        for indexer in self._indexers:
+            indexer.add(item_id, item)
+
+    def __delitem__(self, item_id: str) -> None:
+        del self._items[item_id]
+        del self._order[item_id]
+        self._cache.pop(item_id, None)
+        for indexer in self._indexers:
+            indexer.remove(item_id)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, item_id) -> bool:
+        return item_id in self._items
+
+    def clear(self) -> None:
+        self._items.clear()
+        self._order.clear()
+        self._cache.clear()
+        self._unindexed.clear()
+        for indexer in self._indexers:
+            indexer.clear()
+
+    def adopt(self, other: "IndexedRepository") -> None:
+        """Remplace tout le contenu par celui d'un dépôt construit à part (import).
+
+        other doit avoir le même type et des indexeurs des mêmes classes, dans le
+        même ordre : les structures sont reprises telles quelles (aucune réindexation),
+        les objets indexeurs restent les mêmes. other ne doit plus être utilisé ensuite.
+        """
+        if type(other) is not type(self) or \
+                [type(i) for i in other._indexers] != [type(i) for i in self._indexers]:
+            raise ValueError("Dépôt incompatible : types ou indexeurs différents")
+        self._items, self._order, self._next_order = other._items, other._order, other._next_order
+        self._cache, self._unindexed = other._cache, other._unindexed
+        for indexer, staged in zip(self._indexers, other._indexers):
+            vars(indexer).update(vars(staged))
+
+    def reindex(self, item_id: str, fields: Optional[Iterable[str]] = None) -> None:
+        """À appeler après une modification en place d'un objet (fields : attributs modifiés, si connus)"""
+        item = self.pin(item_id)
+        for indexer in affected_indexers(self._indexers, fields):
+            indexer.remove(item_id)
+            indexer.add(item_id, item)
+
+    def _in_order(self, ids: Iterable[str]) -> List:
+        return [self[i] for i in sorted(ids, key=self._order.__getitem__)]
+
+    # Chargement paresseux
+    def load_lazy(self, records: Iterable[Tuple[str, LazyRecord]], hydrate: Callable[[LazyRecord], object],
+                  cache_size: int, deferred: Iterable = ()) -> None:
+        """Range des résumés au lieu des objets (dépôt vide).
+
+        hydrate(record) construit l'objet complet. Les indexeurs de deferred ne
+        peuvent pas travailler sur un résumé : ils ne reçoivent les objets que
+        par index_deferred(), appelé en tâche de fond.
+        """
+        deferred_ids = {id(indexer) for indexer in deferred}
+        self._hydrate = hydrate
+        self._cache_size = cache_size
+        self._deferred = [indexer for indexer in self._indexers if id(indexer) in deferred_ids]
+        summary_indexers = [indexer for indexer in self._indexers if id(indexer) not in deferred_ids]
+        for item_id, record in records:
+            self._order[item_id] = self._next_order
+            self._next_order += 1
+            self._items[item_id] = record
+            for indexer in summary_indexers:
+                indexer.add(item_id, record)
+            if self._deferred:
+                self._unindexed.append(item_id)
+
+    def _load(self, item_id: str, record: LazyRecord):
+        item = self._cache.get(item_id)
+        if item is not None:
+            self._cache.move_to_end(item_id)
+            return item
+        item = self._cache[item_id] = self._hydrate(record)
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return item
+
+    def pin(self, item_id: str):
+        """Objet sur le point d'être modifié : il remplace son résumé et reste en mémoire"""
+        item = self._items[item_id]
+        if type(item) is LazyRecord:
+            loaded = self._cache.pop(item_id, None)
+            item = self._items[item_id] = loaded if loaded is not None else self._hydrate(item)
+        return item
+
+    def stored_items(self) -> List[Tuple[str, object]]:
+        """(id, objet) tels que stockés, sans chargement : les objets non chargés restent des LazyRecord"""
+        return list(self._items.items())
+
+    def unnumbered_ids(self) -> List[str]:
+        """Ids des objets sans numéro de changement"""
+        return [item_id for item_id, item in self._items.items() if not item.seq]
+
+    def index_deferred(self, limit: Optional[int] = None) -> int:
+        """Alimente les indexeurs différés avec au plus limit objets ; retourne le nombre restant.
+        Les objets sont relus sans entrer dans le cache."""
+        done = 0
+        while self._unindexed and (limit is None or done < limit):
+            item_id = self._unindexed.popleft()
+            item = self._items.get(item_id)
+            if item is None:
+                continue  # supprimé entre-temps
+            if type(item) is LazyRecord:
+                cached = self._cache.get(item_id)
+                item = cached if cached is not None else self._hydrate(item)
+            for indexer in self._deferred:
+                indexer.remove(item_id)
+                indexer.add(item_id, item)
+            done += 1
+        return len(self._unindexed)
+
+    def lazy_stats(self) -> dict:
+        """Résumés non chargés, objets en cache et objets restant à indexer"""
+        return {
+            "summaries": sum(1 for item in self._items.values() if type(item) is LazyRecord),
+            "cached": len(self._cache),
+            "cache_size": self._cache_size,
+            "unindexed": len(self._unindexed),
+        }
+
+
+class LeadRepository(IndexedRepository):
+    """Leads indexés par statut, commercial, prestataire et marque de véhicule"""
+
+    def __init__(self):
+        self.index = SecondaryIndex()
+        self.changes = ChangeSeqIndex()
+        self.creation_order = CreationOrderIndex()
+        super().__init__(self.index, self.changes, self.creation_order)
+
+    # Requêtes indexées
+    def _matching_ids(self, statuses: Optional[Set[str]], commercials: Optional[Set[str]],
+                      prestataires: Optional[Set[str]], brands: Optional[Set[str]]) -> Optional[Set[str]]:
+        """Ids correspondant à tous les filtres fournis (None : aucun filtre, tous les leads)"""
+        criteria = [
+            ("status", statuses),
+            ("assigned_to_commercial", commercials),
+            ("assigned_to_prestataire", prestataires),
+            ("brand", {b.lower() for b in brands} if brands is not None else None),
+        ]
+        candidate_sets = [self.index.ids_for(field, values)
+                          for field, values in criteria if values is not None]
+        if not candidate_sets:
+            return None
+
+        candidate_sets.sort(key=len)
+        ids = candidate_sets[0]
+        for other in candidate_sets[1:]:
+            ids = ids & other
+            if not ids:
+                break
+        return ids
+
+    def find(self, statuses: Optional[Set[str]] = None, commercials: Optional[Set[str]] = None,
+             prestataires: Optional[Set[str]] = None, brands: Optional[Set[str]] = None) -> List:
+        """Leads correspondant à tous les filtres fournis (None = pas de filtre), triés par (created_at, id)
+        comme les pages de find_page"""
+        ids = self._matching_ids(statuses, commercials, prestataires, brands)
+        if ids is None:
+            return [self[i] for i in self.creation_order.ids()]
+        return [self[i] for i in sorted(ids, key=self.creation_order.key)]
+
+    def find_page(self, after: Optional[Tuple[str, str]], limit: int, statuses: Optional[Set[str]] = None,
+                  commercials: Optional[Set[str]] = None, prestataires: Optional[Set[str]] = None,
+                  brands: Optional[Set[str]] = None) -> Tuple[List, int]:
+        """(au plus limit leads triés par (created_at, id) après le curseur after, total filtré).
+
+        Sans filtre, la page est une tranche de l'index trié ; avec filtres, les limit plus
+        petites clés des leads retenus (heapq). Seuls les leads de la page sont chargés."""
+        ids = self._matching_ids(statuses, commercials, prestataires, brands)
+        if ids is None:
+            keys = self.creation_order.first_after(after, limit)
+            total = len(self._items)
+        else:
+            keys = self.creation_order.smallest_after(ids, after, limit)
+            total = len(ids)
+        return [self[i] for _, i in keys], total
+
+    def ids_for(self, field: str, values: Iterable[str]) -> Set[str]:
+        """Ids des leads ayant l'une de ces valeurs"""
+        return self.index.ids_for(field, values)
+
+    def index_values(self, field: str) -> Set[str]:
+        """Valeurs présentes dans un index (ex. tous les statuts utilisés)"""
+        return self.index.values(field)
+
+
+def parse_reminder_timestamp(value: Optional[str]) -> Optional[float]:
+    """Date ISO d'un rappel -> timestamp (une date sans fuseau est en heure locale)"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except (ValueError, TypeError):
+        return None
+
+
+class ReminderTimeIndex:
+    """Rappels non complétés triés par date (timestamp calculé une seule fois).
+
+    Les rappels complétés sont exclus de la liste triée et suivis dans un
+    ensemble séparé ; une recherche sur N jours est un bisect suivi d'une tranche.
+    """
+
+    source_fields = frozenset({"reminder_date", "completed"})
+
+    def __init__(self):
+        self._pending: List[Tuple[float, str]] = []
+        self._timestamps: Dict[str, float] = {}
+        self.completed: Set[str] = set()
+        self.invalid: Set[str] = set()  # dates illisibles, signalées une seule fois
+
+    def add(self, reminder_id: str, reminder) -> None:
+        if reminder.completed:
+            self.completed.add(reminder_id)
+            return
+        timestamp = parse_reminder_timestamp(reminder.reminder_date)
+        if timestamp is None:
+            self.invalid.add(reminder_id)
+            print(f"⚠️ Rappel {reminder_id} : date invalide '{reminder.reminder_date}', ignoré dans le calendrier")
+            return
+        self._timestamps[reminder_id] = timestamp
+        insort(self._pending, (timestamp, reminder_id))
+
+    def remove(self, reminder_id: str) -> None:
+        self.completed.discard(reminder_id)
+        self.invalid.discard(reminder_id)
+        timestamp = self._timestamps.pop(reminder_id, None)
+        if timestamp is None:
+            return
+        position = bisect_left(self._pending, (timestamp, reminder_id))
+        if position < len(self._pending) and self._pending[position] == (timestamp, reminder_id):
+            del self._pending[position]
+
+    def clear(self) -> None:
+        self._pending.clear()
+        self._timestamps.clear()
+        self.completed.clear()
+        self.invalid.clear()
+
+    def between(self, start: float, end: float) -> List[str]:
+        """Ids des rappels non complétés entre start et end (inclus), par date croissante"""
+        lo = bisect_left(self._pending, (start, ""))
+        hi = bisect_right(self._pending, (end, "\uffff"), lo)
+        return [reminder_id for _, reminder_id in self._pending[lo:hi]]
+
+
+class ReminderLeadIndex:
+    """lead_id -> ids des rappels du lead"""
+
+    source_fields = frozenset({"lead_id"})
+
+    def __init__(self):
+        self._by_lead: Dict[str, Set[str]] = defaultdict(set)
+        self._lead_of: Dict[str, str] = {}
+
+    def add(self, reminder_id: str, reminder) -> None:
+        self._lead_of[reminder_id] = reminder.lead_id
+        self._by_lead[reminder.lead_id].add(reminder_id)
+
+    def remove(self, reminder_id: str) -> None:
+        lead_id = self._lead_of.pop(reminder_id, None)
+        if lead_id is None:
+            return
+        ids = self._by_lead.get(lead_id)
+        if ids is not None:
+            ids.discard(reminder_id)
+            if not ids:
+                del self._by_lead[lead_id]
+
+    def clear(self) -> None:
+        self._by_lead.clear()
+        self._lead_of.clear()
+
+    def ids(self, lead_id: str) -> Set[str]:
+        return self._by_lead.get(lead_id, set())
+
+
+class ReminderRepository(IndexedRepository):
+    """Rappels (source unique) avec index temporel et index par lead"""
+
+    def __init__(self):
+        self.time_index = ReminderTimeIndex()
+        self.lead_index = ReminderLeadIndex()
+        self.changes = ChangeSeqIndex()
+        super().__init__(self.time_index, self.lead_index, self.changes)
+
+    def for_lead(self, lead_id: str) -> List:
+        """Rappels d'un lead, dans l'ordre de création"""
+        return self._in_order(self.lead_index.ids(lead_id))
+
+    def for_leads(self, lead_ids: List[str]) -> Dict[str, List]:
+        """Rappels de plusieurs leads (une page)"""
+        return {lead_id: self.for_lead(lead_id) for lead_id in lead_ids}
+
+    def upcoming(self, start: float, end: float) -> List:
+        """Rappels non complétés dont la date est entre start et end (timestamps)"""
+        return [self._items[i] for i in self.time_index.between(start, end)]
@@ -0,0 +1,136 @@
+"""Index inversé pour la recherche plein texte des leads.
+
+Couvre les mêmes champs que la recherche du frontend (société, prénom, nom,
+marque et modèle des véhicules, note). Les textes sont normalisés sans accents
+("Citroën" -> "citroen", "Série 3" -> "serie", "3") et chaque terme de la
+requête est recherché comme préfixe dans un vocabulaire trié (bisect).
+L'index est enregistré comme indexeur du LeadRepository et suit donc chaque
+création, modification et suppression de lead.
+"""
+import re
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_LIGATURES = str.maketrans({"œ": "oe", "Œ": "oe", "æ": "ae", "Æ": "ae", "ß": "ss"})
+
+# Un terme complet vaut plus qu'un simple préfixe
+PREFIX_FACTOR = 0.5
+
+
+def fold(text: str) -> str:
+    """Minuscules sans accents ni ligatures"""
+    decomposed = unicodedata.normalize("NFKD", text.translate(_LIGATURES))
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    return _TOKEN_RE.findall(fold(text))
+
+
+class SearchIndex:
+    """Index inversé token -> {lead_id: poids} avec recherche par préfixe"""
+
+    FIELD_WEIGHTS = {
+        "company": 3.0,
+        "contact": 2.0,
+        "vehicle": 1.5,
+        "note": 1.0,
+    }
+
+    source_fields = frozenset({"company", "contact", "note", "vehicles"})
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[str, float]] = {}
+        self._vocabulary: List[str] = []  # tokens triés, pour les préfixes
+        self._documents: Dict[str, Dict[str, float]] = {}  # lead_id -> {token: poids}
+
+    def _document(self, lead) -> Dict[str, float]:
+        fields = [
+            ("company", lead.company.name),
+            ("contact", lead.contact.first_name),
+            ("contact", lead.contact.last_name),
+            ("note", lead.note),
+        ]
+        for vehicle in lead.vehicles:
+            fields.append(("vehicle", vehicle.brand))
+            fields.append(("vehicle", vehicle.model))
+
+        document: Dict[str, float] = {}
+        for field, text in fields:
+            weight = self.FIELD_WEIGHTS[field]
+            for token in tokenize(text):
+                if weight > document.get(token, 0.0):
+                    document[token] = weight
+        return document
+
+    def add(self, lead_id: str, lead) -> None:
+        document = self._document(lead)
+        self._documents[lead_id] = document
+        for token, weight in document.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                insort(self._vocabulary, token)
+            postings[lead_id] = weight
+
+    def remove(self, lead_id: str) -> None:
+        document = self._documents.pop(lead_id, None)
+        if not document:
+            return
+        for token in document:
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(lead_id, None)
+            if not postings:
+                del self._postings[token]
+                position = bisect_left(self._vocabulary, token)
+                if position < len(self._vocabulary) and self._vocabulary[position] == token:
+                    del self._vocabulary[position]
+
+    def clear(self) -> None:
+        self._postings.clear()
+        self._vocabulary.clear()
+        self._documents.clear()
+
+    def _match_term(self, term: str, candidates: Optional[Set[str]]) -> Dict[str, float]:
+        """Scores des leads contenant un token commençant par term"""
+        start = bisect_left(self._vocabulary, term)
+        end = bisect_left(self._vocabulary, term + "\x7f", start)
+        scores: Dict[str, float] = {}
+        for token in self._vocabulary[start:end]:
+            factor = 1.0 if token == term else PREFIX_FACTOR
+            for lead_id, weight in self._postings[token].items():
+                if candidates is not None and lead_id not in candidates:
+                    continue
+                score = weight * factor
+                if score > scores.get(lead_id, 0.0):
+                    scores[lead_id] = score
+        return scores
+
+    def search(self, query: str, candidates: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        """Leads contenant tous les termes de la requête, triés par score décroissant"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        allowed = set(candidates) if candidates is not None else None
+
+        # Termes les plus longs d'abord : ils sont les plus sélectifs
+        terms.sort(key=len, reverse=True)
+        totals: Optional[Dict[str, float]] = None
+        for term in terms:
+            scores = self._match_term(term, allowed)
+            if totals is None:
+                totals = scores
+            else:
+                totals = {lead_id: total + scores[lead_id]
+                          for lead_id, total in totals.items() if lead_id in scores}
+            if not totals:
+                return []
+            allowed = set(totals)
+
+        return sorted(totals.items(), key=lambda item: (-item[1], item[0]))
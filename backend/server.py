@@ -1,26 +1,95 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi import Body, FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import HTMLResponse, FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, PrivateAttr, TypeAdapter, ValidationError, ValidationInfo, field_serializer, model_validator
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, List, Optional, Tuple, get_args
+from collections import namedtuple
+import asyncio
 import uuid
+import base64
+import hashlib
 from datetime import datetime, date
 import uvicorn
+from uvicorn.supervisors import Multiprocess
 import os
 import json
 import tempfile
+import shutil
+import socket
 from dateutil.relativedelta import relativedelta  # Pour ajouter des mois
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER
+from journal import PersistenceJournal, atomic_write_json
+from repository import LazyRecord, LeadRepository, ReminderRepository
+from sqlite_store import SqliteLeadRepository, SqliteReminderRepository, SqliteStore
+from changes import ChangeClock, ChangeNotifier
+from snapshot import SnapshotFormatError, SnapshotReader, read_binary_snapshot, write_binary_snapshot
+from search_index import SearchIndex
+from aggregates import LeadStatsAggregate, drift
+from amounts import parse_amount
+from backup_stream import (
+    NDJSON_MEDIA_TYPE, BackupFormatError, accepts_gzip, backup_section, gzip_stream,
+    iter_backup_ndjson, iter_backup_records
+)
+from pdf_cache import PdfCache, remove_orphaned_pdfs
+from lead_pdf import lead_pdf_filename, render_lead_pdf, render_lead_pdf_spooled
+from pdf_export import EXPORT_FORMATS, PdfExportRegistry
+from pdf_workers import BoundedRenderPool, RenderPoolSaturated, make_process_pool, pool_broken
 
 # Chemin des fichiers de sauvegarde
-BACKUP_DIR = "/app/backup"
+BACKUP_DIR = os.environ.get("BACKUP_DIR", "/app/backup")
+# Stockage des leads et rappels : "memory" (en mémoire, journal + instantanés ci-dessous) ou
+# "sqlite" (base SQLite en mode WAL, requêtes indexées ; reprend les sauvegardes fichier au premier démarrage)
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "memory")
+SQLITE_FILE = f"{BACKUP_DIR}/crm.sqlite3"
+# Nombre de workers uvicorn (python server.py) : plus d'un seulement avec STORAGE_BACKEND=sqlite,
+# le stockage en mémoire n'étant pas partagé entre processus (idem pour uvicorn --workers)
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", 1))
+# Attente maximale (secondes) du verrou d'écriture SQLite tenu par un autre worker (au-delà : 503)
+SQLITE_LOCK_TIMEOUT = float(os.environ.get("SQLITE_LOCK_TIMEOUT", 30.0))
 LEADS_BACKUP_FILE = f"{BACKUP_DIR}/leads_backup.json"
 REMINDERS_BACKUP_FILE = f"{BACKUP_DIR}/reminders_backup.json"
+CHANGES_BACKUP_FILE = f"{BACKUP_DIR}/changes_backup.json"
+SNAPSHOT_FILE = f"{BACKUP_DIR}/snapshot.bin"
+# Format de l'instantané écrit à chaque compaction : "json" (lisible) ou "binary" (démarrage rapide)
+SNAPSHOT_FORMAT = os.environ.get("SNAPSHOT_FORMAT", "json")
+# Chargement des leads au démarrage : "eager" (tous en mémoire) ou "lazy" (résumés, leads chargés
+# à la demande ; nécessite SNAPSHOT_FORMAT=binary) avec un cache LRU de LEAD_CACHE_SIZE leads
+LEAD_LOAD_MODE = os.environ.get("LEAD_LOAD_MODE", "eager")
+LEAD_CACHE_SIZE = int(os.environ.get("LEAD_CACHE_SIZE", 10000))
+JOURNAL_FILE = f"{BACKUP_DIR}/journal.ndjson"
+# Taille du journal (octets) au-delà de laquelle il est compacté dans un instantané
+JOURNAL_COMPACT_THRESHOLD = int(os.environ.get("JOURNAL_COMPACT_THRESHOLD", 5 * 1024 * 1024))
+# Intervalle minimal (secondes) entre deux écritures du journal : les mutations sont regroupées
+PERSIST_FLUSH_INTERVAL = float(os.environ.get("PERSIST_FLUSH_INTERVAL", 1.0))
+
+# Flux d'événements /api/events : relecture de la base partagée (SQLite, écritures des autres
+# workers) et commentaire de maintien de la connexion, en secondes
+EVENTS_POLL_INTERVAL = float(os.environ.get("EVENTS_POLL_INTERVAL", 1.0))
+EVENTS_HEARTBEAT_INTERVAL = float(os.environ.get("EVENTS_HEARTBEAT_INTERVAL", 15.0))
+EVENTS_BATCH_SIZE = 500
+
+# Cache des fiches PDF (LRU sur disque, borné en nombre de fichiers et en octets)
+PDF_CACHE_DIR = os.environ.get("PDF_CACHE_DIR", os.path.join(tempfile.gettempdir(), "crm_pdf_cache"))
+PDF_CACHE_MAX_ENTRIES = int(os.environ.get("PDF_CACHE_MAX_ENTRIES", 200))
+PDF_CACHE_MAX_BYTES = int(os.environ.get("PDF_CACHE_MAX_BYTES", 50 * 1024 * 1024))
+
+# Export PDF groupé : processus de rendu et durée de conservation des archives (secondes)
+PDF_EXPORT_WORKERS = int(os.environ.get("PDF_EXPORT_WORKERS", os.cpu_count() or 2))
+PDF_EXPORT_DIR = os.environ.get("PDF_EXPORT_DIR", os.path.join(tempfile.gettempdir(), "crm_pdf_exports"))
+PDF_EXPORT_JOB_TTL = float(os.environ.get("PDF_EXPORT_JOB_TTL", 3600))
+# PDF unique : fiches rendues par morceau (morceaux rendus en parallèle puis assemblés)
+PDF_EXPORT_CHUNK_SIZE = int(os.environ.get("PDF_EXPORT_CHUNK_SIZE", 25))
+
+# Rendu des fiches individuelles : rendus simultanés et file d'attente max (au-delà : 503)
+PDF_RENDER_CONCURRENCY = int(os.environ.get("PDF_RENDER_CONCURRENCY", 2))
+PDF_RENDER_MAX_QUEUE = int(os.environ.get("PDF_RENDER_MAX_QUEUE", 16))
+# Mode de service des fiches : "cache" (LRU disque ci-dessus) ou "memory" (rendu en mémoire, envoyé en flux)
+PDF_RENDER_MODE = os.environ.get("PDF_RENDER_MODE", "cache")
+# En mode "memory", taille (octets) au-delà de laquelle la fiche rendue est écrite sur disque
+# (puis envoyée par blocs) au lieu de revenir en mémoire dans le serveur
+PDF_SPOOL_MAX_MEMORY = int(os.environ.get("PDF_SPOOL_MAX_MEMORY", 1024 * 1024))
+PDF_STREAM_CHUNK_SIZE = 64 * 1024
 
 # Créer le répertoire de sauvegarde s'il n'existe pas
 os.makedirs(BACKUP_DIR, exist_ok=True)
@@ -39,11 +108,34 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Change-Cursor", "ETag", "Retry-After"],
 )
 
-# Base de données en mémoire
-leads_db = {}
-reminders_db = {}
+# Base de données en mémoire (leads indexés par statut, commercial, prestataire et marque)
+leads_db = LeadRepository()
+# Index plein texte (société, contact, véhicules, note) maintenu à chaque mutation
+search_index = SearchIndex()
+leads_db.add_indexer(search_index)
+
+def lead_stats_contribution(lead):
+    """Contribution d'un lead au dashboard : (statut, commissions payées, en attente) en centimes"""
+    paid = pending = 0
+    for vehicle in lead.vehicles:
+        amount = vehicle.commission_agence_cents
+        if amount:
+            if vehicle.payment_status == "paye":
+                paid += amount
+            else:
+                pending += amount
+    return lead.status, paid, pending
+
+# Agrégats du dashboard (statuts, commissions) maintenus à chaque mutation
+LEAD_STATS_FIELDS = {"status", "vehicles"}  # attributs lus par lead_stats_contribution
+stats_aggregate = LeadStatsAggregate(lead_stats_contribution, LEAD_STATS_FIELDS)
+leads_db.add_indexer(stats_aggregate)
+
+# Rappels indexés par date (hors rappels complétés) pour le calendrier
+reminders_db = ReminderRepository()
 
 # Modèles
 class Company(BaseModel):
@@ -59,6 +151,7 @@ class Contact(BaseModel):
     phone: Optional[str] = None
 
 class Vehicle(BaseModel):
+    id: Optional[str] = None  # Identifiant stable (PATCH par id plutôt que par position)
     brand: str
     model: str
     carburant: str = "diesel"
@@ -67,6 +160,20 @@ class Vehicle(BaseModel):
     tarif_mensuel: Optional[str] = None
     commission_agence: Optional[str] = None
     payment_status: str = "en_attente"
+    # Montants normalisés, recalculés depuis les champs texte à chaque création/modification
+    tarif_mensuel_cents: Optional[int] = None
+    commission_agence_cents: Optional[int] = None
+    currency: Optional[str] = None
+    
+    @model_validator(mode='after')
+    def normalize_amounts(self, info: ValidationInfo):
+        # Instantané écrit par le serveur : montants déjà normalisés, pas de nouvelle analyse
+        if info.context and info.context.get("trusted"):
+            return self
+        self.tarif_mensuel_cents, tarif_currency = parse_amount(self.tarif_mensuel)
+        self.commission_agence_cents, commission_currency = parse_amount(self.commission_agence)
+        self.currency = commission_currency or tarif_currency
+        return self
 
 class Reminder(BaseModel):
     id: Optional[str] = None
@@ -79,6 +186,8 @@ class Reminder(BaseModel):
     completed: bool = False
     completed_at: Optional[str] = None
     created_at: Optional[str] = None
+    seq: int = 0  # Numéro du dernier changement (sauvegardes incrémentales)
+    version: int = 0  # Incrémenté à chaque modification (concurrence optimiste : ETag / If-Match)
 
 class Lead(BaseModel):
     id: Optional[str] = None
@@ -92,8 +201,23 @@ class Lead(BaseModel):
     contract_end_date: Optional[str] = None
     assigned_to_commercial: Optional[str] = None
     assigned_to_prestataire: Optional[str] = None
-    reminders: List[Reminder] = []
+    reminders: List[Reminder] = []  # Matérialisé à la lecture depuis reminders_db
     created_at: Optional[str] = None  # Timestamp automatique système
+    seq: int = 0  # Numéro du dernier changement (sauvegardes incrémentales)
+    version: int = 0  # Incrémenté à chaque modification (concurrence optimiste : ETag / If-Match)
+    _page_reminders: Optional[List[Reminder]] = PrivateAttr(default=None)  # préchargés (with_page_reminders)
+    
+    def stored_reminders(self) -> List[Reminder]:
+        if self._page_reminders is not None:
+            return self._page_reminders
+        return reminders_db.for_lead(self.id)
+    
+    @field_serializer('reminders')
+    def materialize_reminders(self, reminders):
+        """Les rappels ne sont stockés qu'une fois (reminders_db) : on les rattache à la lecture"""
+        if reminders or not self.id:
+            return reminders
+        return self.stored_reminders()
 
 class LeadCreate(BaseModel):
     company: Company
@@ -106,6 +230,52 @@ class LeadCreate(BaseModel):
     assigned_to_commercial: Optional[str] = None
     assigned_to_prestataire: Optional[str] = None
 
+# Validation par lots (import de sauvegarde)
+lead_list_adapter = TypeAdapter(List[Lead])
+reminder_list_adapter = TypeAdapter(List[Reminder])
+TRUSTED_CONTEXT = {"trusted": True}
+
+# 💤 Résumé d'un lead rangé dans l'index de l'instantané binaire : les champs lus par les
+# index résidents (statut, commercial, prestataire, marques, commissions, seq) et par le tri
+CompanySummary = namedtuple("CompanySummary", "name")
+VehicleSummary = namedtuple("VehicleSummary", "brand commission_agence_cents payment_status")
+LeadSummary = namedtuple("LeadSummary", "id status assigned_to_commercial assigned_to_prestataire company created_at seq vehicles")
+
+def lead_summary(lead) -> tuple:
+    """Résumé sérialisable (tuples simples, pour marshal) d'un lead ou d'un LazyRecord"""
+    return (lead.id, lead.status, lead.assigned_to_commercial, lead.assigned_to_prestataire,
+            lead.company.name, lead.created_at, lead.seq,
+            tuple((v.brand, v.commission_agence_cents, v.payment_status) for v in lead.vehicles))
+
+def summary_view(summary: tuple) -> LeadSummary:
+    lead_id, status, commercial, prestataire, company_name, created_at, seq, vehicles = summary
+    return LeadSummary(lead_id, status, commercial, prestataire, CompanySummary(company_name),
+                       created_at, seq, tuple(VehicleSummary(*v) for v in vehicles))
+
+def reminder_from_snapshot(data: dict) -> Reminder:
+    """Rappel relu dans l'instantané binaire : écrit par le serveur, construit sans validation"""
+    return Reminder.model_construct(**data)
+
+def lead_from_snapshot(data: dict) -> "Lead":
+    """Lead relu dans l'instantané binaire : modèles imbriqués construits sans validation
+    (marshal restitue les types d'origine, montants déjà normalisés)"""
+    data = dict(data)
+    data['company'] = Company.model_construct(**data['company'])
+    data['contact'] = Contact.model_construct(**data['contact'])
+    data['vehicles'] = [Vehicle.model_construct(**v) for v in data.get('vehicles', ())]
+    data['reminders'] = [reminder_from_snapshot(r) for r in data.get('reminders', ())]
+    return Lead.model_construct(**data)
+
+def hydrate_lead(record: LazyRecord) -> "Lead":
+    """Lead complet relu dans l'instantané (montants déjà normalisés)"""
+    return lead_from_snapshot(record.read())
+
+class PdfExportRequest(BaseModel):
+    ids: Optional[List[str]] = None
+    status: Optional[str] = None  # ex. "livree" ou "offre,accord"
+    commercial: Optional[str] = None
+    format: str = "zip"  # zip (une fiche par fichier) ou pdf (document unique)
+
 class ReminderCreate(BaseModel):
     lead_id: str
     title: str
@@ -201,71 +371,278 @@ CONTRACT_DURATIONS = [12, 24, 36, 48, 60]
 ANNUAL_MILEAGES = [10000, 15000, 20000, 25000, 30000, 35000, 40000, 50000]
 
 # Fonctions de sauvegarde et restauration (après définition des modèles)
-def save_leads_to_file():
-    """Sauvegarde automatique des leads dans un fichier JSON"""
+def assign_vehicle_ids(vehicles: List[Vehicle]) -> List[Vehicle]:
+    """Donne un identifiant aux véhicules qui n'en ont pas encore (adressables par PATCH)"""
+    for vehicle in vehicles:
+        if not vehicle.id:
+            vehicle.id = str(uuid.uuid4())[:8]
+    return vehicles
+
+def lead_from_dict(lead_dict: dict) -> Lead:
+    """Reconstruit un Lead depuis un dictionnaire sauvegardé"""
+    return Lead(
+        id=lead_dict.get('id'),
+        company=Company(**lead_dict['company']),
+        contact=Contact(**lead_dict['contact']),
+        vehicles=[Vehicle(**v) for v in lead_dict.get('vehicles', [])],
+        status=lead_dict.get('status', 'premier_contact'),
+        note=lead_dict.get('note'),
+        lead_creation_date=lead_dict.get('lead_creation_date'),
+        delivery_date=lead_dict.get('delivery_date'),
+        contract_end_date=lead_dict.get('contract_end_date'),
+        assigned_to_commercial=lead_dict.get('assigned_to_commercial'),
+        assigned_to_prestataire=lead_dict.get('assigned_to_prestataire'),
+        reminders=[Reminder(**r) for r in lead_dict.get('reminders', [])],
+        created_at=lead_dict.get('created_at'),
+        seq=lead_dict.get('seq') or 0,
+        version=lead_dict.get('version') or 0
+    )
+
+def save_leads_to_file(leads_items=None):
+    """Sauvegarde complète (instantané) des leads dans un fichier JSON"""
     try:
+        if leads_items is None:
+            leads_items = list(leads_db.items())
         leads_data = {}
-        for lead_id, lead in leads_db.items():
-            leads_data[lead_id] = lead.dict() if hasattr(lead, 'dict') else lead.__dict__
+        for lead_id, lead in leads_items:
+            leads_data[lead_id] = lead.dict(exclude={'reminders'})
         
-        with open(LEADS_BACKUP_FILE, 'w', encoding='utf-8') as f:
-            json.dump(leads_data, f, indent=2, ensure_ascii=False, default=str)
+        atomic_write_json(LEADS_BACKUP_FILE, leads_data, indent=2, ensure_ascii=False, default=str)
         
         print(f"✅ Sauvegarde automatique : {len(leads_data)} leads sauvegardés")
     except Exception as e:
         print(f"❌ Erreur sauvegarde leads : {str(e)}")
+        raise
 
-def save_reminders_to_file():
-    """Sauvegarde automatique des rappels dans un fichier JSON"""
+def save_reminders_to_file(reminders_items=None):
+    """Sauvegarde complète (instantané) des rappels dans un fichier JSON"""
     try:
+        if reminders_items is None:
+            reminders_items = list(reminders_db.items())
         reminders_data = {}
-        for reminder_id, reminder in reminders_db.items():
+        for reminder_id, reminder in reminders_items:
             reminders_data[reminder_id] = reminder.dict() if hasattr(reminder, 'dict') else reminder.__dict__
         
-        with open(REMINDERS_BACKUP_FILE, 'w', encoding='utf-8') as f:
-            json.dump(reminders_data, f, indent=2, ensure_ascii=False, default=str)
+        atomic_write_json(REMINDERS_BACKUP_FILE, reminders_data, indent=2, ensure_ascii=False, default=str)
         
         print(f"✅ Sauvegarde automatique : {len(reminders_data)} rappels sauvegardés")
     except Exception as e:
         print(f"❌ Erreur sauvegarde rappels : {str(e)}")
+        raise
+
+def save_binary_snapshot(leads_items, reminders_items):
+    """Instantané binaire (leads puis rappels, index des résumés) ; relu sans revalidation au démarrage.
+    Les leads non chargés (LazyRecord) sont recopiés tels quels depuis l'instantané précédent."""
+    try:
+        locations = write_binary_snapshot(SNAPSHOT_FILE, {
+            "lead": ((lead.read_raw() if type(lead) is LazyRecord else lead.dict(exclude={'reminders'}),
+                      lead_summary(lead)) for _, lead in leads_items),
+            "reminder": ((reminder.dict(), None) for _, reminder in reminders_items)
+        })
+        # Les leads non chargés pointent désormais vers le nouvel instantané (l'ancien fichier est libéré)
+        reader = None
+        for (_, lead), (offset, length) in zip(leads_items, locations["lead"]):
+            if type(lead) is LazyRecord:
+                if reader is None:
+                    reader = SnapshotReader(SNAPSHOT_FILE)
+                lead.location = (reader, offset, length)
+        print(f"✅ Sauvegarde automatique : instantané binaire ({len(leads_items) + len(reminders_items)} enregistrements)")
+    except Exception as e:
+        print(f"❌ Erreur sauvegarde instantané binaire : {str(e)}")
+        raise
+
+def change_tracking_state() -> dict:
+    """Horloge, pierres tombales et horizons des changements (copie, pour l'instantané)"""
+    return {
+        "clock": change_clock.value,
+        "leads": {"horizon": leads_db.changes.horizon, "tombstones": dict(leads_db.changes.tombstones)},
+        "reminders": {"horizon": reminders_db.changes.horizon, "tombstones": dict(reminders_db.changes.tombstones)}
+    }
+
+def capture_snapshot():
+    """Capture l'état courant pour la compaction du journal (copie superficielle, sans charger les leads)"""
+    leads_items = leads_db.stored_items()
+    reminders_items = list(reminders_db.items())
+    changes_state = change_tracking_state()
+    
+    def write_snapshot():
+        if SNAPSHOT_FORMAT == "binary":
+            save_binary_snapshot(leads_items, reminders_items)
+            stale = (LEADS_BACKUP_FILE, REMINDERS_BACKUP_FILE)
+        else:
+            save_leads_to_file(leads_items)
+            save_reminders_to_file(reminders_items)
+            stale = (SNAPSHOT_FILE,)
+        atomic_write_json(CHANGES_BACKUP_FILE, changes_state, ensure_ascii=False)
+        # Un seul format sur disque : l'autre instantané n'est supprimé qu'une fois le
+        # nouveau écrit et relu (une erreur ci-dessus conserve l'ancien et le segment du journal)
+        for path in stale:
+            if os.path.exists(path):
+                os.remove(path)
+    
+    return write_snapshot
 
-def load_leads_from_file():
-    """Restauration automatique des leads depuis le fichier JSON"""
+def resolve_record(kind: str, record_id: str):
+    """État courant d'un lead ou d'un rappel pour le journal (None si supprimé)"""
+    if kind == "lead":
+        lead = leads_db.get(record_id)
+        # Les rappels sont journalisés séparément (source unique : reminders_db)
+        return lead.dict(exclude={'reminders'}) if lead is not None else None
+    reminder = reminders_db.get(record_id)
+    return reminder.dict() if reminder is not None else None
+
+# 📒 Journal append-only : une ligne par mutation, écrit en arrière-plan et compacté
+journal = PersistenceJournal(
+    JOURNAL_FILE, JOURNAL_COMPACT_THRESHOLD, capture_snapshot, resolve_record,
+    flush_interval=PERSIST_FLUSH_INTERVAL
+)
+
+# 🔢 Numéros de changement : chaque mutation journalisée reçoit le prochain numéro
+change_clock = ChangeClock()
+change_notifier = ChangeNotifier()  # réveille les flux /api/events
+
+def stamp_change(repository, record_id: str, bump_version: bool = True) -> int:
+    """Numéro de changement d'un objet modifié (et version suivante), ou pierre tombale s'il a été supprimé"""
+    seq = change_clock.next()
+    if record_id not in repository:
+        repository.changes.tombstone(record_id, seq)
+    else:
+        item = repository.pin(record_id)  # Objet modifié : gardé en mémoire (chargement paresseux)
+        repository.changes.remove(record_id)
+        item.seq = seq
+        if bump_version:
+            item.version += 1
+        repository.changes.add(record_id, item)
+        repository.changes.revive(record_id)
+    change_notifier.notify()
+    return seq
+
+def journal_lead(lead_id: str, bump_version: bool = True):
+    """Marque un lead comme modifié (upsert, ou suppression s'il n'existe plus)"""
+    stamp_change(leads_db, lead_id, bump_version)
+    journal.mark("lead", lead_id)
+
+def journal_reminder(reminder_id: str, bump_version: bool = True):
+    """Marque un rappel comme modifié (upsert, ou suppression s'il n'existe plus)"""
+    stamp_change(reminders_db, reminder_id, bump_version)
+    journal.mark("reminder", reminder_id)
+
+# Migrations de format détectées au chargement (instantané réécrit une fois au démarrage)
+pending_migrations = set()
+# Suppressions rejouées depuis le journal (leur pierre tombale est recréée après le chargement)
+replayed_deletions = []
+# Sauvegardes présentes mais illisibles : le démarrage est interrompu (voir plus bas)
+load_errors = []
+
+def has_legacy_amounts(lead_dict: dict) -> bool:
+    """Sauvegarde antérieure aux montants normalisés (tarif/commission en centimes)"""
+    return any('commission_agence_cents' not in v for v in lead_dict.get('vehicles', []))
+
+def binary_snapshot_is_current() -> bool:
+    """L'instantané binaire existe et est plus récent que l'instantané JSON"""
+    if not os.path.exists(SNAPSHOT_FILE):
+        return False
+    if not os.path.exists(LEADS_BACKUP_FILE):
+        return True
+    return os.path.getmtime(SNAPSHOT_FILE) >= os.path.getmtime(LEADS_BACKUP_FILE)
+
+def load_binary_snapshot() -> bool:
+    """Restauration depuis l'instantané binaire, sans revalider les enregistrements écrits par le serveur.
+    Retourne False (bases vidées) si l'instantané est absent, périmé ou illisible (erreur notée)."""
+    if not binary_snapshot_is_current():
+        return False
+    targets = {"lead": (leads_db, lead_from_snapshot), "reminder": (reminders_db, reminder_from_snapshot)}
+    
+    try:
+        for kind, record in read_binary_snapshot(SNAPSHOT_FILE):
+            repository, construct = targets[kind]
+            item = construct(record)
+            repository[item.id] = item
+    except (SnapshotFormatError, KeyError, TypeError) as e:
+        # Instantané le plus récent : le JSON éventuel est plus ancien, le journal seul incomplet
+        load_errors.append(f"instantané binaire {SNAPSHOT_FILE} illisible ({str(e)[:200]})")
+        leads_db.clear()
+        reminders_db.clear()
+        return False
+    print(f"⚡ Restauration rapide : {len(leads_db)} leads, {len(reminders_db)} rappels chargés depuis l'instantané binaire")
+    return True
+
+def load_lazy_snapshot() -> bool:
+    """Démarrage paresseux : résumés des leads lus dans l'index de l'instantané binaire, rappels complets.
+    L'index plein texte est complété en tâche de fond (index_lazy_leads).
+    Retourne False (bases vides) si l'instantané est absent, périmé, illisible ou sans index."""
+    if not binary_snapshot_is_current():
+        return False
+    try:
+        reader = SnapshotReader(SNAPSHOT_FILE)
+        index = reader.index()
+        if index is None:
+            reader.close()
+            print("⚠️ Instantané binaire sans index : chargement complet (index ajouté à la prochaine compaction)")
+            pending_migrations.add("snapshot_index")
+            return False
+        reminders = [reminder_from_snapshot(reader.read(offset, length))
+                     for offset, length, _ in index.get("reminder", [])]
+        leads_db.load_lazy(
+            ((summary[0], LazyRecord((reader, offset, length), summary_view(summary)))
+             for offset, length, summary in index.get("lead", [])),
+            hydrate_lead, LEAD_CACHE_SIZE, deferred=[search_index]
+        )
+        for reminder in reminders:
+            reminders_db[reminder.id] = reminder
+    except (SnapshotFormatError, KeyError, ValueError, TypeError) as e:
+        print(f"⚠️ Démarrage paresseux impossible ({str(e)[:200]}) : chargement complet")
+        leads_db.clear()
+        reminders_db.clear()
+        return False
+    print(f"💤 Démarrage paresseux : {len(leads_db)} leads indexés (chargés à la demande), {len(reminders_db)} rappels")
+    return True
+
+def load_leads_from_file(snapshot_loaded: bool = False):
+    """Restauration automatique des leads : instantané JSON puis rejeu du journal"""
     global leads_db
     try:
-        if os.path.exists(LEADS_BACKUP_FILE):
+        if snapshot_loaded:
+            pass  # Instantané binaire déjà chargé : seul le journal reste à rejouer
+        elif os.path.exists(LEADS_BACKUP_FILE):
             with open(LEADS_BACKUP_FILE, 'r', encoding='utf-8') as f:
                 leads_data = json.load(f)
             
+            legacy_amounts = 0
             for lead_id, lead_dict in leads_data.items():
-                lead = Lead(
-                    id=lead_dict.get('id'),
-                    company=Company(**lead_dict['company']),
-                    contact=Contact(**lead_dict['contact']),
-                    vehicles=[Vehicle(**v) for v in lead_dict.get('vehicles', [])],
-                    status=lead_dict.get('status', 'premier_contact'),
-                    note=lead_dict.get('note'),
-                    lead_creation_date=lead_dict.get('lead_creation_date'),
-                    delivery_date=lead_dict.get('delivery_date'),
-                    contract_end_date=lead_dict.get('contract_end_date'),
-                    assigned_to_commercial=lead_dict.get('assigned_to_commercial'),
-                    assigned_to_prestataire=lead_dict.get('assigned_to_prestataire'),
-                    reminders=[Reminder(**r) for r in lead_dict.get('reminders', [])],
-                    created_at=lead_dict.get('created_at')
-                )
-                leads_db[lead_id] = lead
+                leads_db[lead_id] = lead_from_dict(lead_dict)
+                if has_legacy_amounts(lead_dict):
+                    legacy_amounts += 1
             
             print(f"🔄 Restauration automatique : {len(leads_data)} leads chargés depuis la sauvegarde")
+            if legacy_amounts:
+                # Migration unique : l'instantané sera réécrit avec les montants normalisés
+                print(f"🔀 Migration : montants normalisés pour {legacy_amounts} leads")
+                pending_migrations.add("amounts")
         else:
             print("📂 Aucun fichier de sauvegarde leads trouvé")
+        
+        replayed = 0
+        for record in journal.replay("lead"):
+            if record["op"] == "delete":
+                leads_db.pop(record["id"], None)
+                replayed_deletions.append((leads_db, record["id"]))
+            else:
+                leads_db[record["id"]] = lead_from_dict(record["d"])
+            replayed += 1
+        if replayed:
+            print(f"📒 Journal : {replayed} mutations de leads rejouées")
     except Exception as e:
         print(f"❌ Erreur restauration leads : {str(e)}")
+        load_errors.append(f"leads : {str(e)[:200]}")
 
-def load_reminders_from_file():
-    """Restauration automatique des rappels depuis le fichier JSON"""
+def load_reminders_from_file(snapshot_loaded: bool = False):
+    """Restauration automatique des rappels : instantané JSON puis rejeu du journal"""
     global reminders_db
     try:
-        if os.path.exists(REMINDERS_BACKUP_FILE):
+        if snapshot_loaded:
+            pass  # Instantané binaire déjà chargé : seul le journal reste à rejouer
+        elif os.path.exists(REMINDERS_BACKUP_FILE):
             with open(REMINDERS_BACKUP_FILE, 'r', encoding='utf-8') as f:
                 reminders_data = json.load(f)
             
@@ -276,12 +653,190 @@ def load_reminders_from_file():
             print(f"🔄 Restauration automatique : {len(reminders_data)} rappels chargés depuis la sauvegarde")
         else:
             print("📂 Aucun fichier de sauvegarde rappels trouvé")
+        
+        replayed = 0
+        for record in journal.replay("reminder"):
+            if record["op"] == "delete":
+                reminders_db.pop(record["id"], None)
+                replayed_deletions.append((reminders_db, record["id"]))
+            else:
+                reminders_db[record["id"]] = Reminder(**record["d"])
+            replayed += 1
+        if replayed:
+            print(f"📒 Journal : {replayed} mutations de rappels rejouées")
     except Exception as e:
         print(f"❌ Erreur restauration rappels : {str(e)}")
+        load_errors.append(f"rappels : {str(e)[:200]}")
+
+def migrate_embedded_reminders():
+    """Anciennes sauvegardes : rappels dupliqués dans Lead.reminders -> reminders_db uniquement"""
+    migrated = 0
+    for lead_id, lead in leads_db.stored_items():
+        # Un lead non chargé vient de l'instantané binaire, qui n'a jamais de rappels embarqués
+        if type(lead) is LazyRecord or not lead.reminders:
+            continue
+        for reminder in lead.reminders:
+            if reminder.id and reminder.id not in reminders_db:
+                reminders_db[reminder.id] = reminder
+                journal_reminder(reminder.id)
+        lead.reminders = []
+        journal_lead(lead_id)
+        migrated += 1
+    if migrated:
+        print(f"🔀 Migration : rappels de {migrated} leads déplacés vers la base des rappels")
+
+def migrate_vehicle_ids():
+    """Anciennes sauvegardes : véhicules sans identifiant (non adressables par PATCH) -> identifiant
+    attribué une fois et journalisé ; l'instantané est réécrit au démarrage"""
+    migrated = 0
+    for lead_id, lead in leads_db.stored_items():
+        # Un lead non chargé vient de l'instantané binaire, écrit après cette migration
+        if type(lead) is LazyRecord or all(vehicle.id for vehicle in lead.vehicles):
+            continue
+        assign_vehicle_ids(lead.vehicles)
+        journal_lead(lead_id)
+        migrated += 1
+    if migrated:
+        print(f"🔀 Migration : identifiants attribués aux véhicules de {migrated} leads")
+        pending_migrations.add("vehicle_ids")
+
+def number_unnumbered_records() -> int:
+    """Attribue un numéro de changement aux objets qui n'en ont pas (anciennes sauvegardes)"""
+    unnumbered = 0
+    for repository in (leads_db, reminders_db):
+        for record_id in repository.unnumbered_ids():
+            item = repository.pin(record_id)
+            repository.changes.remove(record_id)
+            item.seq = change_clock.next()
+            repository.changes.add(record_id, item)
+            unnumbered += 1
+    return unnumbered
+
+def load_change_tracking():
+    """Horloge et pierres tombales : instantané, puis suppressions rejouées et objets sans numéro"""
+    state = {}
+    if os.path.exists(CHANGES_BACKUP_FILE):
+        try:
+            with open(CHANGES_BACKUP_FILE, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except Exception as e:
+            print(f"❌ Erreur lecture suivi des changements : {str(e)}")
+    
+    change_clock.observe(state.get("clock", 0))
+    for key, repository in (("leads", leads_db), ("reminders", reminders_db)):
+        section = state.get(key, {})
+        tombstones = {i: seq for i, seq in section.get("tombstones", {}).items() if i not in repository}
+        repository.changes.restore(tombstones, section.get("horizon", 0))
+        change_clock.observe(repository.changes.max_seq())
+    
+    # Le numéro d'origine d'une suppression journalisée n'est pas connu : on en attribue un
+    # nouveau, plus grand que tous les autres (un delta peut la renvoyer deux fois, jamais l'omettre)
+    for repository, record_id in replayed_deletions:
+        if record_id not in repository:
+            repository.changes.tombstone(record_id, change_clock.next())
+    replayed_deletions.clear()
+    
+    # Sauvegardes antérieures au suivi des changements : numérotation unique, persistée au démarrage
+    unnumbered = number_unnumbered_records()
+    if unnumbered:
+        print(f"🔀 Migration : {unnumbered} objets numérotés pour les sauvegardes incrémentales")
+        pending_migrations.add("seq")
+
+def open_sqlite_storage(store: SqliteStore):
+    """Bascule leads_db / reminders_db / journal sur SQLite.
+    
+    Au premier démarrage, les données chargées depuis les sauvegardes fichier
+    (instantané + journal) sont reprises dans la base ; ces fichiers ne sont
+    ensuite plus lus ni écrits.
+    """
+    global leads_db, reminders_db, stats_aggregate, journal
+    sqlite_leads = SqliteLeadRepository(
+        store, lambda data: Lead.model_validate(data, context=TRUSTED_CONTEXT),
+        lambda lead: lead.dict(exclude={'reminders'}), lead_stats_contribution, LEAD_CACHE_SIZE
+    )
+    sqlite_leads.add_indexer(search_index)
+    sqlite_reminders = SqliteReminderRepository(
+        store, lambda data: Reminder.model_validate(data, context=TRUSTED_CONTEXT), lambda reminder: reminder.dict()
+    )
+    store.begin_write()  # Workers démarrés ensemble : une seule reprise des sauvegardes fichier
+    if not store.initialized:
+        if leads_db or reminders_db:
+            sqlite_leads.adopt(leads_db)
+            sqlite_reminders.adopt(reminders_db)
+            for memory, sqlite in ((leads_db, sqlite_leads), (reminders_db, sqlite_reminders)):
+                sqlite.changes.restore(memory.changes.tombstones, memory.changes.horizon)
+            print(f"🔀 Migration : {len(leads_db)} leads et {len(reminders_db)} rappels repris dans {store.path}")
+        store.mark_initialized()
+    store.flush()
+    leads_db, reminders_db, journal = sqlite_leads, sqlite_reminders, store
+    stats_aggregate = sqlite_leads.stats
+    change_clock.observe(max(leads_db.changes.max_seq(), reminders_db.changes.max_seq()))
+    print(f"🗄️ Stockage SQLite : {len(leads_db)} leads, {len(reminders_db)} rappels")
 
 # Charger les données au démarrage
-load_leads_from_file()
-load_reminders_from_file()
+sqlite_store = SqliteStore(SQLITE_FILE) if STORAGE_BACKEND == "sqlite" else None
+if LEAD_LOAD_MODE == "lazy" and (SNAPSHOT_FORMAT != "binary" or sqlite_store is not None):
+    print("⚠️ LEAD_LOAD_MODE=lazy nécessite SNAPSHOT_FORMAT=binary et STORAGE_BACKEND=memory : chargement complet")
+    LEAD_LOAD_MODE = "eager"
+if sqlite_store is None or not sqlite_store.initialized:
+    binary_snapshot_loaded = (LEAD_LOAD_MODE == "lazy" and load_lazy_snapshot()) or load_binary_snapshot()
+    load_leads_from_file(binary_snapshot_loaded)
+    load_reminders_from_file(binary_snapshot_loaded)
+    if load_errors:
+        # Repartir de ce qui a pu être lu (journal seul, instantané plus ancien) puis compacter
+        # ou migrer écraserait la seule copie des données : on refuse de démarrer
+        raise RuntimeError(
+            "❌ Sauvegarde illisible, démarrage interrompu pour ne pas écraser les données : "
+            + " ; ".join(load_errors)
+            + f". Restaurer une copie de {BACKUP_DIR} (ou relancer avec une version de Python au moins égale à celle qui a écrit l'instantané)."
+        )
+    if binary_snapshot_loaded != (SNAPSHOT_FORMAT == "binary") and (leads_db or reminders_db):
+        # Format d'instantané changé (SNAPSHOT_FORMAT) : réécrit une fois au démarrage
+        pending_migrations.add("snapshot_format")
+    load_change_tracking()
+    migrate_embedded_reminders()
+    migrate_vehicle_ids()
+if sqlite_store is not None:
+    open_sqlite_storage(sqlite_store)
+elif pending_migrations:
+    journal.compact()
+
+def sync_storage():
+    """SQLite partagé entre workers : écritures des autres processus prises en compte"""
+    if sqlite_store is not None and sqlite_store.sync():
+        change_clock.observe(max(leads_db.changes.max_seq(), reminders_db.changes.max_seq()))
+
+async def lock_storage():
+    """Début d'une mutation (avant toute vérification) : verrou d'écriture de la base jusqu'au
+    journal_*, les numéros de changement restent uniques. Le verrou tenu par un autre worker
+    est attendu par de courtes pauses asynchrones : la boucle continue de servir les requêtes."""
+    if sqlite_store is None:
+        return
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + SQLITE_LOCK_TIMEOUT
+    delay = 0.002
+    while (changed := sqlite_store.try_begin_write()) is None:
+        if loop.time() >= deadline:
+            raise HTTPException(status_code=503, detail="Base occupée par une autre écriture : réessayer",
+                                headers={"Retry-After": "1"})
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.05)
+    if changed:
+        change_clock.observe(max(leads_db.changes.max_seq(), reminders_db.changes.max_seq()))
+
+@app.middleware("http")
+async def shared_storage_sync(request: Request, call_next):
+    """Avant chaque requête : écritures des autres workers ; après : écriture interrompue annulée"""
+    if sqlite_store is None:
+        return await call_next(request)
+    sync_storage()
+    try:
+        return await call_next(request)
+    finally:
+        # Une mutation valide sa transaction sans await intermédiaire : une transaction
+        # encore ouverte ici vient d'une requête terminée en erreur
+        if sqlite_store.dirty:
+            sqlite_store.rollback()
 
 # Fonction utilitaire pour calculer la date de fin de contrat
 def calculate_contract_end_date(delivery_date_str: str, contract_duration_months: int) -> str:
@@ -295,102 +850,186 @@ def calculate_contract_end_date(delivery_date_str: str, contract_duration_months
         return ""
 
 # Génération PDF
-def generate_lead_pdf(lead: Lead) -> str:
-    import tempfile
-    import os
-    
-    # Créer un nom de fichier temporaire avec extension .pdf garantie
-    temp_dir = tempfile.gettempdir()
-    filename = f"lead_{lead.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    temp_path = os.path.join(temp_dir, filename)
-    
-    doc = SimpleDocTemplate(temp_path, pagesize=A4)
-    story = []
-    styles = getSampleStyleSheet()
-    
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        spaceAfter=30,
-        alignment=TA_CENTER,
-        textColor=colors.HexColor('#2563eb')
-    )
-    
-    story.append(Paragraph("CRM LEASINPROFESSIONNEL.FR - Fiche Lead", title_style))
-    story.append(Spacer(1, 20))
-    
-    # Informations lead
-    lead_info = f"""
-    <para align="center">
-    <b>Lead ID:</b> {lead.id}<br/>
-    <b>Créé le:</b> {lead.created_at}<br/>
-    <b>Statut:</b> <b>{lead.status.replace('_', ' ').title()}</b>
-    </para>
+# À incrémenter quand la mise en page change : invalide les PDF en cache
+PDF_TEMPLATE_VERSION = 3
+
+def lead_pdf_fingerprint(lead: Lead) -> str:
+    """Empreinte des champs affichés dans la fiche PDF (clé de cache et ETag)"""
+    rendered = {
+        "template": PDF_TEMPLATE_VERSION,
+        "id": lead.id,
+        "created_at": lead.created_at,
+        "status": lead.status,
+        "company": lead.company.model_dump(),
+        "contact": lead.contact.model_dump(),
+        "vehicles": [
+            [v.brand, v.model, v.carburant, v.tarif_mensuel, v.commission_agence, v.payment_status]
+            for v in lead.vehicles
+        ],
+        "note": lead.note,
+    }
+    raw = json.dumps(rendered, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+def lead_pdf_data(lead: Lead) -> dict:
+    """Données d'un lead pour le rendu PDF (dictionnaire transmissible aux processus de travail)"""
+    return lead.model_dump(exclude={'reminders'})
+
+def iter_file(file, chunk_size: int = PDF_STREAM_CHUNK_SIZE):
+    """Lit le fichier par blocs pour StreamingResponse puis le ferme (même si le client se déconnecte)"""
+    try:
+        while chunk := file.read(chunk_size):
+            yield chunk
+    finally:
+        file.close()
+
+def pdf_file_response(file, headers: dict) -> StreamingResponse:
+    """Envoie un PDF depuis un fichier déjà ouvert : sa suppression (éviction du cache, fichier
+    temporaire) pendant l'envoi ne coupe pas la réponse"""
+    headers["Content-Length"] = str(os.fstat(file.fileno()).st_size)
+    return StreamingResponse(iter_file(file), media_type='application/pdf', headers=headers,
+                             background=BackgroundTask(file.close))
+
+pdf_cache = PdfCache(PDF_CACHE_DIR, PDF_CACHE_MAX_ENTRIES, PDF_CACHE_MAX_BYTES)
+pdf_exports = PdfExportRegistry(PDF_EXPORT_DIR, PDF_EXPORT_JOB_TTL, PDF_EXPORT_CHUNK_SIZE)
+_pdf_process_pool = None
+
+def get_pdf_process_pool():
+    """Pool de processus des exports groupés, créé au premier export (et recréé s'il est cassé)"""
+    global _pdf_process_pool
+    if _pdf_process_pool is not None and pool_broken(_pdf_process_pool):
+        print("⚠️ Pool d'export PDF cassé (processus de travail arrêté) : recréé")
+        _pdf_process_pool.shutdown(wait=False, cancel_futures=True)
+        _pdf_process_pool = None
+    if _pdf_process_pool is None:
+        _pdf_process_pool = make_process_pool(PDF_EXPORT_WORKERS)
+    return _pdf_process_pool
+
+# Fiches individuelles : pool séparé pour ne pas attendre derrière un export groupé
+pdf_render_pool = BoundedRenderPool(make_process_pool, PDF_RENDER_CONCURRENCY, PDF_RENDER_MAX_QUEUE)
+_orphans = remove_orphaned_pdfs(tempfile.gettempdir())
+if _orphans:
+    print(f"🧹 {_orphans} PDF temporaires orphelins supprimés")
+
+# 🔎 Requêtes sur les leads : filtres, pagination par curseur et projection
+MAX_PAGE_SIZE = 500
+
+def parse_list_param(value: Optional[str]) -> Optional[set]:
+    """'offre,accord' -> {'offre', 'accord'} (None si paramètre absent)"""
+    if not value:
+        return None
+    return {v.strip() for v in value.split(',') if v.strip()}
+
+def lead_sort_key(lead: Lead):
+    """Ordre stable de pagination : date de création système puis identifiant"""
+    return (lead.created_at or "", lead.id or "")
+
+def encode_cursor(lead: Lead) -> str:
+    raw = json.dumps(list(lead_sort_key(lead)), ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, lead_id = json.loads(base64.urlsafe_b64decode(padded))
+        return (created_at, lead_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Curseur invalide")
+
+def _nested_model(annotation):
+    """Modèle Pydantic contenu dans une annotation (Optional[X], List[X], X)"""
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation
+    for arg in get_args(annotation):
+        model = _nested_model(arg)
+        if model is not None:
+            return model
+    return None
+
+def parse_projection(fields: Optional[str]) -> Optional[dict]:
+    """'company.name,status' -> {'company': {'name': {}}, 'status': {}} (validé sur le modèle Lead)"""
+    paths = [p.strip() for p in (fields or "").split(',') if p.strip()]
+    if not paths:
+        return None
+    tree = {"id": {}}
+    for path in paths:
+        node = tree
+        model = Lead
+        for part in path.split('.'):
+            if model is None or part not in model.model_fields:
+                raise HTTPException(status_code=400, detail=f"Champ inconnu : {path}")
+            node = node.setdefault(part, {})
+            model = _nested_model(model.model_fields[part].annotation)
+    return tree
+
+def project(value, tree: dict):
+    """Extrait uniquement les champs demandés (les listes sont projetées élément par élément)"""
+    if isinstance(value, list):
+        return [project(v, tree) for v in value]
+    if not tree:
+        return value.model_dump() if isinstance(value, BaseModel) else value
+    if value is None:
+        return None
+    return {key: project(field_value(value, key), sub) for key, sub in tree.items()}
+
+def field_value(obj, key: str):
+    if key == 'reminders' and isinstance(obj, Lead):
+        return obj.stored_reminders()  # Matérialisation comme à la sérialisation
+    return getattr(obj, key)
+
+def with_page_reminders(leads: List[Lead]) -> List[Lead]:
+    """Copies des leads d'une page avec leurs rappels préchargés : une requête pour la page
+    entière au lieu d'une par lead à la sérialisation (SQLite)"""
+    by_lead = reminders_db.for_leads([lead.id for lead in leads])
+    page = []
+    for lead in leads:
+        lead = lead.model_copy()
+        lead._page_reminders = by_lead[lead.id]
+        page.append(lead)
+    return page
+
+def set_change_cursor(response: Response):
+    """En-tête X-Change-Cursor : numéro du dernier changement inclus dans la réponse, à passer
+    à /api/events?since= pour ne manquer aucun changement entre la lecture et l'abonnement"""
+    response.headers["X-Change-Cursor"] = str(change_clock.value)
+
+def query_leads(response: Response, statuses=None, commercial=None, prestataire=None,
+                brand=None, fields=None, limit=None, cursor=None):
+    """Filtre (via les index), pagine et projette les leads.
+
+    Sans limit ni cursor, la réponse reste une liste (compatibilité frontend) ;
+    sinon on retourne {"items", "total", "next_cursor"}. Le total filtré est
+    toujours fourni dans l'en-tête X-Total-Count.
     """
-    story.append(Paragraph(lead_info, styles['Normal']))
-    story.append(Spacer(1, 20))
-    
-    # Société
-    company_data = [
-        ['Société', lead.company.name],
-        ['SIRET', lead.company.siret or 'Non renseigné'],
-        ['Email', lead.company.email or 'Non renseigné'],
-        ['Téléphone', lead.company.phone or 'Non renseigné']
-    ]
-    
-    company_table = Table(company_data, colWidths=[2.5*inch, 4*inch])
-    company_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#eff6ff')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#d1d5db'))
-    ]))
-    story.append(company_table)
-    story.append(Spacer(1, 15))
-    
-    # Contact
-    contact_data = [
-        ['Contact', f"{lead.contact.first_name} {lead.contact.last_name}"],
-        ['Email', lead.contact.email],
-        ['Téléphone', lead.contact.phone or 'Non renseigné']
-    ]
-    
-    contact_table = Table(contact_data, colWidths=[2.5*inch, 4*inch])
-    contact_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f0fdf4')),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#d1d5db'))
-    ]))
-    story.append(contact_table)
-    story.append(Spacer(1, 15))
-    
-    # Véhicules
-    if lead.vehicles:
-        for i, vehicle in enumerate(lead.vehicles):
-            vehicle_data = [
-                ['Véhicule', f"{vehicle.brand} {vehicle.model}"],
-                ['Carburant', vehicle.carburant],
-                ['Tarif mensuel', vehicle.tarif_mensuel or 'Non renseigné'],
-                ['Commission', vehicle.commission_agence or 'Non renseigné'],
-                ['Statut paiement', 'Payé' if vehicle.payment_status == 'paye' else 'En attente']
-            ]
-            
-            vehicle_table = Table(vehicle_data, colWidths=[2.5*inch, 4*inch])
-            vehicle_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#fef2f2')),
-                ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#d1d5db'))
-            ]))
-            story.append(vehicle_table)
-            story.append(Spacer(1, 10))
-    
-    # Note
-    if lead.note:
-        story.append(Paragraph(f"<b>Notes:</b> {lead.note}", styles['Normal']))
-    
-    doc.build(story)
-    return temp_path
+    set_change_cursor(response)
+    projection = parse_projection(fields)
+    filters = dict(
+        statuses=statuses,
+        commercials=parse_list_param(commercial),
+        prestataires=parse_list_param(prestataire),
+        brands=parse_list_param(brand)
+    )
+
+    paginated = limit is not None or cursor is not None
+    next_cursor = None
+    if paginated:
+        # Seule la page (plus un lead, pour savoir s'il en reste) est chargée
+        limit = limit or MAX_PAGE_SIZE
+        leads, total = leads_db.find_page(decode_cursor(cursor) if cursor else None, limit + 1, **filters)
+        if len(leads) > limit:
+            leads = leads[:limit]
+            next_cursor = encode_cursor(leads[-1])
+    else:
+        leads = leads_db.find(**filters)
+        total = len(leads)
+    response.headers["X-Total-Count"] = str(total)
+
+    if projection is None or 'reminders' in projection:
+        leads = with_page_reminders(leads)
+    items = [project(lead, projection) for lead in leads] if projection else leads
+    if not paginated:
+        return items
+    return {"items": items, "total": total, "next_cursor": next_cursor}
 
 # Routes API
 @app.get("/")
@@ -424,15 +1063,15 @@ async def get_config():
         }
     }
 
-@app.post("/api/leads")
-async def create_lead(lead_data: LeadCreate):
+def build_lead(lead_data: LeadCreate) -> Lead:
+    """Nouveau lead (identifiant, dates par défaut, fin de contrat calculée), pas encore enregistré"""
     lead_id = str(uuid.uuid4())[:8]
     
     lead = Lead(
         id=lead_id,
         company=lead_data.company,
         contact=lead_data.contact,
-        vehicles=lead_data.vehicles,
+        vehicles=assign_vehicle_ids(lead_data.vehicles),
         note=lead_data.note,
         status=lead_data.status or "a_contacter",
         lead_creation_date=lead_data.lead_creation_date or datetime.now().strftime('%Y-%m-%d'),
@@ -448,56 +1087,135 @@ async def create_lead(lead_data: LeadCreate):
         if contract_duration:
             lead.contract_end_date = calculate_contract_end_date(lead_data.delivery_date, contract_duration)
             print(f"📅 Création - Date fin contrat calculée: {lead.contract_end_date}")
+    return lead
+
+@app.post("/api/leads")
+async def create_lead(lead_data: LeadCreate):
+    await lock_storage()
+    lead = build_lead(lead_data)
+    leads_db[lead.id] = lead
     
-    leads_db[lead_id] = lead
-    
-    # 💾 SAUVEGARDE AUTOMATIQUE
-    save_leads_to_file()
+    # 💾 SAUVEGARDE AUTOMATIQUE (journal)
+    journal_lead(lead.id)
     
     return {"message": "Lead créé avec succès", "lead": lead}
 
 @app.get("/api/leads")
-async def get_leads():
-    """Récupérer tous les leads (pour compatibilité)"""
-    return list(leads_db.values())
+async def get_leads(
+    response: Response,
+    status: Optional[str] = None,
+    commercial: Optional[str] = None,
+    prestataire: Optional[str] = None,
+    brand: Optional[str] = None,
+    fields: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
+    """Récupérer les leads (filtres status/commercial/prestataire/brand, projection fields=, pagination limit/cursor)"""
+    return query_leads(response, parse_list_param(status), commercial, prestataire, brand, fields, limit, cursor)
 
 @app.get("/api/clients")
-async def get_clients():
+async def get_clients(
+    response: Response,
+    commercial: Optional[str] = None,
+    prestataire: Optional[str] = None,
+    brand: Optional[str] = None,
+    fields: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
     """Récupérer tous les leads avec statut 'livree' (clients)"""
-    clients = [lead for lead in leads_db.values() if lead.status == "livree"]
-    return clients
+    return query_leads(response, {"livree"}, commercial, prestataire, brand, fields, limit, cursor)
 
 @app.get("/api/leads/active")
-async def get_active_leads():
+async def get_active_leads(
+    response: Response,
+    status: Optional[str] = None,
+    commercial: Optional[str] = None,
+    prestataire: Optional[str] = None,
+    brand: Optional[str] = None,
+    fields: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
     """Récupérer tous les leads SAUF ceux avec statut 'livree'"""
-    active_leads = [lead for lead in leads_db.values() if lead.status != "livree"]
-    return active_leads
+    statuses = parse_list_param(status) or leads_db.index_values("status")
+    return query_leads(response, statuses - {"livree"}, commercial, prestataire, brand, fields, limit, cursor)
+
+@app.get("/api/leads/search")
+async def search_leads(
+    q: str,
+    status: Optional[str] = None,
+    fields: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0)
+):
+    """Recherche plein texte (préfixes, sans accents) classée par pertinence"""
+    projection = parse_projection(fields)
+    statuses = parse_list_param(status)
+    
+    # 💤 Démarrage paresseux ou SQLite : l'index plein texte est complété avant la recherche
+    await complete_search_index()
+    candidates = leads_db.ids_for("status", statuses) if statuses is not None else None
+    ranked = search_index.search(q, candidates)
+    page = ranked[offset:offset + limit]
+    
+    items = []
+    for lead_id, score in page:
+        item = project(leads_db[lead_id], projection) if projection else {"id": lead_id}
+        item["score"] = round(score, 2)
+        items.append(item)
+    
+    next_offset = offset + limit if offset + limit < len(ranked) else None
+    return {"items": items, "total": len(ranked), "next_offset": next_offset}
+
+# 🔒 Concurrence optimiste : la version de chaque objet est son ETag
+UNWRITABLE_FIELDS = {'id', 'seq', 'version'}
+
+def version_etag(item) -> str:
+    return f'"{item.version}"'
+
+def check_version(request: Request, item, update_data: Optional[dict] = None, label: str = "Objet"):
+    """If-Match (ETag) ou champ "version" du corps : 409 si l'objet a été modifié entre-temps"""
+    etag = version_etag(item)
+    header = request.headers.get("if-match")
+    conflict = False
+    if header:
+        candidates = [value.strip().removeprefix("W/") for value in header.split(',')]
+        conflict = "*" not in candidates and etag not in candidates
+    if update_data and update_data.get("version") is not None:
+        conflict = conflict or str(update_data["version"]) != str(item.version)
+    if conflict:
+        raise HTTPException(status_code=409, headers={"ETag": etag}, detail={
+            "message": f"{label} modifié entre-temps (version {item.version}) : recharger avant d'enregistrer",
+            "current_version": item.version
+        })
 
 @app.get("/api/leads/{lead_id}")
-async def get_lead(lead_id: str):
+async def get_lead(lead_id: str, response: Response):
     if lead_id not in leads_db:
         raise HTTPException(status_code=404, detail="Lead introuvable")
-    return leads_db[lead_id]
+    lead = leads_db[lead_id]
+    response.headers["ETag"] = version_etag(lead)
+    return lead
 
 @app.put("/api/leads/{lead_id}")
-async def update_lead(lead_id: str, update_data: dict):
+async def update_lead(lead_id: str, update_data: dict, request: Request, response: Response):
+    await lock_storage()
     if lead_id not in leads_db:
         raise HTTPException(status_code=404, detail="Lead introuvable")
     
-    lead = leads_db[lead_id]
+    current = leads_db[lead_id]
+    check_version(request, current, update_data, "Lead")
     
-    # Traitement spécial pour les objets complexes
-    for key, value in update_data.items():
-        if key == 'company' and isinstance(value, dict):
-            lead.company = Company(**value)
-        elif key == 'contact' and isinstance(value, dict):
-            lead.contact = Contact(**value)
-        elif key == 'vehicles' and isinstance(value, list):
-            lead.vehicles = [Vehicle(**v) for v in value]
-        elif key == 'reminders' and isinstance(value, list):
-            lead.reminders = [Reminder(**r) for r in value]
-        elif hasattr(lead, key):
-            setattr(lead, key, value)
+    # Copie validée d'un bloc : en cas d'erreur, le lead (et ses index) restent intacts
+    changes = {key: value for key, value in update_data.items()
+               if key not in UNWRITABLE_FIELDS and key != 'reminders'}  # Rappels : via /api/reminders
+    try:
+        lead = Lead(**{**current.dict(exclude={'reminders'}), **changes})
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=f"Lead invalide : {format_validation_error(e)}")
+    assign_vehicle_ids(lead.vehicles)
     
     # 📅 CALCUL AUTOMATIQUE DE LA DATE DE FIN DE CONTRAT
     if lead.delivery_date and lead.vehicles:
@@ -507,72 +1225,385 @@ async def update_lead(lead_id: str, update_data: dict):
             lead.contract_end_date = calculate_contract_end_date(lead.delivery_date, contract_duration)
             print(f"📅 Date fin contrat calculée: {lead.contract_end_date} (livraison: {lead.delivery_date} + {contract_duration} mois)")
     
-    # 💾 SAUVEGARDE AUTOMATIQUE
-    save_leads_to_file()
+    # 🗂️ Remplacement en un seul pas : index (statut, commercial, prestataire, marques) mis à jour
+    leads_db[lead_id] = lead
+    
+    # 💾 SAUVEGARDE AUTOMATIQUE (journal)
+    journal_lead(lead_id)
     
+    response.headers["ETag"] = version_etag(lead)
     return {"message": "Lead mis à jour avec succès", "lead": lead}
 
+# 🩹 PATCH JSON Merge Patch (RFC 7396) : seuls les sous-modèles modifiés sont revalidés
+PATCH_SUBMODELS = {'company': Company, 'contact': Contact}
+_field_adapters: Dict[str, TypeAdapter] = {}
+
+def field_adapter(name: str) -> TypeAdapter:
+    """Validation d'un champ isolé du lead (adaptateurs construits une seule fois)"""
+    adapter = _field_adapters.get(name)
+    if adapter is None:
+        adapter = _field_adapters[name] = TypeAdapter(Lead.model_fields[name].annotation)
+    return adapter
+
+def merge_patch(target, patch):
+    """RFC 7396 : un objet fusionne récursivement, null supprime la clé, toute autre valeur remplace"""
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
+
+def patch_vehicles(vehicles: List[Vehicle], patch, errors: List[str]) -> List[Vehicle]:
+    """Véhicules après patch. Liste : remplacement complet (seul moyen d'ajouter un véhicule).
+    Objet : clés = position ("0", "1"...) ou id d'un véhicule existant ; null le retire, un objet
+    le fusionne. Une clé inconnue est une erreur (une faute de frappe n'ajoute pas de véhicule)."""
+    if isinstance(patch, list):
+        try:
+            return assign_vehicle_ids(field_adapter('vehicles').validate_python(patch))
+        except ValidationError as e:
+            errors.append(f"vehicles.{format_validation_error(e)}")
+            return vehicles
+    if not isinstance(patch, dict):
+        errors.append("vehicles : liste ou objet attendu")
+        return vehicles
+    
+    positions = {vehicle.id: position for position, vehicle in enumerate(vehicles) if vehicle.id}
+    result: List[Optional[Vehicle]] = list(vehicles)
+    for key, value in patch.items():
+        position = positions.get(key)
+        if position is None and key.isdigit():
+            position = int(key)
+            if position >= len(vehicles):
+                errors.append(f"vehicles.{key} : aucun véhicule à cette position")
+                continue
+        if position is None:
+            errors.append(f"vehicles.{key} : véhicule introuvable")
+            continue
+        if value is None:
+            result[position] = None
+            continue
+        if not isinstance(value, dict):
+            errors.append(f"vehicles.{key} : objet attendu")
+            continue
+        current = vehicles[position].model_dump()
+        merged = merge_patch(current, value)
+        merged["id"] = current["id"]
+        if merged == current:
+            continue  # véhicule inchangé : pas de revalidation
+        try:
+            vehicle = Vehicle.model_validate(merged)
+        except ValidationError as e:
+            errors.append(f"vehicles.{key}.{format_validation_error(e)}")
+            continue
+        result[position] = vehicle
+    return [vehicle for vehicle in result if vehicle is not None]
+
+def lead_patch_changes(lead: Lead, patch: dict) -> Tuple[dict, List[str]]:
+    """(champs réellement modifiés -> nouvelle valeur validée, erreurs) ; le lead n'est pas touché"""
+    changes, errors = {}, []
+    for key, value in patch.items():
+        if key in UNWRITABLE_FIELDS:
+            continue
+        if key == 'reminders' or key not in Lead.model_fields:
+            errors.append(f"{key} : champ non modifiable" if key == 'reminders' else f"{key} : champ inconnu")
+        elif key == 'vehicles':
+            vehicles = patch_vehicles(lead.vehicles, value, errors)
+            if [v.model_dump() for v in vehicles] != [v.model_dump() for v in lead.vehicles]:
+                changes[key] = vehicles
+        elif key in PATCH_SUBMODELS:
+            current = getattr(lead, key).model_dump()
+            merged = merge_patch(current, value)
+            if merged == current:
+                continue
+            try:
+                submodel = PATCH_SUBMODELS[key].model_validate(merged)
+            except ValidationError as e:
+                errors.append(f"{key}.{format_validation_error(e)}")
+                continue
+            if submodel.model_dump() != current:
+                changes[key] = submodel
+        else:
+            try:
+                new_value = Lead.model_fields[key].get_default(call_default_factory=True) if value is None \
+                    else field_adapter(key).validate_python(value)
+            except ValidationError as e:
+                errors.append(f"{key} : {format_validation_error(e)}")
+                continue
+            if new_value != getattr(lead, key):
+                changes[key] = new_value
+    if errors:
+        return {}, errors
+    
+    # 📅 Date de fin de contrat recalculée si la livraison ou les véhicules changent
+    delivery_date = changes.get('delivery_date', lead.delivery_date)
+    vehicles = changes.get('vehicles', lead.vehicles)
+    if ({'delivery_date', 'vehicles'} & changes.keys() and 'contract_end_date' not in patch
+            and delivery_date and vehicles and vehicles[0].contract_duration):
+        contract_end_date = calculate_contract_end_date(delivery_date, vehicles[0].contract_duration)
+        if contract_end_date != lead.contract_end_date:
+            changes['contract_end_date'] = contract_end_date
+    return changes, []
+
+def apply_lead_changes(lead_id: str, lead: Lead, changes: dict) -> None:
+    """Applique des changements calculés par lead_patch_changes (rien si aucun)"""
+    if not changes:
+        return  # un patch sans effet ne change pas la version
+    for key, value in changes.items():
+        setattr(lead, key, value)
+    # 🗂️ Seuls les index qui lisent les champs modifiés sont mis à jour
+    leads_db.reindex(lead_id, fields=changes.keys())
+    # 💾 SAUVEGARDE AUTOMATIQUE (journal)
+    journal_lead(lead_id)
+
+@app.patch("/api/leads/{lead_id}")
+async def patch_lead(lead_id: str, request: Request, response: Response, patch: dict = Body(...)):
+    """Modification partielle (application/merge-patch+json) : seuls les champs présents sont touchés"""
+    await lock_storage()
+    if lead_id not in leads_db:
+        raise HTTPException(status_code=404, detail="Lead introuvable")
+    
+    lead = leads_db[lead_id]
+    check_version(request, lead, patch, "Lead")
+    
+    # Nouvelles valeurs calculées et validées avant toute modification du lead
+    changes, errors = lead_patch_changes(lead, patch)
+    if errors:
+        raise HTTPException(status_code=422, detail={"message": "Patch invalide", "errors": errors})
+    apply_lead_changes(lead_id, lead, changes)
+    
+    response.headers["ETag"] = version_etag(lead)
+    return {"message": "Lead mis à jour avec succès", "lead": lead, "changed_fields": sorted(changes)}
+
 @app.delete("/api/leads/{lead_id}")
-async def delete_lead(lead_id: str):
+async def delete_lead(lead_id: str, request: Request):
+    await lock_storage()
     if lead_id not in leads_db:
         raise HTTPException(status_code=404, detail="Lead introuvable")
+    check_version(request, leads_db[lead_id], label="Lead")
     
     del leads_db[lead_id]
     
-    # 💾 SAUVEGARDE AUTOMATIQUE
-    save_leads_to_file()
+    # 💾 SAUVEGARDE AUTOMATIQUE (journal)
+    journal_lead(lead_id)
     
     return {"message": "Lead supprimé"}
 
+# 📦 Opérations groupées : tout ou rien, une seule écriture (flush) par lot
+BULK_MAX_OPERATIONS = 1000
+
+class BulkLeadOperation(BaseModel):
+    op: str  # create, patch, delete
+    id: Optional[str] = None  # patch / delete
+    data: dict = {}  # create : LeadCreate ; patch : merge-patch (ex. {"status": "offre"})
+    version: Optional[int] = None  # précondition facultative (comme If-Match)
+
+class BulkLeadRequest(BaseModel):
+    operations: List[BulkLeadOperation] = Field(..., max_length=BULK_MAX_OPERATIONS)
+
+def prepare_bulk_operation(operation: BulkLeadOperation, seen: set) -> Tuple[int, Optional[str], object]:
+    """(code HTTP, erreur, préparation) d'une opération, validée sans rien modifier"""
+    if operation.op == "create":
+        try:
+            return 201, None, build_lead(LeadCreate.model_validate(operation.data))
+        except ValidationError as e:
+            return 422, format_validation_error(e), None
+    if operation.op not in ("patch", "delete"):
+        return 422, f"opération inconnue : {operation.op}", None
+    if operation.id not in leads_db:
+        return 404, "Lead introuvable", None
+    if operation.id in seen:
+        return 422, "lead déjà présent dans le lot", None
+    seen.add(operation.id)
+    lead = leads_db[operation.id]
+    version = operation.version if operation.version is not None else operation.data.get("version")
+    if version is not None and str(version) != str(lead.version):
+        return 409, f"Lead modifié entre-temps (version {lead.version})", None
+    if operation.op == "delete":
+        return 200, None, None
+    changes, errors = lead_patch_changes(lead, operation.data)
+    return (422, "; ".join(errors), None) if errors else (200, None, changes)
+
+@app.post("/api/leads/bulk")
+async def bulk_leads(payload: BulkLeadRequest):
+    """Créations, modifications (merge-patch) et suppressions en un lot : toutes les opérations
+    sont validées avant d'en appliquer une seule ; au moindre échec, rien n'est appliqué"""
+    await lock_storage()
+    
+    seen = set()
+    prepared = [prepare_bulk_operation(operation, seen) for operation in payload.operations]
+    results = [{"index": index, "op": operation.op, "id": operation.id, "status": status}
+               for index, (operation, (status, _, _)) in enumerate(zip(payload.operations, prepared))]
+    failed = [index for index, (status, _, _) in enumerate(prepared) if status >= 400]
+    if failed:
+        for index, (status, error, _) in enumerate(prepared):
+            if error:
+                results[index]["error"] = error
+            else:
+                results[index]["status"] = 424  # valide, mais non appliquée à cause des autres
+        conflicts_only = all(prepared[index][0] == 409 for index in failed)
+        raise HTTPException(status_code=409 if conflicts_only else 422, detail={
+            "message": f"{len(failed)} opération(s) invalide(s) : aucune modification appliquée",
+            "results": results
+        })
+    
+    # 💾 Toutes les mutations du lot partent dans une seule écriture du journal (une transaction en SQLite)
+    with journal.batch():
+        for result, operation, (_, _, prepared_value) in zip(results, payload.operations, prepared):
+            if operation.op == "create":
+                lead = prepared_value
+                leads_db[lead.id] = lead
+                journal_lead(lead.id)
+                result["id"] = lead.id
+            elif operation.op == "patch":
+                lead = leads_db[operation.id]
+                apply_lead_changes(operation.id, lead, prepared_value)
+                result["changed_fields"] = sorted(prepared_value)
+            else:
+                del leads_db[operation.id]
+                journal_lead(operation.id)
+                continue
+            result["version"] = lead.version
+    
+    return {"message": f"{len(results)} opération(s) appliquée(s)", "results": results}
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match contient-il cet ETag (ou '*') ?"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [value.strip().removeprefix("W/") for value in header.split(',')]
+    return "*" in candidates or etag in candidates
+
 @app.get("/api/leads/{lead_id}/pdf")
-async def download_lead_pdf(lead_id: str):
+async def download_lead_pdf(lead_id: str, request: Request):
     if lead_id not in leads_db:
         raise HTTPException(status_code=404, detail="Lead introuvable")
     
     lead = leads_db[lead_id]
-    pdf_path = generate_lead_pdf(lead)
+    
+    # 🗃️ Cache : la fiche n'est régénérée que si ses champs affichés ont changé
+    cache_key = lead_pdf_fingerprint(lead)
+    etag = f'"{cache_key}"'
+    if etag_matches(request, etag):
+        pdf_cache.touch(cache_key)
+        return Response(status_code=304, headers={"ETag": etag})
     
     # S'assurer que le nom de fichier a l'extension .pdf
-    safe_company_name = lead.company.name.replace(' ', '_').replace('/', '_').replace('\\', '_')
-    filename = f"Lead_{safe_company_name}_{lead_id}.pdf"
-    
-    return FileResponse(
-        path=pdf_path,
-        filename=filename,
-        media_type='application/pdf',
-        headers={
-            "Content-Disposition": f"attachment; filename={filename}",
-            "Content-Type": "application/pdf"
-        }
-    )
+    filename = lead_pdf_filename(lead.company.name, lead_id)
+    headers = {
+        "Content-Disposition": f"attachment; filename={filename}",
+        "ETag": etag,
+        "Cache-Control": "private, no-cache"
+    }
+    
+    if PDF_RENDER_MODE == "memory":
+        # 🧠 Rendu dans un processus de travail : jusqu'à PDF_SPOOL_MAX_MEMORY la fiche revient en
+        # mémoire et part telle quelle ; au-delà le processus l'écrit sur disque et le serveur
+        # l'envoie par blocs depuis le fichier, supprimé dès son ouverture
+        spill_path = pdf_cache.temp_path(cache_key)
+        try:
+            content = await pdf_render_pool.run(render_lead_pdf_spooled, lead_pdf_data(lead),
+                                                PDF_SPOOL_MAX_MEMORY, spill_path)
+            spilled = open(spill_path, 'rb') if content is None else None
+        except RenderPoolSaturated as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+        finally:
+            if os.path.exists(spill_path):
+                os.remove(spill_path)
+        if spilled is None:
+            return Response(content=content, media_type='application/pdf', headers=headers)
+        return pdf_file_response(spilled, headers)
+    
+    cached = pdf_cache.open(cache_key)
+    if cached is not None:
+        return pdf_file_response(cached, headers)
+    
+    # ⚙️ Rendu dans un processus de travail : la boucle reste libre pour les autres requêtes
+    tmp_path = pdf_cache.temp_path(cache_key)
+    try:
+        await pdf_render_pool.run(render_lead_pdf, lead_pdf_data(lead), tmp_path)
+        rendered = pdf_cache.add(cache_key, tmp_path)
+    except RenderPoolSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    
+    return pdf_file_response(rendered, headers)
+
+@app.get("/api/metrics/pdf")
+async def pdf_metrics():
+    """Métriques du rendu PDF (attente en file, temps de rendu, rejets) et du cache"""
+    return {"mode": PDF_RENDER_MODE, "render_pool": pdf_render_pool.metrics(), "cache": pdf_cache.stats()}
+
+@app.post("/api/pdf/exports")
+async def start_pdf_export(export_request: PdfExportRequest):
+    """Lance un export PDF groupé (par ids, statut ou commercial) ; retourne un job à suivre"""
+    if export_request.format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format inconnu : {export_request.format}")
+    
+    if export_request.ids is not None:
+        missing = [lead_id for lead_id in export_request.ids if lead_id not in leads_db]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Leads introuvables : {', '.join(missing)}")
+        leads = [leads_db[lead_id] for lead_id in export_request.ids]
+    else:
+        leads = leads_db.find(
+            statuses=parse_list_param(export_request.status),
+            commercials=parse_list_param(export_request.commercial)
+        )
+    
+    job = pdf_exports.start([lead_pdf_data(lead) for lead in leads], export_request.format, get_pdf_process_pool())
+    return {"message": f"Export lancé - {job.total} fiches", **job.to_dict()}
+
+@app.get("/api/pdf/exports/{job_id}")
+async def get_pdf_export(job_id: str):
+    """Progression d'un export PDF groupé"""
+    job = pdf_exports.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Export introuvable")
+    return job.to_dict()
+
+@app.get("/api/pdf/exports/{job_id}/download")
+async def download_pdf_export(job_id: str):
+    """Téléchargement (en flux) de l'archive ZIP ou du PDF unique d'un export terminé"""
+    job = pdf_exports.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Export introuvable")
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Export non terminé ({job.status})")
+    
+    filename = f"Export_leads_{job.id}.{job.format}"
+    media_type = "application/zip" if job.format == "zip" else "application/pdf"
+    return FileResponse(path=job.path, filename=filename, media_type=media_type)
 
 @app.get("/api/reminders")
-async def get_reminders():
+async def get_reminders(response: Response):
+    set_change_cursor(response)
     return list(reminders_db.values())
 
+@app.get("/api/reminders/{reminder_id}")
+async def get_reminder(reminder_id: str, response: Response):
+    if reminder_id not in reminders_db:
+        raise HTTPException(status_code=404, detail="Rappel introuvable")
+    reminder = reminders_db[reminder_id]
+    response.headers["ETag"] = version_etag(reminder)
+    return reminder
+
 @app.get("/api/calendar/reminders")
-async def get_calendar_reminders(days: int = 30):
+async def get_calendar_reminders(response: Response, days: int = 30):
     """Get upcoming reminders for the next N days"""
-    from datetime import datetime, timedelta
-    
-    now = datetime.now()
-    future_date = now + timedelta(days=days)
-    
-    upcoming = []
-    for reminder in reminders_db.values():
-        try:
-            reminder_date = datetime.fromisoformat(reminder.reminder_date.replace('Z', '+00:00'))
-            if now <= reminder_date <= future_date and not reminder.completed:
-                upcoming.append(reminder)
-        except:
-            pass  # Skip invalid dates
-    
-    # Sort by date
-    upcoming.sort(key=lambda x: x.reminder_date)
-    return upcoming
+    set_change_cursor(response)
+    now = datetime.now().timestamp()
+    return reminders_db.upcoming(now, now + days * 86400)
 
 @app.post("/api/reminders")
 async def create_reminder(reminder_data: ReminderCreate):
+    await lock_storage()
     reminder_id = str(uuid.uuid4())[:8]
     
     reminder = Reminder(
@@ -586,117 +1617,79 @@ async def create_reminder(reminder_data: ReminderCreate):
         created_at=datetime.now().isoformat()
     )
     
+    # Le rappel est rattaché au lead via l'index lead_id de reminders_db
     reminders_db[reminder_id] = reminder
     
-    # Ajouter au lead
-    if reminder_data.lead_id in leads_db:
-        leads_db[reminder_data.lead_id].reminders.append(reminder)
-    
-    # 💾 SAUVEGARDE AUTOMATIQUE
-    save_reminders_to_file()
-    save_leads_to_file()  # Car on a modifié le lead aussi
+    # 💾 SAUVEGARDE AUTOMATIQUE (journal)
+    journal_reminder(reminder_id)
     
     return {"message": "Rappel créé avec succès", "reminder": reminder}
 
 @app.delete("/api/reminders/{reminder_id}")
-async def delete_reminder(reminder_id: str):
+async def delete_reminder(reminder_id: str, request: Request):
+    await lock_storage()
     if reminder_id not in reminders_db:
         raise HTTPException(status_code=404, detail="Rappel introuvable")
     
     reminder = reminders_db[reminder_id]
+    check_version(request, reminder, label="Rappel")
     
-    # Supprimer de la base des rappels
+    # Supprimer de la base des rappels (et donc du lead associé)
     del reminders_db[reminder_id]
     
-    # Supprimer aussi du lead associé
-    if reminder.lead_id in leads_db:
-        lead = leads_db[reminder.lead_id]
-        # Filtrer pour garder tous les rappels sauf celui à supprimer
-        lead.reminders = [r for r in lead.reminders if r.id != reminder_id]
-    
-    # 💾 SAUVEGARDE AUTOMATIQUE
-    save_reminders_to_file()
-    save_leads_to_file()  # Car on a modifié le lead aussi
+    # 💾 SAUVEGARDE AUTOMATIQUE (journal)
+    journal_reminder(reminder_id)
     
     return {"message": "Rappel supprimé avec succès"}
 
 @app.put("/api/reminders/{reminder_id}")
-async def update_reminder(reminder_id: str, update_data: dict):
+async def update_reminder(reminder_id: str, update_data: dict, request: Request, response: Response):
+    await lock_storage()
     if reminder_id not in reminders_db:
         raise HTTPException(status_code=404, detail="Rappel introuvable")
     
     reminder = reminders_db[reminder_id]
+    check_version(request, reminder, update_data, "Rappel")
     
     # Mettre à jour les champs
     for key, value in update_data.items():
-        if hasattr(reminder, key):
+        if key not in UNWRITABLE_FIELDS and hasattr(reminder, key):
             setattr(reminder, key, value)
     
-    # Mettre à jour aussi dans le lead associé
-    if reminder.lead_id in leads_db:
-        lead = leads_db[reminder.lead_id]
-        for i, lead_reminder in enumerate(lead.reminders):
-            if lead_reminder.id == reminder_id:
-                lead.reminders[i] = reminder
-                break
+    # 🗂️ Date et statut recalculés une seule fois pour l'index du calendrier
+    reminders_db.reindex(reminder_id)
     
-    # 💾 SAUVEGARDE AUTOMATIQUE
-    save_reminders_to_file()
-    save_leads_to_file()
+    # 💾 SAUVEGARDE AUTOMATIQUE (journal)
+    journal_reminder(reminder_id)
+    
+    response.headers["ETag"] = version_etag(reminder)
+    return {"message": "Rappel mis à jour avec succès", "reminder": reminder}
     
 @app.put("/api/reminders/{reminder_id}/complete")
-async def complete_reminder(reminder_id: str):
+async def complete_reminder(reminder_id: str, request: Request, response: Response):
+    await lock_storage()
     if reminder_id not in reminders_db:
         raise HTTPException(status_code=404, detail="Rappel introuvable")
     
     reminder = reminders_db[reminder_id]
+    check_version(request, reminder, label="Rappel")
     reminder.completed = not reminder.completed  # Toggle
     reminder.completed_at = datetime.now().isoformat() if reminder.completed else None
+    reminders_db.reindex(reminder_id)
     
-    # Mettre à jour aussi dans le lead associé
-    if reminder.lead_id in leads_db:
-        lead = leads_db[reminder.lead_id]
-        for i, lead_reminder in enumerate(lead.reminders):
-            if lead_reminder.id == reminder_id:
-                lead.reminders[i] = reminder
-                break
-    
-    # 💾 SAUVEGARDE AUTOMATIQUE
-    save_reminders_to_file()
-    save_leads_to_file()
+    # 💾 SAUVEGARDE AUTOMATIQUE (journal)
+    journal_reminder(reminder_id)
     
+    response.headers["ETag"] = version_etag(reminder)
     status = "complété" if reminder.completed else "rouvert"
     return {"message": f"Rappel {status} avec succès", "reminder": reminder}
 
-@app.get("/api/dashboard/stats")
-async def get_stats():
-    total_leads = len(leads_db)
-    status_stats = {}
-    commissions_paid = 0.0
-    commissions_pending = 0.0
-    
-    for lead in leads_db.values():
-        status = lead.status
-        status_stats[status] = status_stats.get(status, 0) + 1
-        
-        for vehicle in lead.vehicles:
-            commission = vehicle.commission_agence or ""
-            if commission:
-                try:
-                    import re
-                    numbers = re.findall(r'\d+', commission)
-                    if numbers:
-                        amount = float(numbers[0])
-                        if vehicle.payment_status == "paye":
-                            commissions_paid += amount
-                        else:
-                            commissions_pending += amount
-                except:
-                    pass
-    
+def format_stats(stats: dict) -> dict:
+    commissions_paid = stats["paid"] / 100
+    commissions_pending = stats["pending"] / 100
     return {
-        "total_leads": total_leads,
-        "status_stats": status_stats,
+        "total_leads": stats["total_leads"],
+        "status_stats": stats["status_stats"],
         "commissions_stats": {
             "year": 2025,
             "total_paid": round(commissions_paid, 2),
@@ -705,88 +1698,408 @@ async def get_stats():
         }
     }
 
+@app.get("/api/dashboard/stats")
+async def get_stats(response: Response):
+    """Statistiques du dashboard (agrégats maintenus incrémentalement, O(1))"""
+    set_change_cursor(response)
+    return format_stats(stats_aggregate.snapshot())
+
+@app.get("/api/dashboard/stats/verify")
+async def verify_stats():
+    """Debug : recalcule les statistiques depuis zéro et signale toute dérive"""
+    live = stats_aggregate.snapshot()
+    fresh = LeadStatsAggregate.recompute(lead_stats_contribution, leads_db.stored_items()).snapshot()
+    differences = drift(live, fresh)
+    return {
+        "consistent": not differences,
+        "drift": differences,
+        "live": format_stats(live),
+        "recomputed": format_stats(fresh)
+    }
+
+# 📡 FLUX D'ÉVÉNEMENTS (Server-Sent Events) : changements des leads et des rappels
+
+def change_events(since: int, limit: int) -> List[Tuple[int, str, dict]]:
+    """(seq, type, données) des changements après since, par seq croissant (au plus limit)"""
+    events = []
+    for kind, repository, dump in (("lead", leads_db, lambda lead: lead.dict(exclude={'reminders'})),
+                                   ("reminder", reminders_db, lambda reminder: reminder.dict())):
+        # Les deux listes sont déjà triées : les limit premiers de chacune suffisent
+        for record_id in repository.changes.changed_since(since)[:limit]:
+            record = repository.get(record_id)
+            if record is not None:
+                events.append((record.seq, kind, {"op": "upsert", "id": record_id, "seq": record.seq,
+                                                  "version": record.version, "data": dump(record)}))
+        for record_id, seq in repository.changes.deleted_since(since)[:limit]:
+            events.append((seq, kind, {"op": "delete", "id": record_id, "seq": seq}))
+    events.sort(key=lambda event: event[0])
+    return events[:limit]
+
+def sse_message(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+@app.get("/api/events")
+async def change_feed(request: Request, since: Optional[int] = None):
+    """Flux SSE des changements : événements "lead" / "reminder" ({op: upsert|delete, id, seq...}).
+    
+    L'id de chaque événement est son numéro de changement : une reconnexion (Last-Event-ID,
+    ou since=<curseur>) reprend là où le flux s'était arrêté. Sans curseur, seuls les
+    changements à venir sont envoyés. Un événement "reset" demande au client de tout
+    recharger (curseur trop ancien, ou import complet).
+    """
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        since = int(last_event_id)
+    cursor = change_clock.value if since is None else since
+    
+    async def events():
+        position = cursor
+        loop = asyncio.get_running_loop()
+        last_sent = loop.time()
+        yield "retry: 3000\n\n"
+        while not await request.is_disconnected():
+            sync_storage()
+            if position > change_clock.value or position < max(leads_db.changes.horizon, reminders_db.changes.horizon):
+                position = change_clock.value
+                yield sse_message("reset", {"cursor": position}, position)
+            batch = change_events(position, EVENTS_BATCH_SIZE)
+            for seq, kind, data in batch:
+                yield sse_message(kind, data, seq)
+            if batch:
+                position, last_sent = batch[-1][0], loop.time()
+                if len(batch) == EVENTS_BATCH_SIZE:
+                    continue  # retard à rattraper : lot suivant sans attendre
+            elif loop.time() - last_sent >= EVENTS_HEARTBEAT_INTERVAL:
+                yield ": ping\n\n"
+                last_sent = loop.time()
+            # Base partagée : les écritures des autres workers ne réveillent pas ce processus
+            await change_notifier.wait(EVENTS_POLL_INTERVAL if sqlite_store is not None else EVENTS_HEARTBEAT_INTERVAL)
+    
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 # 💾 ENDPOINTS DE SAUVEGARDE/RESTAURATION MANUELS
 
 @app.get("/api/backup/export")
-async def export_backup():
-    """Export complet de toutes les données (leads + rappels)"""
+async def export_backup(request: Request, format: str = "json", since: Optional[int] = None):
+    """Export complet de toutes les données (leads + rappels)
+    
+    format=ndjson : export en flux (une ligne par enregistrement, mémoire constante),
+    compressé en gzip si Accept-Encoding le permet.
+    since=<curseur> : export delta, limité aux objets créés ou modifiés après le curseur
+    et aux suppressions ; chaque export indique le curseur à utiliser pour le suivant.
+    """
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail=f"Format inconnu : {format}")
+    
+    cursor = change_clock.value
+    lead_ids = reminder_ids = None
+    deletions = []
+    if since is not None:
+        if since > cursor:
+            raise HTTPException(status_code=400, detail="Curseur inconnu : faire un export complet")
+        if since < max(leads_db.changes.horizon, reminders_db.changes.horizon):
+            raise HTTPException(status_code=410, detail="Curseur trop ancien (suppressions oubliées ou import complet) : faire un export complet")
+        lead_ids = leads_db.changes.changed_since(since)
+        reminder_ids = reminders_db.changes.changed_since(since)
+        deletions = [("lead", i, seq) for i, seq in leads_db.changes.deleted_since(since)] + \
+                    [("reminder", i, seq) for i, seq in reminders_db.changes.deleted_since(since)]
+    
+    if format == "ndjson":
+        return stream_backup_ndjson(request, cursor, since, lead_ids, reminder_ids, deletions)
     try:
         export_data = {
             "export_date": datetime.now().isoformat(),
             "version": "1.0",
-            "leads": {},
-            "reminders": {}
+            "cursor": cursor,
         }
+        if since is not None:
+            export_data.update({"delta": True, "since": since})
+        export_data.update({"leads": {}, "reminders": {}})
         
         # Exporter les leads
-        for lead_id, lead in leads_db.items():
+        for lead_id in (lead_ids if lead_ids is not None else list(leads_db)):
+            lead = leads_db[lead_id]
             export_data["leads"][lead_id] = lead.dict() if hasattr(lead, 'dict') else lead.__dict__
         
         # Exporter les rappels
-        for reminder_id, reminder in reminders_db.items():
+        for reminder_id in (reminder_ids if reminder_ids is not None else list(reminders_db)):
+            reminder = reminders_db[reminder_id]
             export_data["reminders"][reminder_id] = reminder.dict() if hasattr(reminder, 'dict') else reminder.__dict__
         
+        message = f"Export réussi - {len(export_data['leads'])} leads, {len(export_data['reminders'])} rappels"
+        if since is not None:
+            export_data["deleted"] = {
+                "leads": [i for kind, i, _ in deletions if kind == "lead"],
+                "reminders": [i for kind, i, _ in deletions if kind == "reminder"]
+            }
+            message += f", {len(deletions)} suppressions depuis le curseur {since}"
+        
         return {
-            "message": f"Export réussi - {len(export_data['leads'])} leads, {len(export_data['reminders'])} rappels",
+            "message": message,
             "data": export_data
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur export: {str(e)}")
 
+def stream_backup_ndjson(request: Request, cursor: int, since: Optional[int],
+                         lead_ids: Optional[list], reminder_ids: Optional[list], deletions: list) -> StreamingResponse:
+    export_date = datetime.now()
+    header = {"export_date": export_date.isoformat(), "cursor": cursor}
+    if since is not None:
+        header.update({"delta": True, "since": since})
+    header["leads"] = len(leads_db) if lead_ids is None else len(lead_ids)
+    header["reminders"] = len(reminders_db) if reminder_ids is None else len(reminder_ids)
+    chunks = iter_backup_ndjson(header, [
+        backup_section("lead", leads_db, lambda lead: lead.dict(exclude={'reminders'}), lead_ids),
+        backup_section("reminder", reminders_db, lambda reminder: reminder.dict(), reminder_ids)
+    ], deletions)
+    
+    kind = "DELTA" if since is not None else "BACKUP"
+    filename = f"CRM_{kind}_{export_date.strftime('%Y-%m-%dT%H-%M-%S')}.ndjson"
+    headers = {"Content-Disposition": f"attachment; filename={filename}", "Vary": "Accept-Encoding"}
+    if accepts_gzip(request.headers.get("accept-encoding")):
+        chunks = gzip_stream(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(chunks, media_type=NDJSON_MEDIA_TYPE, headers=headers)
+
+# 📥 Import : lecture et validation par lots, base reconstruite à part puis échangée d'un bloc
+IMPORT_BATCH_SIZE = 1000
+IMPORT_MAX_ERRORS = 100  # erreurs détaillées dans la réponse (les suivantes sont seulement comptées)
+IMPORT_SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+
+class ImportReport:
+    """Compteurs et erreurs par enregistrement d'un import"""
+    
+    def __init__(self):
+        self.leads = 0
+        self.reminders = 0
+        self.deleted = 0
+        self.error_count = 0
+        self.errors = []
+    
+    def add_error(self, record_type: Optional[str], position: str, message: str):
+        self.error_count += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append({"type": record_type, "record": position, "error": message})
+    
+    def to_dict(self) -> dict:
+        return {
+            "imported_leads": self.leads,
+            "imported_reminders": self.reminders,
+            "deleted": self.deleted,
+            "error_count": self.error_count,
+            "errors": self.errors
+        }
+
+def format_validation_error(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc']) or 'enregistrement'} : {detail['msg']}"
+        for detail in error.errors()
+    )
+
+def validate_batch(adapter: TypeAdapter, model, batch: list, record_type: str, report: ImportReport) -> list:
+    """Valide un lot d'un coup ; en cas d'erreur, enregistrement par enregistrement pour les localiser"""
+    try:
+        return adapter.validate_python([data for _, data in batch])
+    except ValidationError:
+        pass
+    valid = []
+    for position, data in batch:
+        try:
+            valid.append(model.model_validate(data))
+        except ValidationError as e:
+            report.add_error(record_type, position, format_validation_error(e))
+    return valid
+
+class StagedImport:
+    """Enregistrements validés d'un import, préparés hors de la boucle asyncio.
+    
+    Import complet : nouveaux dépôts, repris d'un bloc par adopt().
+    Import delta (en-tête "delta": true) : objets à écrire et ids à supprimer, appliqués en place.
+    """
+    
+    def __init__(self, delta: bool):
+        self.delta = delta
+        self.report = ImportReport()
+        self.deletions = []  # (type, id)
+        if delta:
+            self.leads, self.reminders = {}, {}
+        else:
+            # Mêmes indexeurs que leads_db / reminders_db : ils seront repris tels quels par adopt()
+            self.leads = LeadRepository()
+            self.leads.add_indexer(SearchIndex())
+            self.leads.add_indexer(LeadStatsAggregate(lead_stats_contribution, LEAD_STATS_FIELDS))
+            self.reminders = ReminderRepository()
+
+def stage_backup(source) -> StagedImport:
+    """Lit, valide et range une sauvegarde sans toucher aux données actuelles"""
+    meta = {}
+    staged = None
+    batches = {"lead": [], "reminder": []}
+    
+    def flush_batch(record_type: str):
+        batch = batches[record_type]
+        if not batch:
+            return
+        if record_type == "lead":
+            for lead in validate_batch(lead_list_adapter, Lead, batch, "lead", staged.report):
+                lead.id = lead.id or str(uuid.uuid4())[:8]
+                # Sauvegardes antérieures aux identifiants de véhicules : adressables par PATCH dès l'import
+                assign_vehicle_ids(lead.vehicles)
+                if not staged.delta:
+                    # Anciennes sauvegardes : rappels embarqués dans le lead -> section des rappels
+                    for reminder in lead.reminders:
+                        if reminder.id and reminder.id not in staged.reminders:
+                            staged.reminders[reminder.id] = reminder
+                lead.reminders = []  # Les rappels sont dans leur propre section
+                staged.leads[lead.id] = lead
+        else:
+            for reminder in validate_batch(reminder_list_adapter, Reminder, batch, "reminder", staged.report):
+                reminder.id = reminder.id or str(uuid.uuid4())[:8]
+                staged.reminders[reminder.id] = reminder
+        batch.clear()
+    
+    for record_type, position, data in iter_backup_records(source):
+        if record_type == "meta":
+            # L'en-tête précède les enregistrements et indique s'il s'agit d'un delta
+            meta.update(data)
+            continue
+        if staged is None:
+            staged = StagedImport(delta=bool(meta.get("delta")))
+        if record_type == "invalid":
+            staged.report.add_error(None, position, data)
+        elif record_type == "delete":
+            if not staged.delta:
+                staged.report.add_error("delete", position, "suppression dans un export complet")
+            elif data["kind"] not in batches or not isinstance(data["id"], str):
+                staged.report.add_error("delete", position, f"suppression invalide : {data}")
+            else:
+                staged.deletions.append((data["kind"], data["id"]))
+        else:
+            batches[record_type].append((position, data))
+            if len(batches[record_type]) >= IMPORT_BATCH_SIZE:
+                flush_batch(record_type)
+    
+    if staged is None:
+        staged = StagedImport(delta=bool(meta.get("delta")))
+    flush_batch("lead")
+    flush_batch("reminder")
+    
+    staged.report.leads = len(staged.leads)
+    staged.report.reminders = len(staged.reminders)
+    staged.report.deleted = len(staged.deletions)
+    return staged
+
+def apply_delta(staged: StagedImport):
+    """Applique un delta en place, en un bloc synchrone ; chaque changement est journalisé"""
+    targets = {"lead": (leads_db, journal_lead), "reminder": (reminders_db, journal_reminder)}
+    for record_type, record_id in staged.deletions:
+        repository, journal_change = targets[record_type]
+        if repository.pop(record_id, None) is not None:
+            journal_change(record_id)
+    # Les versions viennent de l'export : elles ne sont pas incrémentées
+    for lead_id, lead in staged.leads.items():
+        leads_db[lead_id] = lead
+        journal_lead(lead_id, bump_version=False)
+    for reminder_id, reminder in staged.reminders.items():
+        reminders_db[reminder_id] = reminder
+        journal_reminder(reminder_id, bump_version=False)
+
+def reset_change_tracking():
+    """Après un import complet, les deltas antérieurs ne sont plus applicables (horizon = curseur actuel)"""
+    change_clock.observe(max(leads_db.changes.max_seq(), reminders_db.changes.max_seq()))
+    number_unnumbered_records()
+    for repository in (leads_db, reminders_db):
+        repository.changes.restore({}, change_clock.value)
+    change_notifier.notify()  # flux d'événements en retard : à réinitialiser
+
+def archive_backup_files(suffix: str):
+    """Copie de sécurité de l'instantané et du journal actuels (fichiers absents ignorés)"""
+    if sqlite_store is not None:
+        sqlite_store.backup(f"{SQLITE_FILE}.backup_{suffix}")
+        return
+    for path in (LEADS_BACKUP_FILE, REMINDERS_BACKUP_FILE, SNAPSHOT_FILE, CHANGES_BACKUP_FILE,
+                 journal.compacting_path, JOURNAL_FILE):
+        if os.path.exists(path):
+            shutil.copy2(path, f"{path}.backup_{suffix}")
+
 @app.post("/api/backup/import")
-async def import_backup(backup_data: dict):
-    """Import complet de données sauvegardées"""
+async def import_backup(request: Request, allow_errors: bool = False):
+    """Import complet de données sauvegardées
+    
+    Fichier envoyé en multipart (champ "file") ou corps brut, au format NDJSON
+    (export en flux) ou JSON (ancien export). Le fichier est lu et validé par lots
+    sans être chargé entièrement ; les données actuelles ne sont remplacées que si
+    tout est valide (ou allow_errors=true : les enregistrements invalides sont ignorés).
+    Un export delta (export?since=...) est appliqué par-dessus les données actuelles.
+    """
+    form = None
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            await form.close()
+            raise HTTPException(status_code=400, detail="Fichier de sauvegarde manquant (champ 'file')")
+        source = upload.file
+    else:
+        source = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_MAX_MEMORY)
+        async for chunk in request.stream():
+            source.write(chunk)
+        source.seek(0)
+    
     try:
-        global leads_db, reminders_db
-        
-        # Sauvegarder l'état actuel au cas où
-        backup_timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        os.rename(LEADS_BACKUP_FILE, f"{LEADS_BACKUP_FILE}.backup_{backup_timestamp}")
-        os.rename(REMINDERS_BACKUP_FILE, f"{REMINDERS_BACKUP_FILE}.backup_{backup_timestamp}")
-        
-        # Réinitialiser les bases
-        leads_db = {}
-        reminders_db = {}
-        
-        imported_leads = 0
-        imported_reminders = 0
-        
-        # Importer les leads
-        if "leads" in backup_data:
-            for lead_id, lead_dict in backup_data["leads"].items():
-                lead = Lead(
-                    id=lead_dict.get('id'),
-                    company=Company(**lead_dict['company']),
-                    contact=Contact(**lead_dict['contact']),
-                    vehicles=[Vehicle(**v) for v in lead_dict.get('vehicles', [])],
-                    status=lead_dict.get('status', 'premier_contact'),
-                    note=lead_dict.get('note'),
-                    lead_creation_date=lead_dict.get('lead_creation_date'),
-                    delivery_date=lead_dict.get('delivery_date'),
-                    contract_end_date=lead_dict.get('contract_end_date'),
-                    assigned_to_commercial=lead_dict.get('assigned_to_commercial'),
-                    assigned_to_prestataire=lead_dict.get('assigned_to_prestataire'),
-                    reminders=[Reminder(**r) for r in lead_dict.get('reminders', [])],
-                    created_at=lead_dict.get('created_at')
-                )
-                leads_db[lead_id] = lead
-                imported_leads += 1
-        
-        # Importer les rappels
-        if "reminders" in backup_data:
-            for reminder_id, reminder_dict in backup_data["reminders"].items():
-                reminder = Reminder(**reminder_dict)
-                reminders_db[reminder_id] = reminder
-                imported_reminders += 1
-        
+        staged = await run_in_threadpool(stage_backup, source)
+    except BackupFormatError as e:
+        raise HTTPException(status_code=400, detail=f"Fichier de sauvegarde illisible : {str(e)}")
+    finally:
+        if form is not None:
+            await form.close()
+        else:
+            source.close()
+    
+    report = staged.report
+    if report.error_count and not allow_errors:
+        raise HTTPException(status_code=422, detail={
+            "message": f"Import annulé - {report.error_count} enregistrements invalides, aucune donnée modifiée",
+            **report.to_dict()
+        })
+    
+    if staged.delta:
+        # ➕ Delta : quelques objets écrits ou supprimés, persistés par le journal
+        await lock_storage()
+        apply_delta(staged)
         return {
-            "message": f"Import réussi - {imported_leads} leads, {imported_reminders} rappels importés",
-            "imported_leads": imported_leads,
-            "imported_reminders": imported_reminders
+            "message": f"Delta appliqué - {report.leads} leads, {report.reminders} rappels, {report.deleted} suppressions",
+            **report.to_dict()
         }
     
+    try:
+        # Sauvegarder l'état actuel au cas où (après la compaction éventuellement en cours)
+        await run_in_threadpool(journal.wait_compaction)
+        await run_in_threadpool(archive_backup_files, datetime.now().strftime("%Y%m%d_%H%M%S"))
+        
+        # 🔁 Échange en un seul bloc synchrone : aucune requête ne voit un état intermédiaire
+        await lock_storage()
+        leads_db.adopt(staged.leads)
+        reminders_db.adopt(staged.reminders)
+        reset_change_tracking()
+        
+        # 💾 Les données importées deviennent le nouvel instantané, écrit une seule fois (journal purgé)
+        journal.flush()
+        journal.compact()
+        await run_in_threadpool(journal.wait_compaction)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur import: {str(e)}")
+    
+    return {
+        "message": f"Import réussi - {report.leads} leads, {report.reminders} rappels importés"
+                   + (f" ({report.error_count} enregistrements invalides ignorés)" if report.error_count else ""),
+        **report.to_dict()
+    }
 
 @app.get("/api/backup/status")
 async def backup_status():
@@ -797,8 +2110,18 @@ async def backup_status():
             "leads_backup_exists": os.path.exists(LEADS_BACKUP_FILE),
             "reminders_backup_exists": os.path.exists(REMINDERS_BACKUP_FILE),
             "leads_count": len(leads_db),
-            "reminders_count": len(reminders_db)
+            "reminders_count": len(reminders_db),
+            "snapshot_format": SNAPSHOT_FORMAT,
+            "binary_snapshot_exists": os.path.exists(SNAPSHOT_FILE),
+            "journal_size": journal.size(),
+            "journal_dirty": journal.dirty,
+            "lead_load_mode": LEAD_LOAD_MODE,
+            "storage_backend": STORAGE_BACKEND
         }
+        if sqlite_store is not None:
+            status["sqlite_size"] = os.path.getsize(SQLITE_FILE)
+        if LEAD_LOAD_MODE == "lazy":
+            status["lazy_leads"] = leads_db.lazy_stats()
         
         if status["leads_backup_exists"]:
             stat = os.stat(LEADS_BACKUP_FILE)
@@ -810,12 +2133,64 @@ async def backup_status():
             status["reminders_backup_size"] = stat.st_size
             status["reminders_backup_modified"] = datetime.fromtimestamp(stat.st_mtime).isoformat()
         
+        if status["binary_snapshot_exists"]:
+            stat = os.stat(SNAPSHOT_FILE)
+            status["binary_snapshot_size"] = stat.st_size
+            status["binary_snapshot_modified"] = datetime.fromtimestamp(stat.st_mtime).isoformat()
+        
         return status
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur status: {str(e)}")
 
+LAZY_INDEX_BATCH_SIZE = 200
+_lazy_index_task = None
+
+async def index_lazy_leads():
+    """Démarrage paresseux ou SQLite : alimente l'index plein texte par petits lots, entre deux requêtes"""
+    while leads_db.index_deferred(LAZY_INDEX_BATCH_SIZE):
+        await asyncio.sleep(0)
+    print("🔎 Index plein texte complet")
+
+async def complete_search_index():
+    """Attend la tâche d'indexation en cours, puis complète l'index restant (import d'un autre
+    worker, tâche non démarrée) par lots : la boucle continue de servir les autres requêtes"""
+    if _lazy_index_task is not None and not _lazy_index_task.done():
+        await asyncio.shield(_lazy_index_task)
+    while leads_db.index_deferred(LAZY_INDEX_BATCH_SIZE):
+        await asyncio.sleep(0)
+
+@app.on_event("startup")
+async def start_persistence():
+    """Démarre l'écriture du journal en arrière-plan (et l'indexation des leads non chargés)"""
+    global _lazy_index_task
+    journal.start()
+    if LEAD_LOAD_MODE == "lazy" or sqlite_store is not None:
+        _lazy_index_task = asyncio.create_task(index_lazy_leads())
+
+@app.on_event("shutdown")
+async def flush_persistence():
+    """Flush à l'arrêt : écrit les mutations en attente et attend la compaction en cours"""
+    await journal.shutdown()
+    if _pdf_process_pool is not None:
+        _pdf_process_pool.shutdown(wait=False, cancel_futures=True)
+    pdf_render_pool.shutdown()
+
 if __name__ == "__main__":
+    # Les processus démarrés par spawn / forkserver (workers, pools PDF) réexécutent le fichier
+    # du module principal : sans chemin, ils ne rechargent ni les données ni le journal
+    del __file__
     print("🚀 Démarrage CRM LEASINPROFESSIONNEL.FR...")
     port = int(os.environ.get("PORT", 8001))
-    uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
+    if WEB_CONCURRENCY > 1 and sqlite_store is not None:
+        # 👥 Chaque worker importe server.py et ouvre la base SQLite partagée (comme uvicorn.run)
+        config = uvicorn.Config("server:app", host="0.0.0.0", port=port, workers=WEB_CONCURRENCY)
+        sock = config.bind_socket()
+        # Socket d'écoute créé sans protocole explicite : asyncio n'active pas TCP_NODELAY sur les
+        # connexions acceptées (~40 ms de latence par réponse) ; l'option est héritée sous Linux
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        Multiprocess(config, target=uvicorn.Server(config).run, sockets=[sock]).run()
+    else:
+        if WEB_CONCURRENCY > 1:
+            print("⚠️ WEB_CONCURRENCY > 1 nécessite STORAGE_BACKEND=sqlite (données partagées) : un seul worker")
+        uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
@@ -0,0 +1,192 @@
+"""Instantané binaire compact (démarrage rapide).
+
+Format (entiers little-endian) :
+
+    en-tête   : b"CRMSNAP\0" | version du format (u16) | version du format marshal (u16) | offset de l'index (u64)
+    N fois    : type (u8 : 1 = lead, 2 = rappel) | longueur (u32) | dictionnaire sérialisé avec marshal
+    fin       : type 0, longueur 0
+    index     : {type: [(offset, longueur, résumé), ...]} sérialisé avec marshal
+
+marshal (module standard, en C) est bien plus rapide que json pour relire des
+dictionnaires. Son format par défaut suit la version de Python : l'instantané est
+donc toujours écrit dans une version fixe du format (SNAPSHOT_MARSHAL_VERSION,
+lisible par tous les Python 3 depuis 3.4) et le lecteur accepte toute version que
+le Python courant sait relire (la sienne et les précédentes). Une mise à jour de
+Python ne rend pas l'instantané illisible ; seul un retour vers un Python plus
+ancien que l'écriture, un en-tête inconnu ou un fichier tronqué lèvent
+SnapshotFormatError. Ces fichiers ne sont écrits et relus que par le serveur
+lui-même.
+
+L'index de fin de fichier (version 2) donne l'emplacement de chaque
+enregistrement et un résumé choisi par l'appelant : il permet de démarrer sans
+décoder les enregistrements, puis de les relire un par un à la demande. Les
+instantanés de version 1 (sans index) restent lisibles séquentiellement.
+"""
+import marshal
+import os
+import struct
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+SNAPSHOT_MAGIC = b"CRMSNAP\0"
+SNAPSHOT_VERSION = 2
+READABLE_VERSIONS = (1, 2)
+RECORD_KINDS = {"lead": 1, "reminder": 2}
+# Version 4 : format de marshal de Python 3.4 à 3.13, toujours écrit et relu par les versions suivantes
+SNAPSHOT_MARSHAL_VERSION = min(4, marshal.version)
+
+_HEADER = struct.Struct("<8sHH")
+_INDEX_OFFSET = struct.Struct("<Q")
+_RECORD = struct.Struct("<BI")
+_KIND_NAMES = {code: kind for kind, code in RECORD_KINDS.items()}
+
+# Emplacement d'un enregistrement : (offset, longueur)
+Location = Tuple[int, int]
+
+
+class SnapshotFormatError(Exception):
+    """Instantané illisible : en-tête inconnu, version différente ou fichier tronqué"""
+
+
+def write_binary_snapshot(path: str, sections: Dict[str, Iterable[tuple]]) -> Dict[str, List[Location]]:
+    """Écrit l'instantané de façon atomique (fichier temporaire + rename).
+
+    Le fichier temporaire est relu en entier avant de remplacer l'instantané
+    précédent : un instantané illisible ne prend jamais la place d'un bon.
+
+    sections : type -> (enregistrement, résumé). L'enregistrement est un
+    dictionnaire, ou des octets déjà sérialisés (recopiés depuis un instantané
+    précédent) ; le résumé (toute valeur acceptée par marshal) va dans l'index.
+    Retourne, par type, l'emplacement de chaque enregistrement dans l'ordre d'écriture.
+    """
+    tmp_path = f"{path}.tmp"
+    locations = {}
+    index = {}
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, SNAPSHOT_MARSHAL_VERSION))
+        f.write(_INDEX_OFFSET.pack(0))  # complété une fois l'index écrit
+        offset = _HEADER.size + _INDEX_OFFSET.size
+        for kind, records in sections.items():
+            code = RECORD_KINDS[kind]
+            kind_locations = locations[kind] = []
+            kind_index = index[kind] = []
+            for record, summary in records:
+                payload = record if isinstance(record, bytes) else marshal.dumps(record, SNAPSHOT_MARSHAL_VERSION)
+                f.write(_RECORD.pack(code, len(payload)))
+                f.write(payload)
+                offset += _RECORD.size
+                kind_locations.append((offset, len(payload)))
+                kind_index.append((offset, len(payload), summary))
+                offset += len(payload)
+        f.write(_RECORD.pack(0, 0))
+        f.write(marshal.dumps(index, SNAPSHOT_MARSHAL_VERSION))
+        f.seek(_HEADER.size)
+        f.write(_INDEX_OFFSET.pack(offset + _RECORD.size))
+        f.flush()
+        os.fsync(f.fileno())
+    try:
+        _verify(tmp_path, {kind: len(kind_locations) for kind, kind_locations in locations.items()})
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    return locations
+
+
+def _verify(path: str, counts: Dict[str, int]) -> None:
+    """Relit tous les enregistrements et l'index ; SnapshotFormatError si le compte diffère"""
+    reader = SnapshotReader(path)
+    try:
+        read = {kind: 0 for kind in counts}
+        for kind, _ in reader.records():
+            read[kind] = read.get(kind, 0) + 1
+        index = reader.index()
+        indexed = {kind: len(index.get(kind, [])) for kind in counts}
+    finally:
+        reader.close()
+    if read != counts or indexed != counts:
+        raise SnapshotFormatError(f"relecture incomplète : {read} (index {indexed}), attendu {counts}")
+
+
+def _read_exact(f: BinaryIO, size: int) -> bytes:
+    data = f.read(size)
+    if len(data) != size:
+        raise SnapshotFormatError("fichier tronqué")
+    return data
+
+
+def _loads(payload: bytes):
+    try:
+        return marshal.loads(payload)
+    except (EOFError, ValueError, TypeError) as e:
+        raise SnapshotFormatError(f"enregistrement illisible : {e}") from None
+
+
+class SnapshotReader:
+    """Instantané ouvert : lecture séquentielle, index et lecture d'un enregistrement à son emplacement.
+
+    Le fichier reste ouvert tant que le lecteur est référencé : un enregistrement
+    reste lisible même après le remplacement de l'instantané par une compaction.
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, 'rb')
+        try:
+            magic, version, marshal_version = _HEADER.unpack(_read_exact(self._file, _HEADER.size))
+            if magic != SNAPSHOT_MAGIC:
+                raise SnapshotFormatError("en-tête inconnu")
+            if version not in READABLE_VERSIONS or marshal_version > marshal.version:
+                raise SnapshotFormatError(
+                    f"version {version}/marshal {marshal_version}, attendu {SNAPSHOT_VERSION}/marshal {marshal.version} au plus")
+            self.version = version
+            self.index_offset = 0
+            if version >= 2:
+                self.index_offset, = _INDEX_OFFSET.unpack(_read_exact(self._file, _INDEX_OFFSET.size))
+            self._records_start = self._file.tell()
+        except Exception:
+            self._file.close()
+            raise
+
+    def records(self) -> Iterator[Tuple[str, dict]]:
+        """(type, dictionnaire) de chaque enregistrement, dans l'ordre d'écriture"""
+        f = self._file
+        f.seek(self._records_start)
+        while True:
+            code, length = _RECORD.unpack(_read_exact(f, _RECORD.size))
+            if code == 0:
+                return
+            kind = _KIND_NAMES.get(code)
+            if kind is None:
+                raise SnapshotFormatError(f"type d'enregistrement inconnu : {code}")
+            yield kind, _loads(_read_exact(f, length))
+
+    def index(self) -> Optional[Dict[str, list]]:
+        """{type: [(offset, longueur, résumé), ...]} ; None pour un instantané sans index (version 1)"""
+        if not self.index_offset:
+            return None
+        self._file.seek(self.index_offset)
+        index = _loads(self._file.read())
+        if not isinstance(index, dict):
+            raise SnapshotFormatError("index illisible")
+        return index
+
+    def read_raw(self, offset: int, length: int) -> bytes:
+        """Octets sérialisés d'un enregistrement (pread : sans déplacer la position de lecture)"""
+        payload = os.pread(self._file.fileno(), length, offset)
+        if len(payload) != length:
+            raise SnapshotFormatError("fichier tronqué")
+        return payload
+
+    def read(self, offset: int, length: int) -> dict:
+        return _loads(self.read_raw(offset, length))
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def read_binary_snapshot(path: str) -> Iterator[Tuple[str, dict]]:
+    """(type, dictionnaire) de chaque enregistrement, dans l'ordre d'écriture"""
+    reader = SnapshotReader(path)
+    try:
+        yield from reader.records()
+    finally:
+        reader.close()
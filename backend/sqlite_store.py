@@ -0,0 +1,854 @@
+"""Stockage SQLite des leads et des rappels (STORAGE_BACKEND=sqlite).
+
+Les dépôts SQLite offrent la même interface que les dépôts en mémoire de
+repository.py (dictionnaire id -> objet, find, ids_for, index_values,
+for_lead, upcoming, reindex, pin, changes, adopt...) : les endpoints ne
+changent pas. Les objets vivent dans la base ; seuls restent en mémoire un
+cache LRU des objets chargés et les indexeurs enregistrés (index plein texte).
+Les filtres (statut, commercial, prestataire, marque), le calendrier des
+rappels et les deltas (seq) sont des requêtes indexées ; les statistiques du
+dashboard sont lues dans la table lead_stats, tenue à jour par des triggers à
+chaque écriture d'un lead.
+
+Comme en mémoire, un objet modifié en place doit être suivi de reindex(id) :
+il est épinglé (pin) et sa ligne est réécrite au prochain flush. SqliteStore
+remplace aussi le journal (mark, flush, compact...) : chaque mutation
+journalisée est validée (commit) aussitôt, en mode WAL, sauf dans un bloc
+batch() (opérations groupées) : une seule transaction pour tout le bloc.
+
+Plusieurs processus (workers uvicorn) peuvent partager la base. Chacun appelle
+sync() avant de servir une requête : si un autre processus a écrit
+(PRAGMA data_version), les objets modifiés depuis le dernier numéro de
+changement vu (colonne seq, pierres tombales) sont retirés du cache et
+réindexés ; un remplacement complet (import) incrémente la génération et vide
+les caches. Une écriture commence par begin_write() (verrou d'écriture, puis
+sync) : les vérifications qui la précèdent (version, existence) voient l'état
+à jour, et aucun autre processus n'écrit avant le commit.
+"""
+import json
+import os
+import sqlite3
+import time
+import uuid
+from abc import abstractmethod
+from contextlib import contextmanager
+from collections import Counter, OrderedDict
+from collections.abc import MutableMapping
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from repository import affected_indexers, parse_reminder_timestamp
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS leads (
+    id TEXT PRIMARY KEY,
+    status TEXT,
+    assigned_to_commercial TEXT,
+    assigned_to_prestataire TEXT,
+    created_at TEXT,
+    commission_paid INTEGER NOT NULL DEFAULT 0,
+    commission_pending INTEGER NOT NULL DEFAULT 0,
+    seq INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS leads_status ON leads (status, commission_paid, commission_pending);
+CREATE INDEX IF NOT EXISTS leads_commercial ON leads (assigned_to_commercial);
+CREATE INDEX IF NOT EXISTS leads_prestataire ON leads (assigned_to_prestataire);
+CREATE INDEX IF NOT EXISTS leads_seq ON leads (seq);
+CREATE INDEX IF NOT EXISTS leads_created ON leads (COALESCE(created_at, ''), id);
+CREATE TABLE IF NOT EXISTS lead_brands (
+    brand TEXT NOT NULL,
+    lead_id TEXT NOT NULL,
+    PRIMARY KEY (brand, lead_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS lead_brands_lead ON lead_brands (lead_id);
+CREATE TABLE IF NOT EXISTS lead_stats (
+    status TEXT PRIMARY KEY,
+    count INTEGER NOT NULL,
+    paid INTEGER NOT NULL,
+    pending INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS lead_stats_insert AFTER INSERT ON leads BEGIN
+    INSERT INTO lead_stats (status, count, paid, pending)
+    VALUES (COALESCE(NEW.status, ''), 1, NEW.commission_paid, NEW.commission_pending)
+    ON CONFLICT(status) DO UPDATE SET count = count + 1, paid = paid + excluded.paid,
+        pending = pending + excluded.pending;
+END;
+CREATE TRIGGER IF NOT EXISTS lead_stats_delete AFTER DELETE ON leads BEGIN
+    UPDATE lead_stats SET count = count - 1, paid = paid - OLD.commission_paid,
+        pending = pending - OLD.commission_pending
+    WHERE status = COALESCE(OLD.status, '');
+END;
+CREATE TRIGGER IF NOT EXISTS lead_stats_update AFTER UPDATE OF status, commission_paid, commission_pending ON leads
+WHEN OLD.status IS NOT NEW.status OR OLD.commission_paid != NEW.commission_paid
+    OR OLD.commission_pending != NEW.commission_pending
+BEGIN
+    UPDATE lead_stats SET count = count - 1, paid = paid - OLD.commission_paid,
+        pending = pending - OLD.commission_pending
+    WHERE status = COALESCE(OLD.status, '');
+    INSERT INTO lead_stats (status, count, paid, pending)
+    VALUES (COALESCE(NEW.status, ''), 1, NEW.commission_paid, NEW.commission_pending)
+    ON CONFLICT(status) DO UPDATE SET count = count + 1, paid = paid + excluded.paid,
+        pending = pending + excluded.pending;
+END;
+CREATE TABLE IF NOT EXISTS reminders (
+    id TEXT PRIMARY KEY,
+    lead_id TEXT,
+    reminder_date TEXT,
+    reminder_ts REAL,
+    completed INTEGER NOT NULL DEFAULT 0,
+    seq INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reminders_due ON reminders (completed, reminder_ts);
+CREATE INDEX IF NOT EXISTS reminders_lead ON reminders (lead_id);
+CREATE INDEX IF NOT EXISTS reminders_seq ON reminders (seq);
+CREATE TABLE IF NOT EXISTS tombstones (
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    PRIMARY KEY (kind, id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS tombstones_seq ON tombstones (kind, seq);
+"""
+
+
+SELECT_BATCH_SIZE = 500  # ids par requête IN (...)
+
+
+def _placeholders(values) -> str:
+    return ",".join("?" * len(values))
+
+
+class SqliteStore:
+    """Connexion SQLite partagée par les dépôts ; interface de persistance du journal.
+
+    mark / flush écrivent les objets épinglés puis valident la transaction en
+    cours ; compact fait un checkpoint du WAL. synchronous=NORMAL (WAL) : une
+    transaction validée survit à un arrêt brutal du processus. busy_timeout :
+    attente maximale (secondes) du verrou d'écriture tenu par un autre processus
+    dans begin_write (bloquant) ; les requêtes elles-mêmes n'attendent qu'un court
+    instant (statement_timeout), try_begin_write rend la main aussitôt.
+    """
+
+    def __init__(self, path: str, synchronous: str = "NORMAL", busy_timeout: float = 30.0,
+                 statement_timeout: float = 0.05):
+        self.path = path
+        self.compacting_path = f"{path}-wal"
+        self.busy_timeout = busy_timeout
+        self.conn = sqlite3.connect(path, timeout=statement_timeout, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(f"PRAGMA synchronous={synchronous}")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        self._repositories: List["SqliteRepository"] = []
+        self._data_version = self._read_data_version()
+        self._generation = self.get_meta("generation", "0")
+        self._write_locked = False
+        self._batch_depth = 0
+
+    def register(self, repository: "SqliteRepository") -> None:
+        self._repositories.append(repository)
+
+    # Métadonnées (horizons, initialisation)
+    def get_meta(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key: str, value) -> None:
+        self.conn.execute("INSERT INTO meta (key, value) VALUES (?, ?) "
+                          "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (key, str(value)))
+
+    @property
+    def initialized(self) -> bool:
+        """La base a déjà servi (même vide) : les sauvegardes fichier ne sont plus reprises"""
+        return self.get_meta("initialized") == "1"
+
+    def mark_initialized(self) -> None:
+        self.set_meta("initialized", 1)
+
+    # Partage entre processus
+    def _read_data_version(self) -> int:
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def bump_generation(self) -> None:
+        """Contenu remplacé d'un bloc (import) : les autres processus videront leurs caches"""
+        self._generation = uuid.uuid4().hex
+        self.set_meta("generation", self._generation)
+
+    def sync(self) -> bool:
+        """Prend en compte les écritures des autres processus ; retourne True s'il y en a eu"""
+        data_version = self._read_data_version()
+        if data_version == self._data_version:
+            return False
+        self._data_version = data_version
+        generation = self.get_meta("generation", "0")
+        replaced, self._generation = generation != self._generation, generation
+        for repository in self._repositories:
+            repository.refresh(replaced)
+        return True
+
+    def try_begin_write(self) -> Optional[bool]:
+        """Prend le verrou d'écriture (BEGIN IMMEDIATE) jusqu'au prochain flush, puis sync() ;
+        None, sans attendre, si un autre processus le tient"""
+        if not self.conn.in_transaction:
+            try:
+                self.conn.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError as e:
+                if "locked" in str(e) or "busy" in str(e):
+                    return None
+                raise
+            self._write_locked = True
+        return self.sync()
+
+    def begin_write(self) -> bool:
+        """try_begin_write bloquant (au plus busy_timeout) : démarrage, hors de la boucle asyncio"""
+        deadline = time.monotonic() + self.busy_timeout
+        while True:
+            changed = self.try_begin_write()
+            if changed is not None:
+                return changed
+            if time.monotonic() >= deadline:
+                raise sqlite3.OperationalError("database is locked")
+            time.sleep(0.01)
+
+    def rollback(self) -> None:
+        """Annule une écriture interrompue (exception avant le flush) et les objets qu'elle a modifiés"""
+        if self.conn.in_transaction:
+            self.conn.rollback()
+        self._write_locked = False
+        for repository in self._repositories:
+            repository.discard_pending()
+
+    # Interface de persistance (journal)
+    def mark(self, kind: str, record_id: str) -> None:
+        if not self._batch_depth:
+            self.flush()
+
+    @contextmanager
+    def batch(self):
+        """Mutations groupées en une seule transaction ; rien n'est validé en cas d'exception
+        (la transaction reste ouverte et sera annulée par rollback)"""
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+        if not self._batch_depth:
+            self.flush()
+
+    def flush(self) -> None:
+        for repository in self._repositories:
+            repository.write_pending()
+            if self._write_locked:
+                # Aucun autre processus n'a écrit depuis begin_write : tout est vu jusqu'ici
+                repository.mark_synced()
+        self.conn.commit()
+        self._write_locked = False
+
+    @property
+    def dirty(self) -> bool:
+        return self.conn.in_transaction or any(r.has_pending() for r in self._repositories)
+
+    def size(self) -> int:
+        """Taille du WAL (octets)"""
+        return os.path.getsize(self.compacting_path) if os.path.exists(self.compacting_path) else 0
+
+    def compact(self) -> None:
+        self.flush()
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def wait_compaction(self) -> None:
+        pass
+
+    def replay(self, kind: str):
+        return iter(())
+
+    def start(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        self.flush()
+        self.conn.close()
+
+    def backup(self, dest_path: str) -> None:
+        """Copie cohérente de la base (API de sauvegarde SQLite, connexion séparée : utilisable dans un thread)"""
+        source = sqlite3.connect(self.path)
+        dest = sqlite3.connect(dest_path)
+        try:
+            source.backup(dest)
+        finally:
+            dest.close()
+            source.close()
+
+
+class SqliteChangeLog:
+    """Numéros de changement et pierres tombales en base (même interface que ChangeSeqIndex).
+
+    Le seq d'un objet est une colonne de sa table, écrite avec la ligne :
+    add / remove / clear n'ont rien à faire.
+    """
+
+    def __init__(self, store: SqliteStore, kind: str, table: str, max_tombstones: int = 100_000):
+        self._store = store
+        self._conn = store.conn
+        self._kind = kind
+        self._table = table
+        self.max_tombstones = max_tombstones
+        self._horizon = int(store.get_meta(f"{kind}_horizon", "0"))
+        self._tombstone_count = self._conn.execute(
+            "SELECT COUNT(*) FROM tombstones WHERE kind = ?", (kind,)).fetchone()[0]
+
+    def reload(self) -> None:
+        """Horizon et nombre de pierres tombales relus (écrits par un autre processus)"""
+        self._horizon = int(self._store.get_meta(f"{self._kind}_horizon", "0"))
+        self._tombstone_count = self._conn.execute(
+            "SELECT COUNT(*) FROM tombstones WHERE kind = ?", (self._kind,)).fetchone()[0]
+
+    @property
+    def horizon(self) -> int:
+        return self._horizon
+
+    @horizon.setter
+    def horizon(self, value: int) -> None:
+        self._horizon = value
+        self._store.set_meta(f"{self._kind}_horizon", value)
+
+    # Interface indexeur
+    def add(self, item_id: str, item) -> None:
+        pass
+
+    def remove(self, item_id: str) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+    # Pierres tombales
+    def tombstone(self, item_id: str, seq: int) -> None:
+        cursor = self._conn.execute("UPDATE tombstones SET seq = ? WHERE kind = ? AND id = ?",
+                                    (seq, self._kind, item_id))
+        if cursor.rowcount:
+            return
+        self._conn.execute("INSERT INTO tombstones (kind, id, seq) VALUES (?, ?, ?)", (self._kind, item_id, seq))
+        self._tombstone_count += 1
+        if self._tombstone_count > self.max_tombstones:
+            # Les plus anciennes sont oubliées : l'horizon avance d'autant
+            oldest_id, oldest_seq = self._conn.execute(
+                "SELECT id, seq FROM tombstones WHERE kind = ? ORDER BY seq LIMIT 1", (self._kind,)).fetchone()
+            self._conn.execute("DELETE FROM tombstones WHERE kind = ? AND id = ?", (self._kind, oldest_id))
+            self._tombstone_count -= 1
+            self.horizon = max(self._horizon, oldest_seq)
+
+    def revive(self, item_id: str) -> None:
+        cursor = self._conn.execute("DELETE FROM tombstones WHERE kind = ? AND id = ?", (self._kind, item_id))
+        self._tombstone_count -= cursor.rowcount
+
+    def restore(self, tombstones: Dict[str, int], horizon: int) -> None:
+        self._conn.execute("DELETE FROM tombstones WHERE kind = ?", (self._kind,))
+        self._conn.executemany("INSERT INTO tombstones (kind, id, seq) VALUES (?, ?, ?)",
+                               [(self._kind, item_id, seq) for item_id, seq in tombstones.items()])
+        self._tombstone_count = len(tombstones)
+        self.horizon = horizon
+
+    @property
+    def tombstones(self) -> Dict[str, int]:
+        rows = self._conn.execute("SELECT id, seq FROM tombstones WHERE kind = ? ORDER BY seq", (self._kind,))
+        return dict(rows.fetchall())
+
+    # Requêtes
+    def changed_since(self, seq: int) -> List[str]:
+        """Ids des objets modifiés après seq, du plus ancien au plus récent changement"""
+        rows = self._conn.execute(f"SELECT id FROM {self._table} WHERE seq > ? ORDER BY seq", (seq,))
+        return [row[0] for row in rows]
+
+    def deleted_since(self, seq: int) -> List[Tuple[str, int]]:
+        rows = self._conn.execute("SELECT id, seq FROM tombstones WHERE kind = ? AND seq > ? ORDER BY seq",
+                                  (self._kind, seq))
+        return rows.fetchall()
+
+    def max_seq(self) -> int:
+        row_max = self._conn.execute(f"SELECT MAX(seq) FROM {self._table}").fetchone()[0]
+        tombstone_max = self._conn.execute(
+            "SELECT MAX(seq) FROM tombstones WHERE kind = ?", (self._kind,)).fetchone()[0]
+        return max(0, self._horizon, row_max or 0, tombstone_max or 0)
+
+
+class SqliteRepository(MutableMapping):
+    """Dictionnaire id -> objet stocké dans une table (données JSON + colonnes indexées).
+
+    load(dict) construit l'objet, dump(objet) le sérialise. Les objets chargés
+    sont gardés dans un cache LRU (cache_size) ; les objets épinglés (modifiés
+    en place) restent en mémoire jusqu'à leur écriture par write_pending().
+    Les indexeurs enregistrés sont alimentés en tâche de fond (index_deferred).
+    """
+
+    TABLE = ""
+    KIND = ""
+
+    def __init__(self, store: SqliteStore, load: Callable[[dict], object], dump: Callable[[object], dict],
+                 cache_size: int = 10000):
+        self._store = store
+        self._conn = store.conn
+        self._load_item = load
+        self._dump = dump
+        self._cache: "OrderedDict[str, object]" = OrderedDict()
+        self._cache_size = cache_size
+        self._pinned: Dict[str, object] = {}
+        self._indexers: List = []
+        self._index_cursor: Optional[int] = None  # rowid jusqu'où les indexeurs sont à jour (None : à jour)
+        self._touched: Set[str] = set()  # ids écrits dans la transaction en cours
+        self.changes = SqliteChangeLog(store, self.KIND, self.TABLE)
+        self._synced_seq = self.changes.max_seq()  # dernier changement pris en compte (cache, indexeurs)
+        store.register(self)
+
+    # Écriture d'une ligne (colonnes propres à chaque table)
+    @abstractmethod
+    def _write(self, item_id: str, item) -> None:
+        ...
+
+    def _delete_rows(self, item_id: str) -> None:
+        self._conn.execute(f"DELETE FROM {self.TABLE} WHERE id = ?", (item_id,))
+
+    def _data(self, item) -> str:
+        return json.dumps(self._dump(item), ensure_ascii=False, default=str)
+
+    # Chargement
+    def _hydrate(self, item_id: str, seq: int, data: str, cache: bool = True):
+        item = self._pinned.get(item_id)
+        if item is None:
+            item = self._cache.get(item_id)
+        if item is not None:
+            return item
+        record = json.loads(data)
+        record["seq"] = seq
+        item = self._load_item(record)
+        if cache:
+            self._cache[item_id] = item
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return item
+
+    def _select(self, where: str = "", params: Iterable = (), order: str = "rowid", cache: bool = True,
+                limit: Optional[int] = None) -> List:
+        """Objets correspondant à la requête : ids et numéros d'abord, puis seules les données
+        des objets absents du cache (ou dont le numéro de changement a changé) sont lues"""
+        params = tuple(params)
+        if limit is not None:
+            where, params = f"{where} ORDER BY {order} LIMIT ?", params + (limit,)
+        else:
+            where = f"{where} ORDER BY {order}"
+        rows = self._conn.execute(f"SELECT id, seq FROM {self.TABLE} {where}", params).fetchall()
+        found, missing = {}, []
+        for item_id, seq in rows:
+            item = self._pinned.get(item_id)
+            if item is None:
+                item = self._cache.get(item_id)
+                if item is not None and item.seq != seq:
+                    item = None
+            if item is None:
+                missing.append(item_id)
+            else:
+                found[item_id] = item
+        for start in range(0, len(missing), SELECT_BATCH_SIZE):
+            batch = missing[start:start + SELECT_BATCH_SIZE]
+            for item_id, seq, data in self._conn.execute(
+                    f"SELECT id, seq, data FROM {self.TABLE} WHERE id IN ({_placeholders(batch)})", batch):
+                self._cache.pop(item_id, None)
+                found[item_id] = self._hydrate(item_id, seq, data, cache)
+        return [found[item_id] for item_id, _ in rows if item_id in found]
+
+    # Interface dictionnaire
+    def __getitem__(self, item_id: str):
+        item = self._pinned.get(item_id)
+        if item is None:
+            item = self._cache.get(item_id)
+        if item is not None:
+            if item_id in self._cache:
+                self._cache.move_to_end(item_id)
+            return item
+        row = self._conn.execute(f"SELECT seq, data FROM {self.TABLE} WHERE id = ?", (item_id,)).fetchone()
+        if row is None:
+            raise KeyError(item_id)
+        return self._hydrate(item_id, row[0], row[1])
+
+    def __setitem__(self, item_id: str, item) -> None:
+        if item_id in self:
+            for indexer in self._indexers:
+                indexer.remove(item_id)
+        self._cache.pop(item_id, None)
+        self._pinned[item_id] = item
+        self._touched.add(item_id)
+        self._write(item_id, item)
+        for indexer in self._indexers:
+            indexer.add(item_id, item)
+
+    def __delitem__(self, item_id: str) -> None:
+        if item_id not in self:
+            raise KeyError(item_id)
+        self._delete_rows(item_id)
+        self._cache.pop(item_id, None)
+        self._pinned.pop(item_id, None)
+        self._touched.add(item_id)
+        for indexer in self._indexers:
+            indexer.remove(item_id)
+
+    def __iter__(self):
+        return iter([row[0] for row in self._conn.execute(f"SELECT id FROM {self.TABLE} ORDER BY rowid")])
+
+    def __len__(self) -> int:
+        return self._conn.execute(f"SELECT COUNT(*) FROM {self.TABLE}").fetchone()[0]
+
+    def __contains__(self, item_id) -> bool:
+        if item_id in self._pinned or item_id in self._cache:
+            return True
+        return self._conn.execute(f"SELECT 1 FROM {self.TABLE} WHERE id = ?", (item_id,)).fetchone() is not None
+
+    def values(self) -> List:
+        """Tous les objets, dans l'ordre d'insertion (une seule requête)"""
+        return self._select()
+
+    def items(self) -> List[Tuple[str, object]]:
+        return [(item.id, item) for item in self._select()]
+
+    def clear(self) -> None:
+        self._conn.execute(f"DELETE FROM {self.TABLE}")
+        self._store.bump_generation()
+        self._cache.clear()
+        self._pinned.clear()
+        self._index_cursor = None
+        for indexer in self._indexers:
+            indexer.clear()
+
+    # Indexeurs
+    def add_indexer(self, indexer) -> None:
+        """Enregistre un indexeur ; il est alimenté avec les objets existants par index_deferred()"""
+        self._indexers.append(indexer)
+        self._index_cursor = 0
+
+    def index_deferred(self, limit: Optional[int] = None) -> int:
+        """Alimente les indexeurs avec au plus limit objets (par rowid croissant) ; retourne 0 une fois à jour"""
+        if self._index_cursor is None:
+            return 0
+        query = f"SELECT rowid, id, seq, data FROM {self.TABLE} WHERE rowid > ? ORDER BY rowid"
+        rows = self._conn.execute(query + (" LIMIT ?" if limit is not None else ""),
+                                  (self._index_cursor, limit) if limit is not None else (self._index_cursor,))
+        count = 0
+        for rowid, item_id, seq, data in rows.fetchall():
+            item = self._hydrate(item_id, seq, data, cache=False)
+            for indexer in self._indexers:
+                indexer.remove(item_id)
+                indexer.add(item_id, item)
+            self._index_cursor = rowid
+            count += 1
+        if limit is None or count < limit:
+            self._index_cursor = None
+            return 0
+        return count
+
+    def reindex(self, item_id: str, fields: Optional[Iterable[str]] = None) -> None:
+        """À appeler après une modification en place : la ligne sera réécrite au prochain flush"""
+        item = self.pin(item_id)
+        for indexer in affected_indexers(self._indexers, fields):
+            indexer.remove(item_id)
+            indexer.add(item_id, item)
+
+    def pin(self, item_id: str):
+        """Objet sur le point d'être modifié : gardé en mémoire et réécrit au prochain flush"""
+        item = self[item_id]
+        self._cache.pop(item_id, None)
+        self._pinned[item_id] = item
+        self._touched.add(item_id)
+        return item
+
+    def has_pending(self) -> bool:
+        return bool(self._pinned)
+
+    def write_pending(self) -> None:
+        """Écrit les objets épinglés (état courant) ; ils retournent ensuite dans le cache"""
+        pinned, self._pinned = self._pinned, {}
+        for item_id, item in pinned.items():
+            self._write(item_id, item)
+            self._cache[item_id] = item
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        self._touched.clear()
+
+    def discard_pending(self) -> None:
+        """Transaction annulée : objets modifiés oubliés, indexeurs remis d'après la base"""
+        touched, self._touched = self._touched, set()
+        self._pinned.clear()
+        for item_id in touched:
+            self._cache.pop(item_id, None)
+        self._reindex_from_rows(touched)
+
+    # Écritures des autres processus
+    def mark_synced(self) -> None:
+        self._synced_seq = self.changes.max_seq()
+
+    def refresh(self, replaced: bool = False) -> None:
+        """Objets modifiés ou supprimés par un autre processus retirés du cache et réindexés"""
+        self.changes.reload()
+        if replaced:
+            self._cache.clear()
+            self._pinned.clear()
+            for indexer in self._indexers:
+                indexer.clear()
+            self._index_cursor = 0 if self._indexers else None
+            self._synced_seq = self.changes.max_seq()
+            return
+        # Les numéros croissent d'un commit à l'autre : un commit postérieur à cette lecture
+        # aura des numéros plus grands et sera vu au prochain sync
+        synced_seq = self.changes.max_seq()
+        changed = set(self.changes.changed_since(self._synced_seq))
+        changed.update(item_id for item_id, _ in self.changes.deleted_since(self._synced_seq))
+        for item_id in changed:
+            self._cache.pop(item_id, None)
+        self._reindex_from_rows(changed)
+        self._synced_seq = synced_seq
+
+    def _reindex_from_rows(self, ids: Set[str]) -> None:
+        if not self._indexers or not ids:
+            return
+        for item_id in ids:
+            row = self._conn.execute(f"SELECT seq, data FROM {self.TABLE} WHERE id = ?", (item_id,)).fetchone()
+            for indexer in self._indexers:
+                indexer.remove(item_id)
+                if row is not None:
+                    indexer.add(item_id, self._hydrate(item_id, row[0], row[1], cache=False))
+
+    def stored_items(self) -> List[Tuple[str, object]]:
+        """(id, objet) de tous les objets, lus sans entrer dans le cache"""
+        return [(item.id, item) for item in self._select(cache=False)]
+
+    def unnumbered_ids(self) -> List[str]:
+        """Ids des objets sans numéro de changement"""
+        return [row[0] for row in self._conn.execute(f"SELECT id FROM {self.TABLE} WHERE seq = 0 ORDER BY rowid")]
+
+    def adopt(self, other) -> None:
+        """Remplace tout le contenu par celui d'un dépôt en mémoire construit à part (import).
+
+        Les lignes sont réécrites dans la transaction en cours (validée au
+        prochain flush) ; les indexeurs reprennent l'état de l'indexeur de même
+        type de other, ou sont reconstruits.
+        """
+        self._conn.execute(f"DELETE FROM {self.TABLE}")
+        self._store.bump_generation()
+        self._cache.clear()
+        self._pinned.clear()
+        items = other.stored_items()
+        self._write_many(items)
+        staged_indexers = {type(indexer): indexer for indexer in other._indexers}
+        for indexer in self._indexers:
+            staged = staged_indexers.get(type(indexer))
+            if staged is indexer:
+                continue
+            if staged is not None:
+                vars(indexer).update(vars(staged))
+            else:
+                indexer.clear()
+                for item_id, item in items:
+                    indexer.add(item_id, item)
+        self._index_cursor = None
+
+    def _write_many(self, items: List[Tuple[str, object]]) -> None:
+        for item_id, item in items:
+            self._write(item_id, item)
+
+
+class SqliteLeadRepository(SqliteRepository):
+    """Leads : colonnes indexées statut / commercial / prestataire, marques dans lead_brands.
+
+    contribution(lead) -> (statut, commissions payées, en attente) : mêmes
+    agrégats que LeadStatsAggregate, tenus à jour dans lead_stats par des triggers
+    (stats.snapshot() lit une ligne par statut).
+    """
+
+    TABLE = "leads"
+    KIND = "leads"
+    FIELD_COLUMNS = {"status": "status", "assigned_to_commercial": "assigned_to_commercial",
+                     "assigned_to_prestataire": "assigned_to_prestataire"}
+
+    def __init__(self, store: SqliteStore, load, dump, contribution, cache_size: int = 10000):
+        self._contribution = contribution
+        super().__init__(store, load, dump, cache_size)
+        self.stats = SqliteLeadStats(self._conn)
+        if store.get_meta("lead_stats") != "1":
+            # Base créée avant la table lead_stats : agrégats calculés une fois, sous le verrou d'écriture
+            store.begin_write()
+            if store.get_meta("lead_stats") != "1":
+                self.stats.rebuild()
+                store.set_meta("lead_stats", 1)
+            store.flush()
+
+    def _write(self, lead_id: str, lead) -> None:
+        _, paid, pending = self._contribution(lead)
+        self._conn.execute(
+            "INSERT INTO leads (id, status, assigned_to_commercial, assigned_to_prestataire, created_at, "
+            "commission_paid, commission_pending, seq, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET status = excluded.status, "
+            "assigned_to_commercial = excluded.assigned_to_commercial, "
+            "assigned_to_prestataire = excluded.assigned_to_prestataire, created_at = excluded.created_at, "
+            "commission_paid = excluded.commission_paid, commission_pending = excluded.commission_pending, "
+            "seq = excluded.seq, data = excluded.data",
+            (lead_id, lead.status, lead.assigned_to_commercial, lead.assigned_to_prestataire, lead.created_at,
+             paid, pending, lead.seq or 0, self._data(lead))
+        )
+        self._conn.execute("DELETE FROM lead_brands WHERE lead_id = ?", (lead_id,))
+        brands = {v.brand.lower() for v in lead.vehicles if v.brand}
+        if brands:
+            self._conn.executemany("INSERT INTO lead_brands (brand, lead_id) VALUES (?, ?)",
+                                   [(brand, lead_id) for brand in brands])
+
+    def _delete_rows(self, lead_id: str) -> None:
+        super()._delete_rows(lead_id)
+        self._conn.execute("DELETE FROM lead_brands WHERE lead_id = ?", (lead_id,))
+
+    def clear(self) -> None:
+        self._conn.execute("DELETE FROM lead_brands")
+        super().clear()
+
+    def adopt(self, other) -> None:
+        self._conn.execute("DELETE FROM lead_brands")
+        super().adopt(other)
+
+    # Requêtes indexées
+    def _field_clause(self, field: str, values: Set[str]) -> Tuple[str, list]:
+        values = list(values)
+        if field == "brand":
+            return f"id IN (SELECT lead_id FROM lead_brands WHERE brand IN ({_placeholders(values)}))", values
+        return f"{self.FIELD_COLUMNS[field]} IN ({_placeholders(values)})", values
+
+    def _filter_clauses(self, statuses: Optional[Set[str]], commercials: Optional[Set[str]],
+                        prestataires: Optional[Set[str]], brands: Optional[Set[str]]) -> Optional[Tuple[list, list]]:
+        """(conditions, paramètres) des filtres fournis ; None si un filtre vide exclut tout"""
+        criteria = [
+            ("status", statuses),
+            ("assigned_to_commercial", commercials),
+            ("assigned_to_prestataire", prestataires),
+            ("brand", {b.lower() for b in brands} if brands is not None else None),
+        ]
+        clauses, params = [], []
+        for field, values in criteria:
+            if values is None:
+                continue
+            if not values:
+                return None
+            clause, clause_params = self._field_clause(field, values)
+            clauses.append(clause)
+            params.extend(clause_params)
+        return clauses, params
+
+    def find(self, statuses: Optional[Set[str]] = None, commercials: Optional[Set[str]] = None,
+             prestataires: Optional[Set[str]] = None, brands: Optional[Set[str]] = None) -> List:
+        """Leads correspondant à tous les filtres fournis (None = pas de filtre), triés par (created_at, id)
+        comme les pages de find_page"""
+        filters = self._filter_clauses(statuses, commercials, prestataires, brands)
+        if filters is None:
+            return []
+        clauses, params = filters
+        return self._select(f"WHERE {' AND '.join(clauses)}" if clauses else "", params,
+                            order="COALESCE(created_at, ''), id")
+
+    def find_page(self, after: Optional[Tuple[str, str]], limit: int, statuses: Optional[Set[str]] = None,
+                  commercials: Optional[Set[str]] = None, prestataires: Optional[Set[str]] = None,
+                  brands: Optional[Set[str]] = None) -> Tuple[List, int]:
+        """(au plus limit leads triés par (created_at, id) après le curseur after, total filtré).
+        Tri et limite en SQL : seuls les leads de la page sont lus."""
+        filters = self._filter_clauses(statuses, commercials, prestataires, brands)
+        if filters is None:
+            return [], 0
+        clauses, params = filters
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        total = self._conn.execute(f"SELECT COUNT(*) FROM leads {where}", params).fetchone()[0]
+        if after is not None:
+            # La première condition permet à SQLite de partir de la position du curseur dans leads_created
+            clauses = clauses + ["COALESCE(created_at, '') >= ?", "(COALESCE(created_at, ''), id) > (?, ?)"]
+            params = params + [after[0], *after]
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._select(where, params, order="COALESCE(created_at, ''), id", limit=limit), total
+
+    def ids_for(self, field: str, values: Iterable[str]) -> Set[str]:
+        """Ids des leads ayant l'une de ces valeurs"""
+        values = set(values)
+        if not values:
+            return set()
+        clause, params = self._field_clause(field, values)
+        return {row[0] for row in self._conn.execute(f"SELECT id FROM leads WHERE {clause}", params)}
+
+    def index_values(self, field: str) -> Set[str]:
+        """Valeurs présentes (ex. tous les statuts utilisés)"""
+        if field == "brand":
+            return {row[0] for row in self._conn.execute("SELECT DISTINCT brand FROM lead_brands")}
+        column = self.FIELD_COLUMNS[field]
+        # Comme SecondaryIndex : statut vide inclus, commercial ou prestataire vide ignoré
+        condition = f"{column} IS NOT NULL" if field == "status" else f"{column} IS NOT NULL AND {column} != ''"
+        rows = self._conn.execute(f"SELECT DISTINCT {column} FROM leads WHERE {condition}")
+        return {row[0] for row in rows}
+
+
+class SqliteLeadStats:
+    """Agrégats du dashboard (même snapshot() que LeadStatsAggregate), lus dans lead_stats"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def rebuild(self) -> None:
+        """Recalcule lead_stats depuis la table leads (dans la transaction en cours)"""
+        self._conn.execute("DELETE FROM lead_stats")
+        self._conn.execute(
+            "INSERT INTO lead_stats (status, count, paid, pending) "
+            "SELECT COALESCE(status, ''), COUNT(*), SUM(commission_paid), SUM(commission_pending) "
+            "FROM leads GROUP BY COALESCE(status, '')")
+
+    def snapshot(self) -> dict:
+        # Une ligne par statut : indépendant du nombre de leads
+        rows = self._conn.execute("SELECT status, count, paid, pending FROM lead_stats WHERE count > 0")
+        status_counts, paid, pending = Counter(), 0, 0
+        for status, count, status_paid, status_pending in rows:
+            status_counts[status] = count
+            paid += status_paid
+            pending += status_pending
+        return {
+            "total_leads": sum(status_counts.values()),
+            "status_stats": dict(status_counts),
+            "paid": paid,
+            "pending": pending,
+        }
+
+
+class SqliteReminderRepository(SqliteRepository):
+    """Rappels : colonnes lead_id et date (timestamp) indexées pour le calendrier"""
+
+    TABLE = "reminders"
+    KIND = "reminders"
+
+    def _write(self, reminder_id: str, reminder) -> None:
+        self._conn.execute(
+            "INSERT INTO reminders (id, lead_id, reminder_date, reminder_ts, completed, seq, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET lead_id = excluded.lead_id, reminder_date = excluded.reminder_date, "
+            "reminder_ts = excluded.reminder_ts, completed = excluded.completed, seq = excluded.seq, "
+            "data = excluded.data",
+            (reminder_id, reminder.lead_id, reminder.reminder_date,
+             parse_reminder_timestamp(reminder.reminder_date), 1 if reminder.completed else 0,
+             reminder.seq or 0, self._data(reminder))
+        )
+
+    def for_lead(self, lead_id: str) -> List:
+        """Rappels d'un lead, dans l'ordre de création"""
+        return self._select("WHERE lead_id = ?", (lead_id,))
+
+    def for_leads(self, lead_ids: List[str]) -> Dict[str, List]:
+        """Rappels de plusieurs leads (une page), une requête par lot d'ids au lieu d'une par lead"""
+        by_lead = {lead_id: [] for lead_id in lead_ids}
+        for start in range(0, len(lead_ids), SELECT_BATCH_SIZE):
+            batch = lead_ids[start:start + SELECT_BATCH_SIZE]
+            for reminder in self._select(f"WHERE lead_id IN ({_placeholders(batch)})", batch):
+                by_lead[reminder.lead_id].append(reminder)
+        return by_lead
+
+    def upcoming(self, start: float, end: float) -> List:
+        """Rappels non complétés dont la date est entre start et end (timestamps), par date croissante"""
+        return self._select("WHERE completed = 0 AND reminder_ts BETWEEN ? AND ?", (start, end),
+                            order="reminder_ts, id")
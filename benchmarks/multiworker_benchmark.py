@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Test de charge multi-workers (CRM LEASINPROFESSIONNEL.FR) : 1 worker vs 4 workers sur une base SQLite partagée
+
+Génère N leads dans une base SQLite temporaire (STORAGE_BACKEND=sqlite), démarre
+le serveur avec WEB_CONCURRENCY=1 puis 4, et mesure le débit (requêtes/s) de
+/api/leads/active et /api/dashboard/stats avec plusieurs processus clients
+(une connexion HTTP persistante chacun) pendant une durée fixe.
+
+Le gain dépend du nombre de cœurs : les workers et les clients se partagent la machine.
+
+Usage : python benchmarks/multiworker_benchmark.py [nombre_de_leads] [secondes_par_mesure] [clients]
+"""
+
+import http.client
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+PORT = 8765
+ENDPOINTS = ["/api/leads/active", "/api/dashboard/stats"]
+WORKER_COUNTS = [1, 4]
+
+
+def generate(backup_dir: str, count: int) -> None:
+    """Remplit la base SQLite de backup_dir (leads à statuts variés, 1 véhicule chacun)"""
+    script = f"""
+import server
+from server import Lead, Company, Contact, Vehicle
+statuses = ["nouveau", "offre", "en_cours", "livree"]
+for i in range({count}):
+    lead = Lead(id=f"L{{i:07d}}", company=Company(name=f"Société {{i}}", siret="12345678900012"),
+                contact=Contact(first_name="Jean", last_name="Dupont", email="jean@societe.fr", phone="0600000000"),
+                vehicles=[Vehicle(brand="Peugeot", model="308", tarif_mensuel="450 €", commission_agence="1 200 €")],
+                status=statuses[i % 4], assigned_to_commercial="Matthews", created_at="2025-01-01T10:00:00", seq=i + 1)
+    server.leads_db[lead.id] = lead
+server.journal.flush()
+"""
+    env = dict(os.environ, BACKUP_DIR=backup_dir, STORAGE_BACKEND="sqlite")
+    subprocess.run([sys.executable, "-c", script], cwd=BACKEND_DIR, env=env, check=True, capture_output=True)
+
+
+def wait_ready(timeout: float = 120) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", PORT, timeout=5)
+            conn.request("GET", "/api/config")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.5)
+    raise RuntimeError("serveur non démarré")
+
+
+def client(path: str, duration: float, results) -> None:
+    """Enchaîne les requêtes sur une connexion persistante ; compte les réponses 200"""
+    conn = http.client.HTTPConnection("127.0.0.1", PORT, timeout=60)
+    done = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        conn.request("GET", path)
+        response = conn.getresponse()
+        response.read()
+        if response.status == 200:
+            done += 1
+    results.put(done)
+
+
+def measure(path: str, duration: float, clients: int) -> float:
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=client, args=(path, duration, results)) for _ in range(clients)]
+    for process in processes:
+        process.start()
+    total = sum(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    return total / duration
+
+
+def run_server(backup_dir: str, workers: int, duration: float, clients: int) -> dict:
+    env = dict(os.environ, BACKUP_DIR=backup_dir, STORAGE_BACKEND="sqlite",
+               WEB_CONCURRENCY=str(workers), PORT=str(PORT))
+    server = subprocess.Popen([sys.executable, "server.py"], cwd=BACKEND_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready()
+        rates = {}
+        for path in ENDPOINTS:
+            measure(path, min(duration, 2), clients)  # préchauffage (caches de chaque worker)
+            rates[path] = measure(path, duration, clients)
+        return rates
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    clients = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    root = tempfile.mkdtemp(prefix="crm_multiworker_bench_")
+    try:
+        print(f"🏗️ Génération de {count} leads (SQLite)...")
+        generate(root, count)
+        print(f"🖥️ {os.cpu_count()} CPU, {clients} clients, {duration:.0f}s par mesure")
+        if (os.cpu_count() or 1) < WORKER_COUNTS[-1]:
+            print(f"⚠️ Moins de CPU que de workers ({WORKER_COUNTS[-1]}) : aucun gain de débit à attendre sur cette machine")
+        results = {workers: run_server(root, workers, duration, clients) for workers in WORKER_COUNTS}
+        for path in ENDPOINTS:
+            base = results[WORKER_COUNTS[0]][path]
+            line = ", ".join(f"{workers} worker(s) {results[workers][path]:.1f} req/s" for workers in WORKER_COUNTS)
+            print(f"⏱️ {path} : {line} (x{results[WORKER_COUNTS[-1]][path] / max(base, 1e-6):.2f})")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark du rendu des fiches lead PDF (CRM LEASINPROFESSIONNEL.FR)
+
+Compare, pour des leads de 1, 5 et 20 véhicules :
+- avant : styles et TableStyle reconstruits à chaque rendu (nouveau gabarit par fiche)
+- après : gabarit partagé construit une seule fois (LEAD_SHEET)
+
+Usage : python benchmarks/pdf_benchmark.py [iterations]
+"""
+
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+
+from lead_pdf import render_lead_pdf  # noqa: E402
+from lead_sheet_template import LEAD_SHEET, LeadSheetTemplate  # noqa: E402
+
+
+def sample_lead(vehicle_count: int) -> dict:
+    return {
+        "id": "bench-lead",
+        "created_at": "2025-01-15T10:00:00",
+        "status": "en_cours",
+        "company": {"name": "Transports Durand SARL", "siret": "12345678900012",
+                    "email": "contact@durand.fr", "phone": "01 23 45 67 89"},
+        "contact": {"first_name": "Marie", "last_name": "Durand",
+                    "email": "marie@durand.fr", "phone": "06 12 34 56 78"},
+        "vehicles": [
+            {"brand": "Peugeot", "model": "308", "carburant": "diesel",
+             "tarif_mensuel": "450 €", "commission_agence": "1 200 €", "payment_status": "en_attente"}
+            for _ in range(vehicle_count)
+        ],
+        "note": "Renouvellement de flotte prévu en fin d'année.",
+    }
+
+
+def time_renders(lead: dict, iterations: int, shared: bool) -> float:
+    """Durée moyenne d'un rendu en millisecondes"""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        template = LEAD_SHEET if shared else LeadSheetTemplate()
+        render_lead_pdf(lead, io.BytesIO(), template)
+    return (time.perf_counter() - started) * 1000 / iterations
+
+
+def best_of(lead: dict, iterations: int, repeats: int = 5) -> tuple:
+    """Meilleure moyenne avant / après sur plusieurs passes alternées (réduit le bruit)"""
+    before, after = [], []
+    for _ in range(repeats):
+        before.append(time_renders(lead, iterations, shared=False))
+        after.append(time_renders(lead, iterations, shared=True))
+    return min(before), min(after)
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    print(f"📄 Rendu PDF - {iterations} itérations par cas")
+    started = time.perf_counter()
+    for _ in range(iterations):
+        LeadSheetTemplate()
+    build_ms = (time.perf_counter() - started) * 1000 / iterations
+    print(f"🎨 Construction du gabarit (styles + TableStyle) : {build_ms:.3f} ms")
+    print(f"{'véhicules':>10} {'avant (ms)':>12} {'après (ms)':>12} {'gain':>8}")
+    for vehicle_count in (1, 5, 20):
+        lead = sample_lead(vehicle_count)
+        time_renders(lead, 3, shared=True)  # échauffement (polices, caches ReportLab)
+        before, after = best_of(lead, iterations)
+        print(f"{vehicle_count:>10} {before:>12.2f} {after:>12.2f} {(before - after) / before:>8.1%}")
+
+
+if __name__ == "__main__":
+    main()
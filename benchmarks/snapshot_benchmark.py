@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark du démarrage à froid (CRM LEASINPROFESSIONNEL.FR) : instantané JSON vs binaire vs chargement paresseux
+
+Génère N leads (1 véhicule, 1 rappel sur 10) dans deux répertoires de sauvegarde
+temporaires, l'un au format JSON et l'autre au format binaire, puis mesure dans
+un processus neuf le temps d'import du serveur (chargement des données inclus),
+y compris avec LEAD_LOAD_MODE=lazy (résumés seulement, leads chargés à la demande).
+
+Usage : python benchmarks/snapshot_benchmark.py [nombre_de_leads]
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+
+COLD_START = (
+    "import time; started = time.perf_counter(); import server; "
+    "print(f'{time.perf_counter() - started:.3f} {len(server.leads_db)} {len(server.reminders_db)}')"
+)
+
+
+def cold_start(backup_dir: str, snapshot_format: str, load_mode: str = "eager") -> tuple:
+    """(secondes, leads, rappels) pour un import du serveur dans un processus neuf"""
+    env = dict(os.environ, BACKUP_DIR=backup_dir, SNAPSHOT_FORMAT=snapshot_format, LEAD_LOAD_MODE=load_mode)
+    output = subprocess.run([sys.executable, "-c", COLD_START], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    seconds, leads, reminders = output.strip().splitlines()[-1].split()
+    return float(seconds), int(leads), int(reminders)
+
+
+def generate(backup_dir: str, count: int) -> None:
+    """Remplit un serveur vide puis écrit ses instantanés (JSON et binaire) dans backup_dir"""
+    script = f"""
+import server
+from server import Lead, Company, Contact, Vehicle, Reminder
+for i in range({count}):
+    lead = Lead(id=f"L{{i:07d}}", company=Company(name=f"Société {{i}}", siret="12345678900012", email="contact@societe.fr"),
+                contact=Contact(first_name="Jean", last_name="Dupont", email="jean@societe.fr", phone="0600000000"),
+                vehicles=[Vehicle(brand="Peugeot", model="308", tarif_mensuel="450 €", commission_agence="1 200 €")],
+                status="livree" if i % 3 else "offre", note="Client fidèle", created_at="2025-01-01T10:00:00", seq=i + 1)
+    server.leads_db[lead.id] = lead
+    if i % 10 == 0:
+        server.reminders_db[f"R{{i}}"] = Reminder(id=f"R{{i}}", lead_id=lead.id, title="Relance",
+                                                 reminder_date="2030-01-01T10:00:00", seq=i + 1)
+server.change_clock.observe({count})
+leads, reminders = list(server.leads_db.items()), list(server.reminders_db.items())
+server.save_leads_to_file(leads)
+server.save_reminders_to_file(reminders)
+server.save_binary_snapshot(leads, reminders)
+"""
+    env = dict(os.environ, BACKUP_DIR=backup_dir, SNAPSHOT_FORMAT="json")
+    subprocess.run([sys.executable, "-c", script], cwd=BACKEND_DIR, env=env, check=True, capture_output=True)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    root = tempfile.mkdtemp(prefix="crm_snapshot_bench_")
+    try:
+        empty_dir = os.path.join(root, "empty")
+        json_dir = os.path.join(root, "json")
+        binary_dir = os.path.join(root, "binary")
+        print(f"🏗️ Génération de {count} leads...")
+        started = time.perf_counter()
+        generate(json_dir, count)
+        print(f"   ({time.perf_counter() - started:.1f}s)")
+
+        # Même jeu de données : le répertoire binaire ne garde que snapshot.bin
+        shutil.copytree(json_dir, binary_dir)
+        for name in ("leads_backup.json", "reminders_backup.json"):
+            os.remove(os.path.join(binary_dir, name))
+        os.remove(os.path.join(json_dir, "snapshot.bin"))
+
+        json_size = sum(os.path.getsize(os.path.join(json_dir, n)) for n in ("leads_backup.json", "reminders_backup.json"))
+        binary_size = os.path.getsize(os.path.join(binary_dir, "snapshot.bin"))
+
+        baseline, _, _ = cold_start(empty_dir, "json")
+        json_time, json_leads, _ = cold_start(json_dir, "json")
+        binary_time, binary_leads, _ = cold_start(binary_dir, "binary")
+        lazy_time, lazy_leads, _ = cold_start(binary_dir, "binary", "lazy")
+
+        print(f"📦 Taille : JSON {json_size / 1e6:.1f} Mo, binaire {binary_size / 1e6:.1f} Mo")
+        print(f"⏱️ Import à vide (modules seuls) : {baseline:.2f}s")
+        print(f"⏱️ Démarrage JSON    : {json_time:.2f}s ({json_leads} leads)")
+        print(f"⏱️ Démarrage binaire : {binary_time:.2f}s ({binary_leads} leads)")
+        print(f"⏱️ Démarrage paresseux : {lazy_time:.2f}s ({lazy_leads} leads)")
+        print(f"🚀 Chargement des données : {json_time - baseline:.2f}s -> {binary_time - baseline:.2f}s "
+              f"(x{(json_time - baseline) / max(binary_time - baseline, 1e-6):.1f}) -> "
+              f"{lazy_time - baseline:.2f}s en paresseux")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,50 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef, useCallback, useContext, createContext } from 'react';
 import axios from 'axios';
 import './App.css';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// 📡 Flux des changements (SSE) : une seule connexion par onglet, ouverte par App et partagée
+// par contexte. Elle part du curseur de la première liste chargée (en-tête X-Change-Cursor) ;
+// EventSource se reconnecte seul et reprend au dernier événement reçu (Last-Event-ID).
+const CHANGE_EVENTS = ['lead', 'reminder', 'reset'];
+const ChangeEventsContext = createContext(() => () => {});
+
+const changeCursor = (response) => Number(response.headers['x-change-cursor'] ?? 0);
+
+const useChangeEventSource = (since) => {
+  const listeners = useRef(new Set());
+  const subscribe = useCallback((listener) => {
+    listeners.current.add(listener);
+    return () => listeners.current.delete(listener);
+  }, []);
+  useEffect(() => {
+    if (since === null) return undefined;
+    const source = new EventSource(`${API}/events?since=${since}`);
+    CHANGE_EVENTS.forEach((event) => {
+      source.addEventListener(event, (message) => {
+        const data = JSON.parse(message.data);
+        listeners.current.forEach((listener) => listener(event, data));
+      });
+    });
+    return () => source.close();
+  }, [since]);
+  return subscribe;
+};
+
+// handlers : { lead, reminder, reset } -> fonction(données)
+const useChangeListener = (subscribe, handlers) => {
+  const handlersRef = useRef(handlers);
+  handlersRef.current = handlers;
+  useEffect(() => subscribe((event, data) => {
+    const handler = handlersRef.current[event];
+    if (handler) handler(data);
+  }), [subscribe]);
+};
+
+const useChangeEvents = (handlers) => useChangeListener(useContext(ChangeEventsContext), handlers);
+
 // Components
 const Navbar = ({ activeTab, setActiveTab }) => {
   const [mobileMenuOpen, setMobileMenuOpen] = useState(false);
@@ -1111,7 +1151,10 @@ const LeadsView = ({ leads, config, onRefresh }) => {
   const handleSave = async (leadData) => {
     try {
       if (editingLead) {
-        await axios.put(`${API}/leads/${editingLead.id}`, leadData);
+        // Refusé (409) si le lead a été modifié depuis l'ouverture du formulaire
+        await axios.put(`${API}/leads/${editingLead.id}`, leadData, {
+          headers: { 'If-Match': `"${editingLead.version ?? 0}"` }
+        });
       } else {
         await axios.post(`${API}/leads`, leadData);
       }
@@ -1120,7 +1163,12 @@ const LeadsView = ({ leads, config, onRefresh }) => {
       onRefresh();
     } catch (error) {
       console.error('Error saving lead:', error);
-      alert('Erreur lors de la sauvegarde');
+      if (error.response && error.response.status === 409) {
+        alert('Ce lead a été modifié entre-temps : rechargez-le avant d\'enregistrer');
+        onRefresh();
+      } else {
+        alert('Erreur lors de la sauvegarde');
+      }
     }
   };
 
@@ -1138,7 +1186,9 @@ const LeadsView = ({ leads, config, onRefresh }) => {
 
   const handleStatusChange = async (leadId, newStatus) => {
     try {
-      await axios.put(`${API}/leads/${leadId}`, { status: newStatus });
+      await axios.patch(`${API}/leads/${leadId}`, { status: newStatus }, {
+        headers: { 'Content-Type': 'application/merge-patch+json' }
+      });
       onRefresh();
     } catch (error) {
       console.error('Error updating status:', error);
@@ -1215,10 +1265,9 @@ const LeadsView = ({ leads, config, onRefresh }) => {
       
       case 'commission_total':
         const getTotalCommission = (lead) => {
+          // Montants normalisés en centimes par le backend
           return lead.vehicles?.reduce((total, vehicle) => {
-            const commission = vehicle.commission_agence || '';
-            const numbers = commission.match(/\d+/);
-            return total + (numbers ? parseInt(numbers[0]) : 0);
+            return total + (vehicle.commission_agence_cents || 0);
           }, 0) || 0;
         };
         return getTotalCommission(b) - getTotalCommission(a); // Plus élevé en premier
@@ -1328,13 +1377,29 @@ const LeadsView = ({ leads, config, onRefresh }) => {
   );
 };
 
+const CALENDAR_DAYS = 30;
+
+// Liste des rappels à venir mise à jour d'après un changement (sans recharger la liste)
+const applyReminderChange = (reminders, change) => {
+  const others = reminders.filter((reminder) => reminder.id !== change.id);
+  if (change.op === 'delete' || change.data.completed) return others;
+  const time = new Date(change.data.reminder_date).getTime();
+  const now = Date.now();
+  if (!(time >= now && time <= now + CALENDAR_DAYS * 86400000)) return others;
+  return [...others, change.data].sort(
+    (a, b) => new Date(a.reminder_date).getTime() - new Date(b.reminder_date).getTime()
+  );
+};
+
 const Calendar = ({ leads }) => {
   const [upcomingReminders, setUpcomingReminders] = useState([]);
   const [loading, setLoading] = useState(false);
+  const cursor = useRef(0); // changements déjà inclus dans la liste chargée
 
   const fetchReminders = async () => {
     try {
-      const response = await axios.get(`${API}/calendar/reminders?days=30`);
+      const response = await axios.get(`${API}/calendar/reminders?days=${CALENDAR_DAYS}`);
+      cursor.current = changeCursor(response);
       setUpcomingReminders(response.data);
     } catch (error) {
       console.error('Error fetching reminders:', error);
@@ -1346,7 +1411,7 @@ const Calendar = ({ leads }) => {
       try {
         setLoading(true);
         await axios.delete(`${API}/reminders/${reminderId}`);
-        fetchReminders(); // Recharger la liste
+        setUpcomingReminders((current) => applyReminderChange(current, { op: 'delete', id: reminderId }));
         alert('Rappel supprimé avec succès !');
       } catch (error) {
         console.error('Error deleting reminder:', error);
@@ -1359,8 +1424,8 @@ const Calendar = ({ leads }) => {
 
   const handleToggleCompleted = async (reminderId) => {
     try {
-      await axios.put(`${API}/reminders/${reminderId}/complete`);
-      fetchReminders(); // Recharger la liste
+      const response = await axios.put(`${API}/reminders/${reminderId}/complete`);
+      setUpcomingReminders((current) => applyReminderChange(current, { op: 'upsert', id: reminderId, data: response.data.reminder }));
     } catch (error) {
       console.error('Error updating reminder:', error);
       alert('Erreur lors de la mise à jour du rappel');
@@ -1371,6 +1436,16 @@ const Calendar = ({ leads }) => {
     fetchReminders();
   }, []);
 
+  // Rappels modifiés ailleurs (autre onglet, autre utilisateur)
+  useChangeEvents({
+    reminder: (change) => {
+      if (change.seq > cursor.current) {
+        setUpcomingReminders((current) => applyReminderChange(current, change));
+      }
+    },
+    reset: fetchReminders
+  });
+
   return (
     <div className="p-6">
       <h2 className="text-3xl font-bold text-gray-900 mb-6">Calendrier & Tâches</h2>
@@ -1506,35 +1581,22 @@ const Backup = () => {
     }
   };
 
-  const handleExport = async () => {
-    try {
-      setLoading(true);
-      setMessage('');
-      const response = await axios.get(`${API}/backup/export`);
-      
-      // Télécharger le fichier JSON
-      const dataStr = JSON.stringify(response.data.data, null, 2);
-      const dataBlob = new Blob([dataStr], { type: 'application/json' });
-      const url = URL.createObjectURL(dataBlob);
-      const link = document.createElement('a');
-      link.href = url;
-      
-      const now = new Date();
-      const timestamp = now.toISOString().slice(0, 19).replace(/:/g, '-');
-      link.download = `CRM_BACKUP_${timestamp}.json`;
-      
-      document.body.appendChild(link);
-      link.click();
-      document.body.removeChild(link);
-      URL.revokeObjectURL(url);
-      
-      setMessage(`✅ ${response.data.message}`);
-      fetchBackupStatus();
-    } catch (error) {
-      setMessage(`❌ Erreur export: ${error.response?.data?.detail || error.message}`);
-    } finally {
-      setLoading(false);
-    }
+  const handleExport = () => {
+    // Export en flux (NDJSON) : le navigateur l'écrit directement sur disque
+    setMessage('');
+    const link = document.createElement('a');
+    link.href = `${API}/backup/export?format=ndjson`;
+    
+    const now = new Date();
+    const timestamp = now.toISOString().slice(0, 19).replace(/:/g, '-');
+    link.download = `CRM_BACKUP_${timestamp}.ndjson`;
+    
+    document.body.appendChild(link);
+    link.click();
+    document.body.removeChild(link);
+    
+    setMessage('✅ Export lancé - téléchargement en cours');
+    fetchBackupStatus();
   };
 
   const handleImport = async (event) => {
@@ -1545,11 +1607,11 @@ const Backup = () => {
       setLoading(true);
       setMessage('');
       
-      const text = await file.text();
-      const backupData = JSON.parse(text);
-      
       if (window.confirm('⚠️ ATTENTION: Cette opération va remplacer TOUTES vos données actuelles. Êtes-vous sûr ?')) {
-        const response = await axios.post(`${API}/backup/import`, backupData);
+        // Le fichier est envoyé tel quel : le serveur le lit et le valide par lots
+        const formData = new FormData();
+        formData.append('file', file);
+        const response = await axios.post(`${API}/backup/import`, formData);
         setMessage(`✅ ${response.data.message}`);
         fetchBackupStatus();
         
@@ -1559,7 +1621,9 @@ const Backup = () => {
         }, 2000);
       }
     } catch (error) {
-      setMessage(`❌ Erreur import: ${error.response?.data?.detail || error.message}`);
+      const detail = error.response?.data?.detail;
+      const firstErrors = (detail?.errors || []).slice(0, 5).map((e) => `${e.record} : ${e.error}`).join('\n');
+      setMessage(`❌ Erreur import: ${detail?.message || detail || error.message}${firstErrors ? `\n${firstErrors}` : ''}`);
     } finally {
       setLoading(false);
       event.target.value = ''; // Reset file input
@@ -1598,20 +1662,20 @@ const Backup = () => {
             </div>
             <div className="flex justify-between items-center p-3 bg-yellow-50 rounded-lg">
               <span className="font-medium">Sauvegarde leads:</span>
-              <span className={backupStatus.leads_backup_exists ? 'text-green-600' : 'text-red-600'}>
-                {backupStatus.leads_backup_exists ? '✅ Existe' : '❌ Absent'}
+              <span className={(backupStatus.leads_backup_exists || backupStatus.binary_snapshot_exists || backupStatus.storage_backend === 'sqlite') ? 'text-green-600' : 'text-red-600'}>
+                {(backupStatus.leads_backup_exists || backupStatus.binary_snapshot_exists || backupStatus.storage_backend === 'sqlite') ? '✅ Existe' : '❌ Absent'}
               </span>
             </div>
             <div className="flex justify-between items-center p-3 bg-purple-50 rounded-lg">
               <span className="font-medium">Sauvegarde rappels:</span>
-              <span className={backupStatus.reminders_backup_exists ? 'text-green-600' : 'text-red-600'}>
-                {backupStatus.reminders_backup_exists ? '✅ Existe' : '❌ Absent'}
+              <span className={(backupStatus.reminders_backup_exists || backupStatus.binary_snapshot_exists || backupStatus.storage_backend === 'sqlite') ? 'text-green-600' : 'text-red-600'}>
+                {(backupStatus.reminders_backup_exists || backupStatus.binary_snapshot_exists || backupStatus.storage_backend === 'sqlite') ? '✅ Existe' : '❌ Absent'}
               </span>
             </div>
-            {backupStatus.leads_backup_modified && (
+            {(backupStatus.leads_backup_modified || backupStatus.binary_snapshot_modified) && (
               <div className="p-3 bg-gray-50 rounded-lg text-sm">
                 <span className="font-medium">Dernière sauvegarde:</span><br/>
-                {new Date(backupStatus.leads_backup_modified).toLocaleString('fr-FR')}
+                {new Date(backupStatus.leads_backup_modified || backupStatus.binary_snapshot_modified).toLocaleString('fr-FR')}
               </div>
             )}
           </div>
@@ -1632,7 +1696,7 @@ const Backup = () => {
             <div className="relative">
               <input
                 type="file"
-                accept=".json"
+                accept=".json,.ndjson"
                 onChange={handleImport}
                 disabled={loading}
                 className="hidden"
@@ -1721,10 +1785,9 @@ const Clients = ({ config }) => {
         return endDateA - endDateB;
       case 'commission_total':
         const getTotalCommission = (client) => {
+          // Montants normalisés en centimes par le backend
           return client.vehicles?.reduce((total, vehicle) => {
-            const commission = vehicle.commission_agence || '';
-            const numbers = commission.match(/\d+/);
-            return total + (numbers ? parseInt(numbers[0]) : 0);
+            return total + (vehicle.commission_agence_cents || 0);
           }, 0) || 0;
         };
         return getTotalCommission(b) - getTotalCommission(a);
@@ -1907,6 +1970,9 @@ function App() {
   const [stats, setStats] = useState({});
   const [config, setConfig] = useState({});
   const [loading, setLoading] = useState(true);
+  const [streamStart, setStreamStart] = useState(null);
+  const leadsCursor = useRef(0);
+  const subscribe = useChangeEventSource(streamStart);
 
   const fetchData = async () => {
     try {
@@ -1917,6 +1983,8 @@ function App() {
         axios.get(`${API}/config`)
       ]);
       
+      leadsCursor.current = changeCursor(leadsRes);
+      setStreamStart((current) => current ?? leadsCursor.current); // flux ouvert une seule fois
       setLeads(leadsRes.data);
       setStats(statsRes.data);
       setConfig(configRes.data);
@@ -1931,6 +1999,37 @@ function App() {
     fetchData();
   }, []);
 
+  // 📡 Leads actifs mis à jour depuis le flux des changements ; statistiques rechargées une fois par rafale
+  const statsTimer = useRef(null);
+  const refreshStatsSoon = () => {
+    if (statsTimer.current) return;
+    statsTimer.current = setTimeout(async () => {
+      statsTimer.current = null;
+      try {
+        const response = await axios.get(`${API}/dashboard/stats`);
+        setStats(response.data);
+      } catch (error) {
+        console.error('Error fetching stats:', error);
+      }
+    }, 500);
+  };
+
+  useChangeListener(subscribe, {
+    lead: (change) => {
+      if (change.seq <= leadsCursor.current) return; // déjà dans la liste chargée
+      setLeads((current) => {
+        const others = current.filter((lead) => lead.id !== change.id);
+        if (change.op === 'delete' || change.data.status === 'livree') return others;
+        const existing = current.find((lead) => lead.id === change.id);
+        // Les rappels ne font pas partie de l'événement : ceux déjà chargés sont conservés
+        const updated = { ...change.data, reminders: existing ? existing.reminders : [] };
+        return existing ? current.map((lead) => (lead.id === change.id ? updated : lead)) : [...current, updated];
+      });
+      refreshStatsSoon();
+    },
+    reset: fetchData
+  });
+
   if (loading) {
     return (
       <div className="min-h-screen bg-gray-100 flex items-center justify-center">
@@ -1943,6 +2042,7 @@ function App() {
   }
 
   return (
+    <ChangeEventsContext.Provider value={subscribe}>
     <div className="min-h-screen bg-gray-100">
       <Navbar activeTab={activeTab} setActiveTab={setActiveTab} />
       
@@ -1964,6 +2064,7 @@ function App() {
         )}
       </main>
     </div>
+    </ChangeEventsContext.Provider>
   );
 }
 
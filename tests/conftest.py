@@ -0,0 +1,72 @@
+"""Outils de test : chaque scénario démarre le serveur dans un processus neuf.
+
+server.py charge ses données à l'import (BACKUP_DIR, STORAGE_BACKEND...) : un
+processus par scénario garantit un état vierge et permet de tester les
+redémarrages. Le script reçoit `server` et `client` (TestClient) et écrit son
+résultat avec emit(valeur) ; run retourne la liste des valeurs émises.
+Les modules sans état global (snapshot, pdf_cache, sqlite_store...) sont
+importables directement.
+"""
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+PRELUDE = """
+import json, sys
+import server
+from fastapi.testclient import TestClient
+client = TestClient(server.app)
+def emit(value):
+    print("@@RESULT " + json.dumps(value, default=str), flush=True)
+"""
+
+EPILOGUE = """
+server.journal.flush()
+server.journal.wait_compaction()
+"""
+
+
+class ServerRunner:
+    def __init__(self, backup_dir: str, storage_backend: str = "memory"):
+        self.backup_dir = backup_dir
+        self.storage_backend = storage_backend
+
+    def run(self, code: str, check: bool = True, **env) -> list:
+        script = PRELUDE + textwrap.dedent(code) + EPILOGUE
+        process_env = dict(os.environ, BACKUP_DIR=self.backup_dir, STORAGE_BACKEND=self.storage_backend,
+                           PDF_CACHE_DIR=os.path.join(self.backup_dir, "pdf_cache"),
+                           PDF_EXPORT_DIR=os.path.join(self.backup_dir, "pdf_exports"),
+                           **{key: str(value) for key, value in env.items()})
+        result = subprocess.run([sys.executable, "-c", script], cwd=BACKEND_DIR, env=process_env,
+                                capture_output=True, text=True, timeout=120)
+        self.output = result.stdout + result.stderr
+        if check and result.returncode != 0:
+            raise AssertionError(f"Processus serveur en échec ({result.returncode}) :\n{self.output[-3000:]}")
+        self.returncode = result.returncode
+        return [json.loads(line[len("@@RESULT "):]) for line in result.stdout.splitlines()
+                if line.startswith("@@RESULT ")]
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def server_runner(tmp_path, request):
+    """Serveur sur un répertoire de sauvegarde vierge, pour chaque moteur de stockage"""
+    return ServerRunner(str(tmp_path), request.param)
+
+
+@pytest.fixture
+def memory_runner(tmp_path):
+    return ServerRunner(str(tmp_path), "memory")
+
+
+LEAD = {
+    "company": {"name": "Acme"},
+    "contact": {"first_name": "Jean", "last_name": "Dupont", "email": "jean@acme.fr"},
+    "vehicles": [{"brand": "Peugeot", "model": "308", "commission_agence": "1 000 €"}],
+}
@@ -0,0 +1,28 @@
+"""Montants saisis librement : séparateurs français et anglais, devise, signe"""
+import pytest
+
+from amounts import parse_amount
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1 200,50 €", (120050, "EUR")),
+    ("1\u202f200,50\u00a0€", (120050, "EUR")),  # espaces insécables
+    ("1.200,5", (120050, "EUR")),
+    ("1,200.50 $", (120050, "USD")),
+    ("450€", (45000, "EUR")),
+    ("450.90", (45090, "EUR")),
+    ("12,5", (1250, "EUR")),
+    ("1.200", (120000, "EUR")),
+    ("1 200 CHF", (120000, "CHF")),
+    ("-150 €", (-15000, "EUR")),
+    ("- 1 200,50 €", (-120050, "EUR")),
+    ("−1.200,5", (-120050, "EUR")),
+    ("450-500 €", (45000, "EUR")),
+])
+def test_parse_amount(text, expected):
+    assert parse_amount(text) == expected
+
+
+@pytest.mark.parametrize("text", [None, "", "à définir", "-"])
+def test_no_amount(text):
+    assert parse_amount(text) == (None, None)
@@ -0,0 +1,79 @@
+"""Import NDJSON : un fichier tronqué ne doit rien remplacer"""
+from .conftest import LEAD
+
+EXPORT_AND_IMPORT = f"""
+for i in range(5):
+    client.post("/api/leads", json={{**{LEAD!r}, "company": {{"name": f"Société {{i}}"}}}})
+lines = client.get("/api/backup/export", params={{"format": "ndjson"}}).content.splitlines(keepends=True)
+emit(len(lines))
+
+def upload(content):
+    response = client.post("/api/backup/import", content=content, headers={{"Content-Type": "application/x-ndjson"}})
+    return [response.status_code, len(server.leads_db)]
+
+# Fin absente, compteurs faux, ligne après la fin : refusé avant tout échange
+emit(upload(b"".join(lines[:3])))
+emit(upload(b"".join(lines[:3] + lines[-1:])))
+emit(upload(b"".join(lines + lines[-1:])))
+# Fichier complet
+emit(upload(b"".join(lines)))
+"""
+
+
+def test_truncated_ndjson_import_is_rejected(server_runner):
+    line_count, missing_end, wrong_counts, trailing, complete = server_runner.run(EXPORT_AND_IMPORT)
+    assert line_count == 7  # en-tête, 5 leads, fin
+    assert missing_end == [400, 5]
+    assert wrong_counts == [400, 5]
+    assert trailing == [400, 5]
+    assert complete == [200, 5]
+
+
+SOURCE_FULL = f"""
+ids = [client.post("/api/leads", json={{**{LEAD!r}, "company": {{"name": f"Société {{i}}"}}}}).json()["lead"]["id"]
+       for i in range(4)]
+reminder = client.post("/api/reminders", json={{"lead_id": ids[0], "title": "R", "reminder_date": "2030-01-01T10:00:00"}})
+export = client.get("/api/backup/export", params={{"format": "ndjson"}})
+emit([ids, reminder.json()["reminder"]["id"], json.loads(export.content.splitlines()[0])["cursor"],
+      export.content.decode()])
+"""
+
+SOURCE_DELTA = """
+client.put(f"/api/leads/{ids[1]}", json={"status": "offre"})
+client.delete(f"/api/leads/{ids[2]}")
+client.delete(f"/api/reminders/{reminder_id}")
+client.post("/api/leads", json={**LEAD, "company": {"name": "Nouvelle"}})
+export = client.get("/api/backup/export", params={"format": "ndjson", "since": cursor})
+emit(export.content.decode())
+emit(state())
+"""
+
+STATE = """
+def state():
+    return [sorted((lead["id"], lead["status"], lead["company"]["name"]) for lead in client.get("/api/leads").json()),
+            sorted(client.get("/api/reminders").json(), key=lambda r: r["id"])]
+"""
+
+IMPORT = """
+response = client.post("/api/backup/import", content=CONTENT.encode(), headers={"Content-Type": "application/x-ndjson"})
+emit(response.status_code)
+emit(state())
+"""
+
+
+def test_delta_round_trip_applies_updates_and_tombstones(tmp_path):
+    from .conftest import ServerRunner
+
+    for backend in ("memory", "sqlite"):
+        source = ServerRunner(str(tmp_path / backend / "source"), backend)
+        target = ServerRunner(str(tmp_path / backend / "target"), backend)
+        ((ids, reminder_id, cursor, full),) = source.run(SOURCE_FULL)
+        assert target.run(STATE + f"CONTENT = {full!r}" + IMPORT)[0] == 200
+
+        delta, expected = source.run(
+            STATE + f"LEAD = {LEAD!r}\nids, reminder_id, cursor = {ids!r}, {reminder_id!r}, {cursor!r}" + SOURCE_DELTA)
+        kinds = [line.split('"type": "')[1].split('"')[0] for line in delta.splitlines()]
+        assert kinds.count("lead") == 2 and kinds.count("delete") == 2 and kinds.count("reminder") == 0
+        status, imported = target.run(STATE + f"CONTENT = {delta!r}" + IMPORT)
+        assert status == 200
+        assert imported == expected and len(imported[0]) == 4 and imported[1] == []
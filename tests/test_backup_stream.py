@@ -0,0 +1,53 @@
+"""Sauvegarde en flux : export NDJSON (gzip) relu par l'import incrémental"""
+import asyncio
+import gzip
+import io
+
+import backup_stream
+from backup_stream import accepts_gzip, backup_section, gzip_stream, iter_backup_ndjson, iter_backup_records
+
+LEADS = {f"L{i}": {"id": f"L{i}", "company": {"name": f"Société {i} é€"}, "note": "x" * 200} for i in range(300)}
+REMINDERS = {"R1": {"id": "R1", "lead_id": "L1", "title": "Rappel"}}
+
+
+async def collect(chunks) -> list:
+    return [chunk async for chunk in chunks]
+
+
+def export(sections, deletions=(), compress=False) -> list:
+    chunks = iter_backup_ndjson({"export_date": "2024-01-01"}, sections, deletions)
+    return asyncio.run(collect(gzip_stream(chunks) if compress else chunks))
+
+
+def sections(leads=LEADS):
+    return [backup_section("lead", leads, dict), backup_section("reminder", REMINDERS, dict)]
+
+
+def test_gzip_ndjson_round_trip(monkeypatch):
+    monkeypatch.setattr(backup_stream, "CHUNK_SIZE", 4096)
+    plain = export(sections())
+    assert len(plain) > 10  # envoyé par blocs, pas en un seul document
+
+    compressed = b"".join(export(sections(), compress=True))
+    assert gzip.decompress(compressed) == b"".join(plain)
+
+    records = list(iter_backup_records(io.BytesIO(gzip.decompress(compressed))))
+    assert records[0][0] == "meta" and records[0][2]["version"] == backup_stream.NDJSON_FORMAT_VERSION
+    assert {data["id"]: data for kind, _, data in records if kind == "lead"} == LEADS
+    assert [data for kind, _, data in records if kind == "reminder"] == list(REMINDERS.values())
+
+
+def test_records_deleted_during_export_are_omitted_and_counted():
+    leads = dict(LEADS)
+    section = backup_section("lead", leads, dict)
+    del leads["L5"]  # supprimé après le figement des ids
+    records = list(iter_backup_records(io.BytesIO(b"".join(export([section])))))
+    assert len([record for record in records if record[0] == "lead"]) == len(LEADS) - 1
+
+
+def test_accepts_gzip():
+    assert accepts_gzip("gzip, deflate, br")
+    assert accepts_gzip("br;q=1.0, *;q=0.5")
+    assert not accepts_gzip("gzip;q=0")
+    assert not accepts_gzip("identity")
+    assert not accepts_gzip(None)
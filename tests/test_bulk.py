@@ -0,0 +1,70 @@
+"""POST /api/leads/bulk : tout ou rien"""
+from .conftest import LEAD
+
+STATE = """
+def state():
+    leads = sorted((lead["id"], lead["status"], lead["version"]) for lead in client.get("/api/leads").json())
+    return [leads, client.get("/api/dashboard/stats").json()["status_stats"],
+            client.get("/api/dashboard/stats/verify").json()["consistent"]]
+"""
+
+SCENARIO = STATE + f"""
+ids = [client.post("/api/leads", json={LEAD!r}).json()["lead"]["id"] for _ in range(2)]
+before = state()
+
+def bulk(*operations):
+    response = client.post("/api/leads/bulk", json={{"operations": list(operations)}})
+    results = response.json()["detail"]["results"] if response.status_code >= 400 else response.json()["results"]
+    return [response.status_code, [result["status"] for result in results]]
+
+create = {{"op": "create", "data": {LEAD!r}}}
+# Une opération invalide (id inconnu, patch invalide, doublon) : rien n'est appliqué
+emit(bulk(create, {{"op": "patch", "id": ids[0], "data": {{"status": "offre"}}}}, {{"op": "delete", "id": "inconnu"}}))
+emit(bulk({{"op": "delete", "id": ids[1]}}, {{"op": "patch", "id": ids[0], "data": {{"vehicles": "pas une liste"}}}}))
+emit(bulk({{"op": "patch", "id": ids[0], "data": {{"status": "offre"}}}}, {{"op": "delete", "id": ids[0]}}))
+# Seulement des versions périmées : 409
+emit(bulk({{"op": "patch", "id": ids[0], "version": 7, "data": {{"status": "offre"}}}}, create))
+emit(state() == before)
+
+# Lot valide : tout est appliqué
+emit(bulk(create, {{"op": "patch", "id": ids[0], "version": 1, "data": {{"status": "offre"}}}},
+          {{"op": "delete", "id": ids[1]}}))
+emit(state())
+"""
+
+
+def test_bulk_is_all_or_nothing(server_runner):
+    unknown, invalid, duplicate, stale, unchanged, applied, after = server_runner.run(SCENARIO)
+    assert unknown == [422, [424, 424, 404]]
+    assert invalid == [422, [424, 422]]
+    assert duplicate == [422, [424, 422]]
+    assert stale == [409, [409, 424]]
+    assert unchanged is True
+    assert applied == [200, [201, 200, 200]]
+    leads, status_stats, consistent = after
+    assert len(leads) == 2 and status_stats == {"a_contacter": 1, "offre": 1} and consistent
+    assert server_runner.run(STATE + "emit(state())") == [after]  # persisté
+
+
+ROLLBACK = STATE + f"""
+lead_id = client.post("/api/leads", json={LEAD!r}).json()["lead"]["id"]
+before = state()
+
+def fail(*args, **kwargs):
+    raise RuntimeError("panne pendant l'application du lot")
+server.apply_lead_changes = fail
+failing = TestClient(server.app, raise_server_exceptions=False)
+response = failing.post("/api/leads/bulk", json={{"operations": [
+    {{"op": "create", "data": {LEAD!r}}}, {{"op": "patch", "id": lead_id, "data": {{"status": "offre"}}}}]}})
+emit(response.status_code)
+emit(before)
+"""
+
+
+def test_sqlite_bulk_failure_rolls_back_the_whole_batch(tmp_path):
+    from .conftest import ServerRunner
+
+    runner = ServerRunner(str(tmp_path), "sqlite")
+    status, before = runner.run(ROLLBACK)
+    assert status == 500
+    assert runner.run(STATE + "emit(state())") == [before]
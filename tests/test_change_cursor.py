@@ -0,0 +1,18 @@
+"""Curseur de changements des listes : le flux /api/events?since= reprend sans trou"""
+from .conftest import LEAD
+
+SCENARIO = f"""
+first = client.post("/api/leads", json={LEAD!r}).json()["lead"]
+for path in ["/api/leads/active", "/api/clients", "/api/reminders", "/api/calendar/reminders", "/api/dashboard/stats"]:
+    emit([path, client.get(path).headers.get("x-change-cursor")])
+
+cursor = int(client.get("/api/leads/active").headers["x-change-cursor"])
+second = client.post("/api/leads", json={LEAD!r}).json()["lead"]
+emit([[kind, data["id"]] for seq, kind, data in server.change_events(cursor, 100)] == [["lead", second["id"]]])
+"""
+
+
+def test_list_responses_carry_change_cursor(server_runner):
+    *headers, since = server_runner.run(SCENARIO)
+    assert all(cursor is not None and int(cursor) >= 1 for _, cursor in headers), headers
+    assert since is True
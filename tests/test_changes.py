@@ -0,0 +1,50 @@
+"""Numéros de changement et pierres tombales (deltas)"""
+from types import SimpleNamespace
+
+from changes import ChangeClock, ChangeSeqIndex
+
+
+def stamp(index, clock, item_id):
+    index.remove(item_id)
+    index.add(item_id, SimpleNamespace(seq=clock.next()))
+
+
+def test_changed_and_deleted_since():
+    clock, index = ChangeClock(), ChangeSeqIndex()
+    for item_id in "abc":
+        stamp(index, clock, item_id)
+    cursor = clock.value
+    stamp(index, clock, "a")  # modifié après le curseur
+    index.remove("b")
+    index.tombstone("b", clock.next())
+    stamp(index, clock, "d")
+
+    assert index.changed_since(cursor) == ["a", "d"]
+    assert index.deleted_since(cursor) == [("b", 5)]
+    assert index.changed_since(0) == ["c", "a", "d"]
+    assert index.max_seq() == 6
+
+    # Recréé après sa suppression : plus de pierre tombale
+    index.revive("b")
+    stamp(index, clock, "b")
+    assert index.deleted_since(cursor) == []
+    assert index.changed_since(cursor) == ["a", "d", "b"]
+
+
+def test_forgotten_tombstones_move_the_horizon():
+    clock, index = ChangeClock(), ChangeSeqIndex(max_tombstones=2)
+    for item_id in "abc":
+        stamp(index, clock, item_id)
+    for item_id in "abc":
+        index.remove(item_id)
+        index.tombstone(item_id, clock.next())
+    # La plus ancienne suppression (seq 4) est oubliée : un delta depuis un curseur < 4 est impossible
+    assert index.horizon == 4
+    assert index.deleted_since(index.horizon) == [("b", 5), ("c", 6)]
+
+
+def test_unsorted_load_is_sorted_on_first_query():
+    index = ChangeSeqIndex()
+    for item_id, seq in (("x", 9), ("y", 2), ("z", 5)):
+        index.add(item_id, SimpleNamespace(seq=seq))
+    assert index.changed_since(3) == ["z", "x"]
@@ -0,0 +1,69 @@
+"""Journal : une écriture en échec ne perd aucune mutation"""
+import asyncio
+import os
+
+import pytest
+
+from journal import PersistenceJournal
+
+
+def make_journal(tmp_path, state, **kwargs):
+    return PersistenceJournal(str(tmp_path / "journal.log"), 10 ** 9, lambda: (lambda: None),
+                              lambda kind, record_id: state.get(record_id), **kwargs)
+
+
+def fail_next_write(journal):
+    """La prochaine écriture s'arrête après quelques octets (disque plein en cours de ligne)"""
+    open_journal = journal._open
+
+    class TornFile:
+        def __init__(self, f):
+            self.f = f
+
+        def write(self, data):
+            self.f.write(data[:10])
+            self.f.flush()
+            raise OSError(28, "No space left on device")
+
+        def close(self):
+            self.f.close()
+
+    def torn_open():
+        journal._open = open_journal
+        return TornFile(open_journal())
+    journal._open = torn_open
+
+
+def test_failed_flush_keeps_mutations(tmp_path):
+    state = {"a": {"v": 1}}
+    journal = make_journal(tmp_path, state)
+    fail_next_write(journal)
+    journal.mark("lead", "a")
+    with pytest.raises(OSError):
+        journal.flush()
+    assert journal.dirty
+
+    state["b"] = {"v": 2}
+    journal.mark("lead", "b")
+    assert journal.flush() == 2
+    journal.close()
+    records = list(journal.replay())
+    assert [(r["id"], r["d"]) for r in records] == [("a", {"v": 1}), ("b", {"v": 2})]
+
+
+def test_background_flush_retries_after_error(tmp_path):
+    state = {"a": {"v": 1}}
+    journal = make_journal(tmp_path, state, flush_interval=0.01)
+
+    async def scenario():
+        journal.start()
+        fail_next_write(journal)
+        journal.mark("lead", "a")
+        for _ in range(200):
+            await asyncio.sleep(0.01)
+            if not journal.dirty and os.path.exists(journal.path) and list(journal.replay()):
+                break
+        await journal.shutdown()
+
+    asyncio.run(scenario())
+    assert [r["id"] for r in journal.replay()] == ["a"]
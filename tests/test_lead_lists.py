@@ -0,0 +1,93 @@
+"""Listes de leads : rappels rattachés par page, pagination"""
+from .conftest import LEAD
+
+REMINDERS = f"""
+ids = [client.post("/api/leads", json={LEAD!r}).json()["lead"]["id"] for _ in range(4)]
+for i, lead_id in enumerate(ids[:3]):
+    for n in range(i + 1):
+        client.post("/api/reminders", json={{"lead_id": lead_id, "title": f"R{{n}}", "reminder_date": "2030-01-01T10:00:00"}})
+
+queries = []
+if server.sqlite_store is not None:
+    server.sqlite_store.conn.set_trace_callback(lambda sql: queries.append(sql) if "FROM reminders" in sql else None)
+leads = client.get("/api/leads").json()
+projected = client.get("/api/leads", params={{"fields": "reminders.title"}}).json()
+if server.sqlite_store is not None:
+    server.sqlite_store.conn.set_trace_callback(None)
+emit([[len(lead["reminders"]) for lead in leads], [len(lead["reminders"]) for lead in projected]])
+emit(len(queries))
+"""
+
+
+def test_reminders_loaded_once_per_page(server_runner):
+    counts, queries = server_runner.run(REMINDERS)
+    assert counts == [[1, 2, 3, 0], [1, 2, 3, 0]]
+    if server_runner.storage_backend == "sqlite":
+        assert queries <= 4  # ids puis données, pour chacune des deux listes
+
+PAGES = f"""
+for i in range(25):
+    client.post("/api/leads", json={{**{LEAD!r}, "status": "offre" if i % 3 else "relance"}})
+
+def walk(path, **params):
+    ids, cursor, totals = [], None, set()
+    while True:
+        response = client.get(path, params={{**params, "limit": 4, **({{"cursor": cursor}} if cursor else {{}})}})
+        page = response.json()
+        ids += [lead["id"] for lead in page["items"]]
+        totals.add(page["total"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids, sorted(totals)
+
+def expected(**params):
+    leads = client.get("/api/leads", params=params).json()
+    return [lead["id"] for lead in sorted(leads, key=lambda lead: (lead["created_at"], lead["id"]))]
+
+emit([walk("/api/leads"), expected()])
+emit([walk("/api/leads", status="relance"), expected(status="relance")])
+"""
+
+
+def test_cursor_pagination(server_runner):
+    for (ids, totals), expected in server_runner.run(PAGES):
+        assert ids == expected and totals == [len(expected)]
+
+
+ORDER_AND_EMPTY_STATUS = f"""
+# Insérés dans le désordre des dates de création ; un statut vide
+for lead_id, created_at, status in (("c", "2024-03-01", "offre"), ("a", "2024-01-01", ""),
+                                    ("b", "2024-02-01", "livree"), ("d", "2023-12-01", "offre")):
+    server.leads_db[lead_id] = server.Lead.model_validate({{**{LEAD!r}, "id": lead_id, "created_at": created_at,
+                                                          "status": status}})
+    server.journal_lead(lead_id)
+
+def ids(path, **params):
+    response = client.get(path, params=params).json()
+    return [lead["id"] for lead in (response["items"] if "limit" in params else response)]
+
+emit([ids("/api/leads"), ids("/api/leads", limit=10), ids("/api/leads", status="offre")])
+emit([ids("/api/leads/active"), ids("/api/leads/active", limit=10)])
+"""
+
+
+def test_lists_share_one_order_and_keep_empty_status(server_runner):
+    listed, active = server_runner.run(ORDER_AND_EMPTY_STATUS)
+    assert listed == [["d", "a", "b", "c"], ["d", "a", "b", "c"], ["d", "c"]]
+    assert active == [["d", "a", "c"], ["d", "a", "c"]]
+
+
+LAZY_PAGE = f"""
+page = client.get("/api/leads", params={{"limit": 5}}).json()
+emit([len(page["items"]), page["total"], server.leads_db.lazy_stats()["cached"]])
+"""
+
+
+def test_pagination_loads_only_the_page(memory_runner):
+    memory_runner.run(f"""
+for i in range(30):
+    client.post("/api/leads", json={LEAD!r})
+server.journal.flush()
+server.journal.compact(wait=True)
+""", SNAPSHOT_FORMAT="binary")
+    assert memory_runner.run(LAZY_PAGE, SNAPSHOT_FORMAT="binary", LEAD_LOAD_MODE="lazy") == [[5, 30, 6]]  # la page et le lead suivant
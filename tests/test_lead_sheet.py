@@ -0,0 +1,63 @@
+"""Gabarit des fiches PDF : habillage, logo et numérotation des pages"""
+import io
+
+from pypdf import PdfReader
+
+from lead_pdf import build_lead_story, merge_pdf_parts, render_lead_pdf, render_leads_pdf_part
+from lead_sheet_template import LEAD_SHEET, LeadSheetTemplate
+
+LEAD = {
+    "id": "abc123", "created_at": "2024-05-01T10:00:00", "status": "a_contacter", "note": None,
+    "company": {"name": "Société Test", "siret": None, "email": None, "phone": None},
+    "contact": {"first_name": "Jean", "last_name": "Dupont", "email": "jean@test.fr", "phone": None},
+    "vehicles": [{"brand": "Peugeot", "model": "308", "carburant": "diesel", "tarif_mensuel": "350 €",
+                  "commission_agence": "1 200 €", "payment_status": "paye"}],
+}
+
+
+def render(lead, template=LEAD_SHEET) -> PdfReader:
+    buffer = io.BytesIO()
+    render_lead_pdf(lead, buffer, template)
+    return PdfReader(io.BytesIO(buffer.getvalue()))
+
+
+def images(page) -> list:
+    return list(page["/Resources"].get("/XObject", {}).keys())
+
+
+def test_sheet_has_furniture_logo_and_content():
+    reader = render(LEAD)
+    assert reader.metadata.title == LeadSheetTemplate.TITLE
+    (page,) = reader.pages
+    text = page.extract_text()
+    for expected in (LeadSheetTemplate.FOOTER, "Page 1", "Société Test", "Peugeot 308", "Payé", "A Contacter"):
+        assert expected in text
+    assert len(images(page)) == 1
+
+
+def test_styles_are_shared_between_renders():
+    first = build_lead_story(LEAD)
+    second = build_lead_story({**LEAD, "id": "other"})
+    assert first[0].style is second[0].style is LEAD_SHEET.title
+
+
+def test_long_sheet_numbers_every_page_and_missing_logo_is_skipped(tmp_path):
+    long_lead = {**LEAD, "note": "Rappeler le client. " * 600}
+    reader = render(long_lead, LeadSheetTemplate(logo_path=str(tmp_path / "absent.png")))
+    assert len(reader.pages) > 1
+    for number, page in enumerate(reader.pages, start=1):
+        assert f"Page {number}" in page.extract_text()
+        assert images(page) == []
+
+
+def test_merged_parts_are_numbered_continuously(tmp_path):
+    paths = [str(tmp_path / f"part{i}.pdf") for i in range(2)]
+    render_leads_pdf_part([{**LEAD, "id": "a"}, {**LEAD, "id": "b"}], paths[0])
+    render_leads_pdf_part([{**LEAD, "id": "c"}], paths[1])
+    assert "Page" not in PdfReader(paths[0]).pages[0].extract_text()
+
+    output = str(tmp_path / "merged.pdf")
+    merge_pdf_parts(paths, output)
+    pages = [page.extract_text() for page in PdfReader(output).pages]
+    assert [f"Lead ID: {lead_id}" in text for lead_id, text in zip("abc", pages)] == [True] * 3
+    assert [f"Page {number}" in text for number, text in enumerate(pages, start=1)] == [True] * 3
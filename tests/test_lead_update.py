@@ -0,0 +1,87 @@
+"""PUT /api/leads/{id} : mise à jour tout ou rien, versions et If-Match"""
+from .conftest import LEAD
+
+SCENARIO = f"""
+lead = client.post("/api/leads", json={LEAD!r}).json()["lead"]
+lead_id = lead["id"]
+
+def state():
+    current = client.get(f"/api/leads/{{lead_id}}").json()
+    clients = [l["id"] for l in client.get("/api/clients").json()]
+    active = [l["id"] for l in client.get("/api/leads/active").json()]
+    verify = client.get("/api/dashboard/stats/verify").json()["consistent"]
+    return [current["status"], current["version"], lead_id in clients, lead_id in active, verify]
+
+# Statut valide + véhicules invalides : 422, rien n'est appliqué
+response = client.put(f"/api/leads/{{lead_id}}", json={{"status": "livree", "vehicles": [{{"brand": "Peugeot"}}]}})
+emit([response.status_code, *state()])
+
+# Mise à jour valide
+response = client.put(f"/api/leads/{{lead_id}}", json={{"status": "livree", "version": 1}})
+emit([response.status_code, response.headers["etag"], *state()])
+
+# Version périmée : 409
+response = client.put(f"/api/leads/{{lead_id}}", json={{"status": "offre"}}, headers={{"If-Match": '"1"'}})
+emit([response.status_code, *state()])
+"""
+
+
+def test_put_is_all_or_nothing(server_runner):
+    invalid, valid, conflict = server_runner.run(SCENARIO)
+    assert invalid == [422, "a_contacter", 1, False, True, True]
+    assert valid == [200, '"2"', "livree", 2, True, False, True]
+    assert conflict == [409, "livree", 2, True, False, True]
+
+
+STALE_IF_MATCH = f"""
+lead_id = client.post("/api/leads", json={LEAD!r}).json()["lead"]["id"]
+reminder_id = client.post("/api/reminders", json={{"lead_id": lead_id, "title": "R",
+                                                   "reminder_date": "2030-01-01T10:00:00"}}).json()["reminder"]["id"]
+lead_etag = client.get(f"/api/leads/{{lead_id}}").headers["etag"]
+
+# Un autre utilisateur modifie le lead et le rappel
+client.patch(f"/api/leads/{{lead_id}}", json={{"note": "modifié ailleurs"}})
+client.put(f"/api/reminders/{{reminder_id}}", json={{"title": "R2"}})
+
+stale = {{"If-Match": lead_etag}}
+results = [
+    client.patch(f"/api/leads/{{lead_id}}", json={{"status": "offre"}}, headers=stale),
+    client.put(f"/api/leads/{{lead_id}}", json={{"status": "offre"}}, headers=stale),
+    client.delete(f"/api/leads/{{lead_id}}", headers=stale),
+    client.put(f"/api/reminders/{{reminder_id}}", json={{"title": "R3"}}, headers={{"If-Match": '"1"'}}),
+    client.put(f"/api/reminders/{{reminder_id}}/complete", headers={{"If-Match": '"1"'}}),
+    client.delete(f"/api/reminders/{{reminder_id}}", headers={{"If-Match": '"1"'}}),
+]
+emit([[response.status_code, response.headers.get("etag")] for response in results])
+lead = client.get(f"/api/leads/{{lead_id}}").json()
+reminder = client.get(f"/api/reminders/{{reminder_id}}").json()
+emit([lead["status"], lead["version"], reminder["title"], reminder["completed"]])
+
+# ETag faible, liste de candidats, joker : acceptés
+emit([client.patch(f"/api/leads/{{lead_id}}", json={{"status": "offre"}}, headers={{"If-Match": 'W/"2"'}}).status_code,
+      client.patch(f"/api/leads/{{lead_id}}", json={{"status": "relance"}}, headers={{"If-Match": '"1", "3"'}}).status_code,
+      client.delete(f"/api/reminders/{{reminder_id}}", headers={{"If-Match": "*"}}).status_code])
+"""
+
+
+def test_stale_if_match_is_rejected_with_409(server_runner):
+    conflicts, unchanged, accepted = server_runner.run(STALE_IF_MATCH)
+    assert conflicts == [[409, '"2"']] * 6  # ETag courant renvoyé avec le conflit
+    assert unchanged == ["a_contacter", 2, "R2", False]
+    assert accepted == [200, 200, 200]
+
+
+VERSIONS = f"""
+lead_id = client.post("/api/leads", json={LEAD!r}).json()["lead"]["id"]
+client.patch(f"/api/leads/{{lead_id}}", json={{"status": "offre"}})
+emit(lead_id)
+"""
+
+
+def test_versions_survive_a_restart(server_runner):
+    (lead_id,) = server_runner.run(VERSIONS)
+    reload = f'emit(client.get("/api/leads/{lead_id}").headers["etag"])'
+    assert server_runner.run(reload) == ['"2"']  # journal rejoué
+    if server_runner.storage_backend == "memory":
+        server_runner.run("server.journal.compact(wait=True)")
+    assert server_runner.run(reload) == ['"2"']  # instantané
@@ -0,0 +1,59 @@
+"""Ressources partagées entre workers : exports PDF, fichiers temporaires du cache, verrou SQLite"""
+import os
+import subprocess
+import sys
+import time
+
+from pdf_cache import PdfCache, is_stale_temp
+from pdf_export import PdfExportJob, PdfExportRegistry
+from sqlite_store import SqliteStore
+
+
+def dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_export_job_visible_from_another_worker(tmp_path):
+    job = PdfExportJob("0123abcd", 3, "zip", str(tmp_path))
+    job.status, job.done = "running", 2
+    job.save()
+
+    other_worker = PdfExportRegistry(str(tmp_path), ttl=3600)
+    seen = other_worker.get("0123abcd")
+    assert seen is not None and seen.to_dict()["done"] == 2 and seen.status == "running"
+    assert other_worker.get("../../etc") is None
+
+    # Worker arrêté en cours d'export : le job est signalé en erreur puis expire normalement
+    job.owner = dead_pid()
+    job.save()
+    assert other_worker.get("0123abcd").status == "error"
+    other_worker.ttl = -1
+    other_worker.cleanup()
+    assert other_worker.get("0123abcd") is None
+
+
+def test_cache_keeps_temp_files_of_live_workers(tmp_path):
+    live = tmp_path / f"key.{os.getpid()}.aaaa.tmp"
+    dead = tmp_path / f"key.{dead_pid()}.bbbb.tmp"
+    old = tmp_path / f"key.{os.getpid()}.cccc.tmp"
+    for path in (live, dead, old):
+        path.write_bytes(b"%PDF")
+    os.utime(old, (time.time() - 7200, time.time() - 7200))
+    assert not is_stale_temp(str(live), time.time())
+
+    PdfCache(str(tmp_path), 10, 10 ** 6)  # démarrage d'un autre worker
+    assert live.exists() and not dead.exists() and not old.exists()
+
+
+def test_write_lock_is_not_waited_for(tmp_path):
+    path = str(tmp_path / "crm.sqlite3")
+    holder, waiter = SqliteStore(path), SqliteStore(path, busy_timeout=0.2)
+    assert holder.try_begin_write() is not None
+    started = time.monotonic()
+    assert waiter.try_begin_write() is None
+    assert time.monotonic() - started < 0.5
+    holder.flush()
+    assert waiter.try_begin_write() is not None
+    waiter.flush()
@@ -0,0 +1,120 @@
+"""Fiches PDF en mode "memory" : en mémoire sous le seuil, sur disque au-delà, jamais de fichier laissé"""
+import os
+
+from .conftest import LEAD
+
+SCENARIO = f"""
+lead_id = client.post("/api/leads", json={LEAD!r}).json()["lead"]["id"]
+response = client.get(f"/api/leads/{{lead_id}}/pdf")
+emit([response.status_code, response.content[:5].decode(), int(response.headers["content-length"]) == len(response.content)])
+"""
+
+
+def test_memory_mode_pdf(memory_runner):
+    for threshold in (1024 * 1024, 1):  # en mémoire, puis écrit sur disque
+        (result,) = memory_runner.run(SCENARIO, PDF_RENDER_MODE="memory", PDF_SPOOL_MAX_MEMORY=threshold)
+        assert result == [200, "%PDF-", True]
+        assert os.listdir(os.path.join(memory_runner.backup_dir, "pdf_cache")) == []
+
+
+CACHED = f"""
+lead_id = client.post("/api/leads", json={LEAD!r}).json()["lead"]["id"]
+first = client.get(f"/api/leads/{{lead_id}}/pdf")
+second = client.get(f"/api/leads/{{lead_id}}/pdf")
+revalidated = client.get(f"/api/leads/{{lead_id}}/pdf", headers={{"If-None-Match": first.headers["etag"]}})
+emit([first.status_code, second.status_code, first.content == second.content, revalidated.status_code])
+"""
+
+
+def test_cache_mode_pdf(memory_runner):
+    assert memory_runner.run(CACHED) == [[200, 200, True, 304]]
+    assert len(os.listdir(os.path.join(memory_runner.backup_dir, "pdf_cache"))) == 1
+
+
+def test_evicted_cache_entry_stays_readable(tmp_path):
+    from pdf_cache import PdfCache
+
+    cache = PdfCache(str(tmp_path), max_entries=1, max_bytes=10 ** 6)
+    rendered = tmp_path / "a.tmp"
+    rendered.write_bytes(b"%PDF-a")
+    cache.add("a", str(rendered)).close()
+    served = cache.open("a")
+    rendered = tmp_path / "b.tmp"
+    rendered.write_bytes(b"%PDF-b")
+    fresh = cache.add("b", str(rendered))  # évince "a" pendant son envoi
+    rendered = tmp_path / "c.tmp"
+    rendered.write_bytes(b"%PDF-c")
+    cache.add("c", str(rendered)).close()  # évince "b" avant son envoi
+    assert cache.open("a") is None and cache.open("b") is None
+    assert served.read() == b"%PDF-a" and fresh.read() == b"%PDF-b"
+    served.close()
+    fresh.close()
+
+
+WORKER_MODULES = """
+loaded = server.get_pdf_process_pool().submit(eval, "sorted({'server', 'lead_pdf'} & set(__import__('sys').modules))")
+emit(loaded.result(timeout=60))
+"""
+
+
+def test_render_workers_do_not_import_the_server(memory_runner):
+    # Processus issus du forkserver : module de rendu préchargé, serveur jamais importé
+    assert memory_runner.run(WORKER_MODULES) == [["lead_pdf"]]
+
+
+EXPORT_AFTER_WORKER_DEATH = f"""
+import os, time
+client.post("/api/leads", json={LEAD!r})
+broken = server.get_pdf_process_pool()
+try:
+    broken.submit(os._exit, 1).result(timeout=60)
+except Exception as e:
+    emit(type(e).__name__)
+
+def export(live, fmt):
+    job = live.post("/api/pdf/exports", json={{"status": "a_contacter", "format": fmt}}).json()
+    for _ in range(300):
+        state = live.get(f"/api/pdf/exports/{{job['job_id']}}").json()
+        if state["status"] not in ("pending", "running"):
+            return state["status"]
+        time.sleep(0.1)
+
+with TestClient(server.app) as live:  # boucle persistante : l'export tourne en tâche de fond
+    emit([server.get_pdf_process_pool() is not broken, export(live, "zip"), export(live, "pdf")])
+"""
+
+
+def test_export_pool_recovers_from_a_dead_worker(memory_runner):
+    assert memory_runner.run(EXPORT_AFTER_WORKER_DEATH) == ["BrokenProcessPool", [True, "done", "done"]]
+
+
+MERGED_EXPORT = f"""
+import time
+for i in range(5):
+    client.post("/api/leads", json={{**{LEAD!r}, "company": {{"name": f"Société {{i}}"}}}})
+
+with TestClient(server.app) as live:
+    job = live.post("/api/pdf/exports", json={{"status": "a_contacter", "format": "pdf"}}).json()
+    for _ in range(300):
+        state = live.get(f"/api/pdf/exports/{{job['job_id']}}").json()
+        if state["status"] not in ("pending", "running"):
+            break
+        time.sleep(0.1)
+    path = __import__("os").path.join(server.PDF_EXPORT_DIR, "merged.pdf")
+    with open(path, "wb") as f:
+        f.write(live.get(f"/api/pdf/exports/{{job['job_id']}}/download").content)
+    emit([state["status"], state["done"], path, sorted(__import__("os").listdir(server.PDF_EXPORT_DIR))])
+"""
+
+
+def test_merged_export_renders_parts_and_numbers_pages(memory_runner):
+    from pypdf import PdfReader
+
+    ((status, done, path, files),) = memory_runner.run(MERGED_EXPORT, PDF_EXPORT_CHUNK_SIZE=2)
+    assert [status, done] == ["done", 5]
+    assert not [name for name in files if ".tmp" in name]  # morceaux supprimés après l'assemblage
+    pages = [page.extract_text() for page in PdfReader(path).pages]
+    assert len(pages) == 5
+    for number, text in enumerate(pages, start=1):
+        assert f"Société {number - 1}" in text
+        assert f"Page {number}" in text
@@ -0,0 +1,62 @@
+"""Rappels : index temporel du calendrier et rappels d'un lead"""
+from datetime import datetime
+from types import SimpleNamespace
+
+from repository import ReminderRepository
+
+
+def make_reminder(reminder_id, lead_id="L1", date="2030-01-01T10:00:00", completed=False):
+    return SimpleNamespace(id=reminder_id, lead_id=lead_id, reminder_date=date, completed=completed, seq=0)
+
+
+def ts(value):
+    return datetime.fromisoformat(value).timestamp()
+
+
+def make_repository():
+    reminders = ReminderRepository()
+    for reminder in (make_reminder("late", date="2030-01-20T09:00:00"),
+                     make_reminder("first", date="2030-01-01T08:00:00"),
+                     make_reminder("edge", lead_id="L2", date="2030-01-10T00:00:00"),
+                     make_reminder("done", date="2030-01-05T10:00:00", completed=True),
+                     make_reminder("invalid", lead_id="L2", date="pas une date"),
+                     make_reminder("utc", lead_id="L3", date="2030-01-03T12:00:00Z")):
+        reminders[reminder.id] = reminder
+    return reminders
+
+
+def test_calendar_range_is_sorted_inclusive_and_skips_completed():
+    reminders = make_repository()
+    upcoming = reminders.upcoming(ts("2030-01-01T00:00:00"), ts("2030-01-10T00:00:00"))
+    assert [reminder.id for reminder in upcoming] == ["first", "utc", "edge"]
+    assert reminders.upcoming(ts("2030-01-10T00:00:01"), ts("2030-01-19T00:00:00")) == []
+    assert reminders.time_index.invalid == {"invalid"}
+
+
+def test_calendar_follows_updates_and_deletions():
+    reminders = make_repository()
+    start, end = ts("2030-01-01T00:00:00"), ts("2030-01-31T00:00:00")
+
+    reminders["first"].completed = True
+    reminders.reindex("first", ["completed"])
+    reminders["done"].completed = False
+    reminders.reindex("done", ["completed"])
+    reminders["late"].reminder_date = "2030-01-02T00:00:00"
+    reminders.reindex("late", ["reminder_date"])
+    del reminders["edge"]
+
+    assert [reminder.id for reminder in reminders.upcoming(start, end)] == ["late", "utc", "done"]
+
+
+def test_reminders_of_a_lead():
+    reminders = make_repository()
+    assert [reminder.id for reminder in reminders.for_lead("L1")] == ["late", "first", "done"]
+    assert [reminder.id for reminder in reminders.for_lead("L2")] == ["edge", "invalid"]
+    assert reminders.for_lead("inconnu") == []
+
+    reminders["late"].lead_id = "L2"
+    reminders.reindex("late", ["lead_id"])
+    del reminders["first"]
+    by_lead = reminders.for_leads(["L1", "L2"])
+    assert [reminder.id for reminder in by_lead["L1"]] == ["done"]
+    assert [reminder.id for reminder in by_lead["L2"]] == ["late", "edge", "invalid"]
@@ -0,0 +1,83 @@
+"""Recherche plein texte : préfixes, accents et ligatures, tous les termes requis"""
+from types import SimpleNamespace
+
+from search_index import SearchIndex, fold, tokenize
+
+from .conftest import LEAD
+
+
+def make_lead(company, first_name="Jean", last_name="Martin", note=None, vehicles=()):
+    return SimpleNamespace(
+        company=SimpleNamespace(name=company),
+        contact=SimpleNamespace(first_name=first_name, last_name=last_name),
+        note=note,
+        vehicles=[SimpleNamespace(brand=brand, model=model) for brand, model in vehicles],
+    )
+
+
+def make_index():
+    index = SearchIndex()
+    index.add("a", make_lead("Société Générale", vehicles=[("Citroën", "C5 Aircross")]))
+    index.add("b", make_lead("Bœuf & Cie", first_name="Hélène", note="Rappeler après l'été"))
+    index.add("c", make_lead("Garage Citron", last_name="Société"))
+    return index
+
+
+def test_fold_removes_accents_and_ligatures():
+    assert fold("Citroën Œuvre Straße") == "citroen oeuvre strasse"
+    assert tokenize("Série 3, C5-Aircross") == ["serie", "3", "c5", "aircross"]
+
+
+def test_accented_and_unaccented_queries_match():
+    index = make_index()
+    assert [lead_id for lead_id, _ in index.search("citroen")] == ["a"]
+    assert [lead_id for lead_id, _ in index.search("CITROËN")] == ["a"]
+    assert [lead_id for lead_id, _ in index.search("helene boeuf")] == ["b"]
+    assert [lead_id for lead_id, _ in index.search("ete")] == ["b"]
+
+
+def test_prefixes_rank_below_full_terms():
+    index = make_index()
+    # "citro" : préfixe de "citroen" (véhicule de a) et de "citron" (société de c)
+    assert [lead_id for lead_id, _ in index.search("citro")] == ["c", "a"]
+    # Terme complet en société (a) devant le même terme en nom de contact (c)
+    assert [lead_id for lead_id, _ in index.search("societe")] == ["a", "c"]
+    assert index.search("soc gen") == [("a", 3.0)]  # préfixes de deux termes, tous requis
+    assert index.search("citroen garage") == []
+
+
+def test_candidates_and_removal():
+    index = make_index()
+    assert [lead_id for lead_id, _ in index.search("societe", candidates={"c"})] == ["c"]
+    index.remove("a")
+    assert [lead_id for lead_id, _ in index.search("societe")] == ["c"]
+    assert index.search("aircross") == []
+
+
+CREATE = f"""
+for i in range(250):
+    client.post("/api/leads", json={{**{LEAD!r}, "company": {{"name": f"Société {{i}}"}}}})
+if server.STORAGE_BACKEND == "memory":
+    server.journal.flush()
+    server.journal.compact(wait=True)
+"""
+
+SEARCH = """
+batches = []
+index_deferred = server.leads_db.index_deferred
+def recording(limit=None):
+    batches.append(limit)
+    return index_deferred(limit)
+server.leads_db.index_deferred = recording
+
+found = client.get("/api/leads/search", params={"q": "societe 249", "fields": "company.name"}).json()
+emit([[item["company"]["name"] for item in found["items"]], set(batches) == {server.LAZY_INDEX_BATCH_SIZE},
+      len(batches) > 1])
+"""
+
+
+def test_search_completes_the_index_in_batches(server_runner):
+    lazy = dict(SNAPSHOT_FORMAT="binary", LEAD_LOAD_MODE="lazy") if server_runner.storage_backend == "memory" else {}
+    server_runner.run(CREATE, **lazy)
+    # Sans tâche de fond (TestClient hors lifespan) : la recherche complète l'index par lots
+    assert server_runner.run(SEARCH, **lazy) == [[["Société 249"], True, True]]
@@ -0,0 +1,106 @@
+"""Instantané binaire : un instantané illisible ne doit jamais faire perdre de données"""
+import marshal
+import os
+import struct
+
+import pytest
+
+import snapshot
+from snapshot import SnapshotFormatError, SnapshotReader, write_binary_snapshot
+
+from .conftest import LEAD
+
+CREATE_AND_COMPACT = f"""
+for i in range(6):
+    client.post("/api/leads", json={{**{LEAD!r}, "company": {{"name": f"Société {{i}}"}}}})
+server.journal.flush()
+server.journal.compact(wait=True)
+emit(len(server.leads_db))
+"""
+
+COUNT = "emit(len(server.leads_db))"
+
+
+def test_binary_compaction_replaces_json(memory_runner):
+    assert memory_runner.run(CREATE_AND_COMPACT, SNAPSHOT_FORMAT="binary") == [6]
+    files = os.listdir(memory_runner.backup_dir)
+    assert "snapshot.bin" in files and "leads_backup.json" not in files
+    assert memory_runner.run(COUNT, SNAPSHOT_FORMAT="binary") == [6]
+
+
+def test_unreadable_snapshot_aborts_startup(memory_runner):
+    memory_runner.run(CREATE_AND_COMPACT, SNAPSHOT_FORMAT="binary")
+    memory_runner.run('client.post("/api/leads", json=' + repr(LEAD) + ')', SNAPSHOT_FORMAT="binary")
+    path = os.path.join(memory_runner.backup_dir, "snapshot.bin")
+    with open(path, "r+b") as f:
+        f.seek(10)
+        f.write(b"\xff\xff")  # version de marshal inconnue
+    corrupted = open(path, "rb").read()
+
+    # Ni démarrage sur le journal seul, ni réécriture de l'instantané
+    memory_runner.run(COUNT, check=False, SNAPSHOT_FORMAT="json")
+    assert memory_runner.returncode != 0
+    assert "Sauvegarde illisible" in memory_runner.output
+    assert open(path, "rb").read() == corrupted
+    assert not os.path.exists(os.path.join(memory_runner.backup_dir, "leads_backup.json"))
+
+    # Instantané restauré : rien n'est perdu
+    with open(path, "r+b") as f:
+        f.seek(10)
+        f.write(__import__("marshal").version.to_bytes(2, "little"))
+    assert memory_runner.run(COUNT, SNAPSHOT_FORMAT="binary") == [7]
+
+
+def test_truncated_snapshot_aborts_startup(memory_runner):
+    memory_runner.run(CREATE_AND_COMPACT, SNAPSHOT_FORMAT="binary")
+    path = os.path.join(memory_runner.backup_dir, "snapshot.bin")
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) // 2)
+    memory_runner.run(COUNT, check=False, SNAPSHOT_FORMAT="binary", LEAD_LOAD_MODE="lazy")
+    assert memory_runner.returncode != 0
+    assert "Sauvegarde illisible" in memory_runner.output
+
+
+def test_snapshot_survives_marshal_version_change(tmp_path):
+    path = str(tmp_path / "snapshot.bin")
+    write_binary_snapshot(path, {"lead": [({"id": "a", "n": 1}, ("a",))], "reminder": []})
+    reader = SnapshotReader(path)
+    assert list(reader.records()) == [("lead", {"id": "a", "n": 1})]
+    reader.close()
+
+    # Instantané écrit dans un format marshal plus ancien : toujours lisible
+    with open(path, "r+b") as f:
+        f.seek(10)
+        assert struct.unpack("<H", f.read(2))[0] == snapshot.SNAPSHOT_MARSHAL_VERSION
+    old_path = str(tmp_path / "old.bin")
+    previous = snapshot.SNAPSHOT_MARSHAL_VERSION
+    snapshot.SNAPSHOT_MARSHAL_VERSION = 2
+    try:
+        write_binary_snapshot(old_path, {"lead": [({"id": "b", "n": 2}, ("b",))]})
+    finally:
+        snapshot.SNAPSHOT_MARSHAL_VERSION = previous
+    reader = SnapshotReader(old_path)
+    assert list(reader.records()) == [("lead", {"id": "b", "n": 2})]
+    reader.close()
+
+    # Format écrit par un Python plus récent : refusé plutôt que mal relu
+    with open(path, "r+b") as f:
+        f.seek(10)
+        f.write(struct.pack("<H", marshal.version + 1))
+    with pytest.raises(SnapshotFormatError):
+        SnapshotReader(path)
+
+
+def test_binary_snapshot_restores_leads_unchanged(memory_runner):
+    dump = "emit(sorted((lead.dict() for lead in server.leads_db.values()), key=lambda lead: lead['id']))"
+    lead = {**LEAD, "vehicles": [{"brand": "Peugeot", "model": "308", "tarif_mensuel": "350,50 €",
+                                  "commission_agence": "1 200 €"}]}
+    before = memory_runner.run(f"""
+client.post("/api/leads", json={lead!r})
+server.journal.flush()
+server.journal.compact(wait=True)
+{dump}
+""", SNAPSHOT_FORMAT="binary")[0]
+    assert before[0]["vehicles"][0]["commission_agence_cents"] == 120000
+    for mode in ("eager", "lazy"):
+        assert memory_runner.run(dump, SNAPSHOT_FORMAT="binary", LEAD_LOAD_MODE=mode)[0] == before
@@ -0,0 +1,98 @@
+"""Statistiques du dashboard : agrégats incrémentaux identiques à un recalcul complet"""
+import os
+import random
+import sqlite3
+from types import SimpleNamespace
+
+from aggregates import LeadStatsAggregate, drift
+from repository import LeadRepository
+
+from .conftest import LEAD
+
+VEHICLE = {"brand": "Peugeot", "model": "308", "commission_agence": "1 200,50 €"}
+
+MUTATIONS = f"""
+ids = [client.post("/api/leads", json={{**{LEAD!r}, "vehicles": [{VEHICLE!r}]}}).json()["lead"]["id"]
+       for _ in range(4)]
+client.patch(f"/api/leads/{{ids[0]}}", json={{"status": "offre"}})
+vehicle_id = client.get(f"/api/leads/{{ids[1]}}").json()["vehicles"][0]["id"]
+client.patch(f"/api/leads/{{ids[1]}}", json={{"vehicles": {{vehicle_id: {{"payment_status": "paye"}}}}}})
+client.delete(f"/api/leads/{{ids[2]}}")
+"""
+
+STATS = """
+verify = client.get("/api/dashboard/stats/verify").json()
+emit([verify["consistent"], client.get("/api/dashboard/stats").json()])
+"""
+
+
+def test_incremental_stats_match_recomputation(server_runner):
+    ((consistent, stats),) = server_runner.run(MUTATIONS + STATS)
+    assert consistent
+    assert stats["total_leads"] == 3
+    assert sum(stats["status_stats"].values()) == 3 and stats["status_stats"].get("offre") == 1
+    assert stats["commissions_stats"]["total_paid"] == 1200.5
+    assert stats["commissions_stats"]["total_pending"] == 2401.0
+    assert server_runner.run(STATS) == [[True, stats]]  # au redémarrage
+
+
+def test_sqlite_stats_table_is_backfilled(tmp_path):
+    from .conftest import ServerRunner
+
+    runner = ServerRunner(str(tmp_path), "sqlite")
+    ((_, stats),) = runner.run(MUTATIONS + STATS)
+    # Base antérieure à la table lead_stats
+    conn = sqlite3.connect(os.path.join(runner.backup_dir, "crm.sqlite3"))
+    with conn:
+        for trigger in ("lead_stats_insert", "lead_stats_delete", "lead_stats_update"):
+            conn.execute(f"DROP TRIGGER {trigger}")
+        conn.execute("DROP TABLE lead_stats")
+        conn.execute("DELETE FROM meta WHERE key = 'lead_stats'")
+    conn.close()
+    assert runner.run(STATS) == [[True, stats]]
+
+
+def contribution(lead):
+    paid = sum(v.cents for v in lead.vehicles if v.paid)
+    return lead.status, paid, sum(v.cents for v in lead.vehicles if not v.paid)
+
+
+def make_lead(rng, lead_id):
+    vehicles = [SimpleNamespace(brand="Peugeot", cents=rng.randrange(0, 50000), paid=rng.random() < 0.5)
+                for _ in range(rng.randrange(0, 3))]
+    return SimpleNamespace(id=lead_id, status=rng.choice(["a_contacter", "offre", "livree", ""]), vehicles=vehicles,
+                           assigned_to_commercial=None, assigned_to_prestataire=None, created_at="", seq=0)
+
+
+def test_aggregate_matches_recomputation_after_random_mutations():
+    rng = random.Random(8)
+    leads = LeadRepository()
+    aggregate = LeadStatsAggregate(contribution, {"status", "vehicles"})
+    leads.add_indexer(aggregate)
+    for step in range(500):
+        lead_id = f"L{rng.randrange(40)}"
+        action = rng.random()
+        if action < 0.4:
+            leads[lead_id] = make_lead(rng, lead_id)
+        elif action < 0.8 and lead_id in leads:
+            lead = leads[lead_id]
+            if rng.random() < 0.5:
+                lead.status = rng.choice(["offre", "livree"])
+                leads.reindex(lead_id, ["status"])
+            else:
+                lead.vehicles = make_lead(rng, lead_id).vehicles
+                leads.reindex(lead_id, ["vehicles"])
+        elif lead_id in leads:
+            del leads[lead_id]
+        fresh = LeadStatsAggregate.recompute(contribution, leads.items()).snapshot()
+        assert drift(aggregate.snapshot(), fresh) == {}, f"dérive à l'étape {step}"
+
+
+def test_drift_reports_differences():
+    live = {"total_leads": 3, "status_stats": {"offre": 2, "livree": 1}, "paid": 100, "pending": 0}
+    fresh = {"total_leads": 3, "status_stats": {"offre": 3}, "paid": 100, "pending": 50}
+    assert drift(live, fresh) == {
+        "pending": {"live": 0, "recomputed": 50},
+        "status_stats.livree": {"live": 1, "recomputed": 0},
+        "status_stats.offre": {"live": 2, "recomputed": 3},
+    }
@@ -0,0 +1,60 @@
+"""Véhicules adressables par PATCH : identifiants des anciennes sauvegardes, clés inconnues refusées"""
+import json
+import os
+
+from .conftest import LEAD
+
+VEHICLES = """
+lead = client.get("/api/leads/legacy1").json()
+emit([vehicle["id"] for vehicle in lead["vehicles"]])
+"""
+
+PATCH_UNKNOWN = """
+response = client.patch("/api/leads/legacy1", json={"vehicles": {"inconnu": {"brand": "Renault", "model": "Clio"}}})
+emit([response.status_code, len(client.get("/api/leads/legacy1").json()["vehicles"])])
+"""
+
+PATCH_BY_ID = """
+vehicle_id = client.get("/api/leads/legacy1").json()["vehicles"][1]["id"]
+response = client.patch("/api/leads/legacy1", json={"vehicles": {vehicle_id: {"model": "3008"}}})
+emit([response.status_code, [v["model"] for v in client.get("/api/leads/legacy1").json()["vehicles"]]])
+"""
+
+
+def test_legacy_vehicles_get_ids_and_unknown_keys_are_rejected(memory_runner):
+    legacy = {**LEAD, "id": "legacy1", "status": "offre", "created_at": "2024-01-01T00:00:00",
+              "vehicles": [{"brand": "Peugeot", "model": "308"}, {"brand": "Peugeot", "model": "2008"}]}
+    with open(os.path.join(memory_runner.backup_dir, "leads_backup.json"), "w", encoding="utf-8") as f:
+        json.dump({"legacy1": legacy}, f)
+
+    (ids,) = memory_runner.run(VEHICLES)
+    assert len(ids) == 2 and all(ids) and ids[0] != ids[1]
+    assert memory_runner.run(VEHICLES) == [ids]  # attribués une fois, conservés au redémarrage
+
+    assert memory_runner.run(PATCH_UNKNOWN) == [[422, 2]]
+    assert memory_runner.run(PATCH_BY_ID) == [[200, ["308", "3008"]]]
+
+
+IMPORT_LEGACY = """
+import json
+def ndjson(delta, lead):
+    lines = [{"type": "header", "version": "2.0", "delta": delta}, {"type": "lead", "data": lead},
+             {"type": "end", "leads": 1}]
+    return "".join(json.dumps(line) + "\\n" for line in lines).encode()
+
+for delta, lead_id in ((False, "legacy1"), (True, "legacy2")):
+    lead = {**LEGACY, "id": lead_id}
+    response = client.post("/api/backup/import", content=ndjson(delta, lead),
+                           headers={"Content-Type": "application/x-ndjson"})
+    vehicles = client.get(f"/api/leads/{lead_id}").json()["vehicles"]
+    patched = client.patch(f"/api/leads/{lead_id}", json={"vehicles": {vehicles[1]["id"]: {"model": "3008"}}})
+    emit([response.status_code, all(v["id"] for v in vehicles), patched.status_code,
+          [v["model"] for v in client.get(f"/api/leads/{lead_id}").json()["vehicles"]]])
+"""
+
+
+def test_imported_legacy_vehicles_get_ids(server_runner):
+    legacy = {**LEAD, "status": "offre", "created_at": "2024-01-01T00:00:00",
+              "vehicles": [{"brand": "Peugeot", "model": "308"}, {"brand": "Peugeot", "model": "2008"}]}
+    expected = [200, True, 200, ["308", "3008"]]
+    assert server_runner.run(f"LEGACY = {legacy!r}\n" + IMPORT_LEGACY) == [expected, expected]